@@ -0,0 +1,389 @@
+import asyncio  # Работа с QUIK# через асинхронные соединения
+from inspect import isawaitable  # Обработчик может быть асинхронной функцией
+from itertools import count  # Счетчик внутренних номеров запросов
+from typing import AsyncIterator  # Асинхронный итератор
+
+from .QuikBase import QuikBase  # Общая часть QuikPy и AsyncQuikPy без ввода-вывода
+from .LineDecoder import LineDecoder  # Разбор сообщений QUIK#
+from .Metrics import Metrics  # Счетчики и гистограммы по командам QUIK#
+from .SymbolCache import SymbolCache  # Справочник спецификаций тикеров
+from .AsyncRequestBatch import AsyncRequestBatch  # Пакет запросов
+from .SubscriptionRegistry import SubscriptionRegistry  # Реестр подписок
+
+
+class AsyncQuikPy(QuikBase):
+    """Асинхронная работа с QUIK из Python через LUA скрипты QUIK# на asyncio
+
+    Все функции QuikPy, которые отправляют запрос в QUIK, здесь вызываются через await. Например, await client.get_candles_from_data_source(...)
+    Запросы отправляются без ожидания ответов на предыдущие, ответы сопоставляются с запросами по id.
+    Функции обратного вызова можно получать через async for (events, candles, quotes, all_trades) или через обработчики on_*.
+    Обработчик может быть как обычной, так и асинхронной функцией
+
+    Пример:
+    async with AsyncQuikPy() as client, aclosing(client.candles('SPBFUT', 'SiH5', 1)) as candles:
+        async for candle in candles:
+            print(candle)
+    """
+    stream_limit = 2 ** 30  # Максимальный размер одного сообщения QUIK# в байтах (1 ГБайт)
+
+    def __init__(self, host='127.0.0.1', requests_port=34130, callbacks_port=34131, record=None, symbols_cache=None, symbols_ttl=24 * 60 * 60):
+        """Инициализация. Соединения открываются в connect или при входе в async with
+
+        :param str host: IP адрес или название хоста
+        :param int requests_port: Порт для отправки запросов и получения ответов
+        :param int callbacks_port: Порт для функций обратного вызова
+        :param str|Recorder record: Файл для записи всех функций обратного вызова со временем получения или готовый Recorder. None - не записывать
+        :param str symbols_cache: Файл справочника тикеров. Спецификации из него действительны в течение торговой сессии. None - справочник только в памяти
+        :param float symbols_ttl: Срок годности спецификации тикера в справочнике в секундах. None - до конца торговой сессии
+        """
+        for handler_name in self.callbacks.values():  # Пробегаемся по всем функциям обратного вызова
+            setattr(self, handler_name, self.default_handler)  # Ставим обработчик по умолчанию
+        self.host = host  # IP адрес или название хоста
+        self.requests_port = requests_port  # Порт для отправки запросов и получения ответов
+        self.callbacks_port = callbacks_port  # Порт для функций обратного вызова
+        self.metrics = Metrics()  # Метрики по командам в асинхронном режиме не ведутся. Нужны для stats
+        self.recorder = None  # Запись функций обратного вызова
+        if record is not None:  # Если задана запись
+            self.start_recording(record)  # то начинаем ее
+        self.requests_writer = None  # Соединение для отправки запросов
+        self.callbacks_writer = None  # Соединение для функций обратного вызова
+        self.requests = {}  # Запросы, ожидающие ответа: внутренний номер запроса -> (Future, код транзакции пользователя)
+        self.request_ids = count(1)  # Внутренние номера запросов
+        self.listeners = {}  # Подписчики на функции обратного вызова: команда QUIK# -> множество очередей
+        self.tasks = []  # Задачи приема ответов и функций обратного вызова
+        self.resubscribe_tasks = set()  # Задачи возобновления подписок
+        self.accounts = []  # Счета
+        self.subscriptions = SubscriptionRegistry(asyncio.Event)  # Реестр подписок со счетчиками ссылок. Для возобновления всех подписок после повторного подключения к серверу QUIK
+        self.symbols = SymbolCache(symbols_cache, symbols_ttl)  # Справочник тикеров
+
+    async def connect(self):
+        """Открытие соединений для запросов и функций обратного вызова, получение счетов"""
+        requests_reader, self.requests_writer = await asyncio.open_connection(self.host, self.requests_port, limit=self.stream_limit)  # Соединение для запросов. QUIK# ждет его первым
+        callbacks_reader, self.callbacks_writer = await asyncio.open_connection(self.host, self.callbacks_port, limit=self.stream_limit)  # Соединение для функций обратного вызова
+        self.tasks = [asyncio.create_task(self.requests_handler(requests_reader), name='RequestsTask'),  # Прием ответов на запросы
+                      asyncio.create_task(self.callback_handler(callbacks_reader), name='CallbackTask')]  # Прием функций обратного вызова
+        self.accounts = self.make_accounts((await self.get_trade_accounts())['data'], (await self.get_money_limits())['data'])  # Счета
+        return self
+
+    async def __aenter__(self):
+        """Вход в класс с async with"""
+        return await self.connect()
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        """Выход из класса с async with"""
+        await self.close()
+
+    # Запросы
+
+    def process_request(self, request):
+        """Отправка запроса в виде словаря и получение ответа в виде JSON из QUIK
+
+        :param dict request: Запрос в виде словаря
+        :returns: Ответ JSON через await. Внутри пакета batch() - Future, результатом которого будет ответ JSON
+        """
+        batch = AsyncRequestBatch.active(self)  # Открытый пакет запросов текущей задачи
+        if batch is not None:  # Если пакет открыт
+            return batch.add(request)  # то ставим запрос в пакет. Он будет отправлен при выходе из пакета
+        return self.process_one_request(request)
+
+    async def process_one_request(self, request):
+        """Отправка одного запроса вне пакета
+
+        :param dict request: Запрос в виде словаря
+        :returns: Ответ JSON
+        """
+        return (await self.process_requests([request]))[0]
+
+    async def process_requests(self, requests) -> list[dict]:
+        """Отправка запросов одной записью в соединение и получение ответов в порядке запросов
+
+        :param list[dict] requests: Запросы в виде словарей
+        :return: Ответы JSON
+        """
+        if not self.tasks or self.tasks[0].done():  # Если соединение не открыто или прием ответов завершен
+            raise ConnectionError('Соединение для запросов закрыто')  # то ответов не будет, не ждем их
+        loop = asyncio.get_running_loop()  # Цикл событий
+        futures = []  # Результаты запросов
+        raw_data = []  # Запросы с внутренними номерами для отправки в QUIK
+        for request in requests:  # Пробегаемся по всем запросам
+            future = loop.create_future()  # Результат запроса
+            request_id = next(self.request_ids)  # Внутренний номер запроса. Код транзакции пользователя может повторяться
+            self.requests[request_id] = (future, request['id'])  # Регистрируем запрос до отправки
+            futures.append(future)
+            raw_data.append(self.encode_request(dict(request, id=request_id)))
+        self.requests_writer.write(b''.join(raw_data))  # Отправляем запросы в QUIK одной записью
+        await self.requests_writer.drain()  # Ждем, если буфер отправки переполнен
+        return list(await asyncio.gather(*futures))  # Ждем ответы на запросы
+
+    def batch(self, requests=None):
+        """Пакет запросов. Все запросы отправляются одной записью в соединение, задержка сети тратится один раз на пакет
+
+        Списком запросов: results = await client.batch([request1, request2])
+        Контекстом: async with client.batch(): last = client.get_param_ex(class_code, sec_code, 'LAST')
+        После выхода из async with ответ - last.result() или await last
+
+        :param list[dict] requests: Запросы в виде словарей. None - пакет в виде контекста
+        :return: Ответы JSON в порядке запросов через await или контекст пакета
+        """
+        if requests is None:  # Если запросы не заданы
+            return AsyncRequestBatch(self)  # то запросы будут поставлены в пакет внутри async with
+        return self.process_requests(requests)
+
+    async def run_steps(self, steps):
+        """Выполнение шагов функции из нескольких запросов. Ответ на каждый запрос ждем через await и передаем обратно в шаги
+
+        :param Generator steps: Шаги. Отдают запрос (функция и ее параметры) или список запросов, получают ответ или список ответов.
+            Ошибка запроса и отмена задачи передаются в шаги, чтобы они могли завершиться (finally)
+        :return: Результат шагов
+        """
+        result = error = None  # Шаги начинаются без ответа и ошибки
+        while True:  # Пока шаги не закончились
+            try:  # Пробуем получить следующий запрос
+                call = steps.send(result) if error is None else steps.throw(error)
+            except StopIteration as stop:  # Если шаги закончились
+                return stop.value  # то возвращаем их результат
+            error = None
+            try:  # Пробуем выполнить запрос
+                if isinstance(call, list):  # Если это список запросов
+                    async with self.batch():  # то отправляем их одной записью
+                        futures = [function(*args) for function, *args in call]
+                    result = [future.result() for future in futures]
+                else:  # Если это один запрос
+                    function, *args = call
+                    result = await function(*args)
+            except (Exception, asyncio.CancelledError) as e:  # Если запрос не выполнен или задача отменена
+                error = e  # то передаем ошибку в шаги
+
+    def send_request(self, request):
+        """Отправка запроса без ожидания ответа
+
+        :param dict request: Запрос в виде словаря
+        :return: Задача, результатом которой будет ответ JSON из QUIK
+        """
+        return asyncio.ensure_future(self.process_request(request))
+
+    async def requests_handler(self, reader):
+        """Прием ответов на запросы. Ответ сопоставляется с запросом по внутреннему номеру запроса id
+
+        :param asyncio.StreamReader reader: Соединение для запросов
+        """
+        try:  # Пробуем принимать ответы
+            while line := await reader.readline():  # Пока соединение не закрыто, получаем ответ полностью (до перевода строки)
+                if not line.strip():  # Если строка пустая
+                    continue  # то ее не разбираем
+                try:  # Пробуем разобрать ответ
+                    result = LineDecoder.decode(line)
+                except ValueError as e:  # Если ответ не разобран (ошибка кодировки или JSON)
+                    self.logger.error(f'requests_handler: Ответ не разобран ({e}): {line[:200]}')
+                    continue  # то переходим к следующему ответу. Его запрос получит ошибку при закрытии соединения
+                future, trans_id = self.requests.pop(result.get('id'), (None, None))  # Находим запрос по его внутреннему номеру
+                if future is None or future.done():  # Если запрос не найден или его уже не ждут
+                    continue  # то переходим к следующему ответу
+                result['id'] = trans_id  # Возвращаем код транзакции пользователя
+                future.set_result(result)  # Передаем ответ ожидающему
+        except (OSError, asyncio.IncompleteReadError):  # Если соединение закрыто
+            pass  # то ответов больше не будет
+        finally:  # Соединение закрыто, прием отменен или завершился с ошибкой. Ответов на ожидающие запросы не будет
+            requests, self.requests = self.requests, {}  # Забираем все ожидающие запросы
+            for future, _ in requests.values():  # Пробегаемся по всем ожидающим запросам
+                if not future.done():  # Если запрос еще ждут
+                    future.set_exception(ConnectionError('Соединение для запросов закрыто'))  # то передаем ошибку ожидающим
+
+    # Подписки (функции обратного вызова)
+
+    async def callback_handler(self, reader):
+        """Прием функций обратного вызова
+
+        :param asyncio.StreamReader reader: Соединение для функций обратного вызова
+        """
+        try:  # Пробуем принимать функции обратного вызова
+            while line := await reader.readline():  # Пока соединение не закрыто, получаем функцию обратного вызова полностью (до перевода строки)
+                if not line.strip():  # Если строка пустая
+                    continue  # то ее не разбираем
+                if self.recorder:  # Если ведется запись
+                    self.recorder.write(line.rstrip(b'\r\n'))  # то добавляем строку в буфер записи без перевода строки
+                try:  # Ошибка разбора или обработчика не должна останавливать прием функций обратного вызова
+                    await self.dispatch_callback(line)
+                except Exception:  # Если строка испорчена или в обработчике возникла ошибка
+                    self.logger.exception(f'callback_handler: Функция обратного вызова не обработана: {line[:200]}')  # то выводим ее в лог и принимаем дальше
+        except (OSError, asyncio.IncompleteReadError):  # Если соединение закрыто
+            pass  # то событий больше не будет
+
+    async def dispatch_callback(self, line):
+        """Разбор функции обратного вызова, передача ее подписчикам и обработчику
+
+        :param bytes line: Функция обратного вызова в кодировке Windows 1251
+        """
+        data = LineDecoder.decode(line)  # Разбираем функцию обратного вызова
+        cmd = data['cmd']  # Команда QUIK#
+        for queue in self.listeners.get(cmd, ()):  # Пробегаемся по всем подписчикам на команду
+            if queue.full():  # Если подписчик не успевает забирать события
+                queue.get_nowait()  # то убираем самое старое
+            queue.put_nowait(data)  # Передаем событие подписчику
+        if cmd == 'OnConnected':  # Соединение терминала с сервером QUIK
+            self.schedule_resubscribe()  # Возобновляем подписки, не задерживая прием событий
+        handler_name = self.callbacks.get(cmd)  # Обработчик команды
+        if handler_name is None:  # Если обработчика нет
+            return  # то событие обработано
+        result = getattr(self, handler_name)(data)  # Вызываем обработчик
+        if isawaitable(result):  # Если обработчик асинхронный
+            await result  # то ждем его завершения
+
+    def schedule_resubscribe(self):
+        """Возобновление подписок в отдельной задаче. Прием функций обратного вызова не ждет ответов на запросы"""
+        task = asyncio.create_task(self.resubscribe(), name='ResubscribeTask')  # Задача возобновления подписок
+        self.resubscribe_tasks.add(task)  # Держим ссылку на задачу, пока она выполняется
+        task.add_done_callback(self.resubscribe_done)
+
+    def resubscribe_done(self, task):
+        """Завершение задачи возобновления подписок. Ошибка выводится в лог
+
+        :param asyncio.Task task: Задача возобновления подписок
+        """
+        self.resubscribe_tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:  # Если подписки не возобновлены
+            self.logger.error(f'Подписки не возобновлены: {task.exception()!r}', exc_info=task.exception())  # Подписки возобновятся после следующего подключения
+
+    def listen(self, cmds, maxsize=0) -> asyncio.Queue:
+        """Очередь, в которую будут попадать функции обратного вызова по командам
+
+        :param tuple[str] cmds: Команды QUIK#. Например, ('OnTrade', 'OnOrder')
+        :param int maxsize: Максимальное кол-во непрочитанных событий. При переполнении удаляются самые старые. 0 - без ограничений
+        """
+        queue = asyncio.Queue(maxsize)  # Очередь событий подписчика
+        for cmd in cmds:  # Пробегаемся по всем командам
+            self.listeners.setdefault(cmd, set()).add(queue)  # Добавляем подписчика
+        return queue
+
+    def unlisten(self, cmds, queue):
+        """Отмена получения функций обратного вызова в очередь
+
+        :param tuple[str] cmds: Команды QUIK#
+        :param asyncio.Queue queue: Очередь из listen
+        """
+        for cmd in cmds:  # Пробегаемся по всем командам
+            self.listeners[cmd].discard(queue)  # Убираем подписчика
+
+    async def events(self, *cmds, maxsize=0) -> AsyncIterator[dict]:
+        """Функции обратного вызова в виде асинхронного итератора
+
+        :param str cmds: Команды QUIK#. Например, 'OnTrade', 'OnOrder'
+        :param int maxsize: Максимальное кол-во непрочитанных событий. При переполнении удаляются самые старые. 0 - без ограничений
+        """
+        queue = self.listen(cmds, maxsize)  # Очередь событий подписчика
+        try:  # Отдаем события, пока подписчик их забирает
+            while True:
+                yield await queue.get()
+        finally:  # Подписчик перестал забирать события
+            self.unlisten(cmds, queue)
+
+    async def candles(self, class_code, sec_code, interval, param='-', maxsize=0) -> AsyncIterator[dict]:
+        """Новые свечи в виде асинхронного итератора
+
+        Итератор берет ссылку на подписку в реестре подписок при первом чтении и отдает ее при закрытии. В QUIK подписка оформляется
+        только первым подписчиком на эти свечи и отменяется только последним. Чтобы подписка отменялась сразу после выхода из async for,
+        закрывайте итератор через contextlib.aclosing. Если подписки в QUIK нет (например, тикер не найден), то итератор сразу завершается
+
+        :param str class_code: Код режима торгов
+        :param str sec_code: Тикер
+        :param int interval: Кол-во в минутах: 0 (тик), 1, 2, 3, 4, 5, 6, 10, 15, 20, 30, 60 (1 час), 120 (2 часа), 240 (4 часа), 1440 (день), 10080 (неделя), 23200 (месяц)
+        :param str param: Если параметр не задан, то заказываются данные на основании Таблицы обезличенных сделок, если задан – данные по этому параметру
+        :param int maxsize: Максимальное кол-во непрочитанных свечей. При переполнении удаляются самые старые. 0 - без ограничений
+        """
+        subscription = {'subscription': 'candles', 'class_code': class_code, 'sec_code': sec_code, 'interval': interval, 'param': param}  # Подписка
+        queue = self.listen(('NewCandle',), maxsize)  # Начинаем принимать свечи до подписки, чтобы не пропустить первые
+        held = True  # Ссылка на подписку берется до первого обращения к QUIK. При ошибке соединения она остается в реестре
+        try:  # Отдаем свечи, пока подписчик их забирает
+            held = await self.hold_subscription(subscription)  # Берем ссылку на подписку
+            while held:  # Если подписка есть в QUIK
+                candle = (await queue.get())['data']  # Новая свеча
+                if candle['class'] == class_code and candle['sec'] == sec_code and candle['interval'] == interval:  # Если свеча по нужному тикеру и интервалу
+                    yield candle
+        finally:  # Подписчик перестал забирать свечи
+            self.unlisten(('NewCandle',), queue)
+            if held:  # Если ссылка на подписку взята
+                await self.release_stream(self.unsubscribe_from_candles(class_code, sec_code, interval, param))  # то отдаем ее
+
+    async def quotes(self, class_code, sec_code, maxsize=0) -> AsyncIterator[dict]:
+        """Изменения стакана в виде асинхронного итератора
+
+        Ссылка на подписку в реестре подписок берется при первом чтении и отдается при закрытии итератора, как у candles
+
+        :param str class_code: Код режима торгов
+        :param str sec_code: Тикер
+        :param int maxsize: Максимальное кол-во непрочитанных стаканов. При переполнении удаляются самые старые. 0 - без ограничений
+        """
+        subscription = {'subscription': 'quotes', 'class_code': class_code, 'sec_code': sec_code}  # Подписка
+        queue = self.listen(('OnQuote',), maxsize)  # Начинаем принимать стаканы до подписки
+        held = True  # Ссылка на подписку берется до первого обращения к QUIK. При ошибке соединения она остается в реестре
+        try:  # Отдаем стаканы, пока подписчик их забирает
+            held = await self.hold_subscription(subscription)  # Берем ссылку на подписку
+            while held:  # Если подписка есть в QUIK
+                quote = (await queue.get())['data']  # Изменение стакана
+                if quote['class_code'] == class_code and quote['sec_code'] == sec_code:  # Если стакан нужного тикера
+                    yield quote
+        finally:  # Подписчик перестал забирать стаканы
+            self.unlisten(('OnQuote',), queue)
+            if held:  # Если ссылка на подписку взята
+                await self.release_stream(self.unsubscribe_level2_quotes(class_code, sec_code))  # то отдаем ее
+
+    async def all_trades(self, class_code=None, sec_code=None, maxsize=0) -> AsyncIterator[dict]:
+        """Обезличенные сделки в виде асинхронного итератора. В QUIK должна быть открыта Таблица обезличенных сделок по тикеру
+
+        :param str class_code: Код режима торгов. None - все режимы торгов
+        :param str sec_code: Тикер. None - все тикеры
+        :param int maxsize: Максимальное кол-во непрочитанных сделок. При переполнении удаляются самые старые. 0 - без ограничений
+        """
+        queue = self.listen(('OnAllTrade',), maxsize)  # Очередь обезличенных сделок
+        try:  # Отдаем сделки, пока подписчик их забирает
+            while True:
+                trade = (await queue.get())['data']  # Обезличенная сделка
+                if (class_code is None or trade['class_code'] == class_code) and (sec_code is None or trade['sec_code'] == sec_code):  # Если сделка по нужному тикеру
+                    yield trade
+        finally:  # Подписчик перестал забирать сделки
+            self.unlisten(('OnAllTrade',), queue)
+
+    async def hold_subscription(self, subscription) -> bool:
+        """Взятие ссылки на подписку для асинхронного итератора
+
+        :param dict subscription: Подписка
+        :return: True, если подписка есть в QUIK, и ссылка взята. Если подписки нет, то итератор завершается
+        """
+        _, request = self.subscription_requests(subscription)  # Запрос подписки
+        result, held = await self.run_steps(self.acquire_subscription_steps(subscription, request, request))
+        if not held:  # Если подписки в QUIK нет
+            self.logger.error(f'Подписка {subscription} не оформлена в QUIK: {result}')
+        return held
+
+    async def release_stream(self, unsubscribe):
+        """Отдача ссылки на подписку при закрытии асинхронного итератора
+
+        :param unsubscribe: Отмена подписки. Ссылка в реестре подписок отдается до запроса в QUIK
+        """
+        try:  # Пробуем отменить подписку в QUIK, если это последняя ссылка
+            await unsubscribe
+        except ConnectionError:  # Если соединение уже закрыто
+            pass  # то подписка в QUIK закончится вместе с ним
+
+    # Выход и закрытие
+
+    async def close(self):
+        """Закрытие соединений для запросов и функций обратного вызова"""
+        tasks = self.tasks + list(self.resubscribe_tasks)  # Задачи приема и возобновления подписок
+        for task in tasks:  # Пробегаемся по всем задачам
+            task.cancel()  # Останавливаем задачу
+        for writer in (self.requests_writer, self.callbacks_writer):  # Пробегаемся по всем соединениям
+            if writer is not None:  # Если соединение открывалось
+                writer.close()  # то закрываем его
+        await asyncio.gather(*tasks, return_exceptions=True)  # Ждем остановки задач
+        self.tasks = []
+        self.stop_recording()  # Записываем оставшиеся функции обратного вызова
+        self.symbols.save()  # Сохраняем в файл спецификации, полученные по одной
+
+    def close_connection_and_thread(self):
+        """Закрытие соединений. В асинхронном коде используйте await close()"""
+        for writer in (self.requests_writer, self.callbacks_writer):  # Пробегаемся по всем соединениям
+            if writer is not None:  # Если соединение открывалось
+                writer.close()  # то закрываем его
+        self.stop_recording()  # Записываем оставшиеся функции обратного вызова
+        self.symbols.save()  # Сохраняем в файл спецификации, полученные по одной
@@ -0,0 +1,75 @@
+from contextvars import ContextVar  # Пакеты запросов у каждой задачи asyncio свои
+import asyncio  # Ответ на запрос пакета
+
+
+class AsyncRequestBatch:
+    """Пакет запросов AsyncQuikPy в виде асинхронного контекста
+
+    Внутри async with запросы текущей задачи не отправляются, а возвращают asyncio.Future. При выходе из async with все запросы
+    отправляются в QUIK одной записью в соединение, ответы передаются в Future в порядке запросов.
+    Как и в RequestBatch, в пакет можно ставить методы, которые возвращают ответ QUIK без обработки (get_param_ex, get_security_info и т.п.).
+    Ответы нельзя ждать внутри async with: до выхода из пакета запросы не отправлены
+    """
+    batches = ContextVar('batches', default=())  # Стек открытых пакетов текущей задачи
+
+    def __init__(self, provider):
+        """Инициализация
+
+        :param provider: Провайдер AsyncQuikPy, через который будут отправлены запросы
+        """
+        self.provider = provider  # Провайдер AsyncQuikPy
+        self.requests = []  # Запросы пакета
+        self.futures = []  # Ответы на запросы пакета
+        self.token = None  # Состояние стека пакетов до открытия этого пакета
+
+    @classmethod
+    def active(cls, provider):
+        """Открытый пакет текущей задачи для провайдера
+
+        :param provider: Провайдер AsyncQuikPy
+        :return: Пакет или None, если пакет не открыт
+        """
+        stack = cls.batches.get()  # Стек открытых пакетов текущей задачи
+        if stack and stack[-1].provider is provider:  # Если последний открытый пакет для этого провайдера
+            return stack[-1]  # то запросы ставим в него
+        return None
+
+    def add(self, request) -> asyncio.Future:
+        """Постановка запроса в пакет
+
+        :param dict request: Запрос в виде словаря
+        :return: Future, результатом которого будет ответ JSON из QUIK после выхода из пакета
+        """
+        future = asyncio.get_running_loop().create_future()  # Ответ на запрос
+        self.requests.append(request)
+        self.futures.append(future)
+        return future
+
+    async def send(self):
+        """Отправка всех запросов пакета и передача ответов"""
+        requests, futures = self.requests, self.futures  # Запросы и ответы пакета
+        self.requests, self.futures = [], []  # Пакет можно наполнять заново
+        if not requests:  # Если запросов нет
+            return  # то и отправлять нечего
+        try:  # Пробуем выполнить запросы
+            results = await self.provider.process_requests(requests)  # Отправляем все запросы одной записью, получаем ответы по порядку
+        except Exception as e:  # Если запросы выполнить не удалось
+            for future in futures:  # Пробегаемся по всем ответам
+                future.set_exception(e)  # Передаем ошибку ожидающим
+            raise
+        for future, result in zip(futures, results):  # Пробегаемся по всем ответам
+            future.set_result(result)  # Передаем ответ ожидающему
+
+    async def __aenter__(self):
+        """Открытие пакета. Запросы текущей задачи ставятся в пакет"""
+        self.token = self.batches.set(self.batches.get() + (self,))  # Открываем пакет
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        """Закрытие пакета. Если в async with не было ошибки, то отправляем запросы"""
+        self.batches.reset(self.token)  # Закрываем пакет
+        if exc_type is None:  # Если ошибки не было
+            await self.send()  # то отправляем запросы
+        else:  # Если была ошибка
+            for future in self.futures:  # Пробегаемся по всем ответам
+                future.cancel()  # Запросы не отправлены
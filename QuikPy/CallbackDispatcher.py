@@ -0,0 +1,214 @@
+from collections import deque, OrderedDict, Counter  # Очереди событий, счетчики слияний по ключам
+from threading import Thread, Condition  # Потоки обработчиков, ожидание событий
+from time import monotonic  # Задержка обработки событий
+import logging  # Будем вести лог
+
+
+class CallbackQueue:
+    """Ограниченная очередь событий одного типа (одной команды QUIK#)
+
+    Политики при переполнении:
+    - block - поток чтения ждет, пока обработчик не освободит место
+    - drop_oldest - самое старое событие удаляется
+    - conflate - в очереди хранится только последнее событие по каждому ключу (тикеру). При переполнении удаляется самое старое
+    """
+    policies = ('block', 'drop_oldest', 'conflate')  # Политики при переполнении
+
+    def __init__(self, cmd, maxsize, overflow):
+        """Инициализация
+
+        :param str cmd: Команда QUIK#
+        :param int maxsize: Максимальное кол-во событий в очереди
+        :param str overflow: Политика при переполнении: block, drop_oldest, conflate
+        """
+        if overflow not in self.policies:  # Если политика неизвестна
+            raise ValueError(f'Политика при переполнении {overflow} не поддерживается. Возможные значения: {self.policies}')
+        self.cmd = cmd  # Команда QUIK#
+        self.maxsize = maxsize  # Максимальное кол-во событий в очереди
+        self.overflow = overflow  # Политика при переполнении
+        self.items = OrderedDict() if overflow == 'conflate' else deque()  # События (время постановки в очередь, событие). Для слияния по ключу
+        self.scheduled = False  # Очередь ждет свободного обработчика
+        self.busy = False  # События очереди сейчас обрабатываются
+        self.received = 0  # Кол-во поступивших событий
+        self.processed = 0  # Кол-во обработанных событий
+        self.dropped = 0  # Кол-во удаленных событий при переполнении
+        self.conflated = 0  # Кол-во событий, замененных более новыми по тому же ключу
+        self.conflated_by_key = Counter()  # Кол-во замененных событий по каждому ключу
+        self.blocked = 0  # Сколько раз поток чтения ждал места в очереди
+        self.max_depth = 0  # Максимальная глубина очереди
+        self.last_lag = 0.0  # Задержка последнего обработанного события в секундах
+        self.max_lag = 0.0  # Максимальная задержка в секундах
+        self.total_lag = 0.0  # Суммарная задержка в секундах
+
+    def __len__(self):
+        return len(self.items)
+
+    def full(self) -> bool:
+        """Очередь заполнена"""
+        return len(self.items) >= self.maxsize
+
+    def put(self, item, key=None):
+        """Постановка события в очередь. Вызывается под блокировкой диспетчера
+
+        :param tuple item: Время постановки в очередь, событие
+        :param key: Ключ слияния для политики conflate
+        """
+        self.received += 1  # Кол-во поступивших событий
+        if self.overflow == 'conflate':  # Если храним только последнее событие по ключу
+            if key in self.items:  # Если событие по ключу уже ждет обработки
+                self.items[key] = (self.items[key][0], item[1])  # то заменяем его более новым. Время ожидания считаем от старого
+                self.conflated += 1  # Кол-во замененных событий
+                self.conflated_by_key[key] += 1  # Кол-во замененных событий по ключу
+                return  # Глубина очереди не изменилась
+            if self.full():  # Если очередь заполнена
+                self.items.popitem(last=False)  # то удаляем самое старое событие
+                self.dropped += 1  # Кол-во удаленных событий
+            self.items[key] = item  # Ставим событие в очередь
+        else:  # Для остальных политик
+            if self.full():  # Если очередь заполнена (для block место уже освобождено)
+                self.items.popleft()  # то удаляем самое старое событие
+                self.dropped += 1  # Кол-во удаленных событий
+            self.items.append(item)  # Ставим событие в очередь
+        self.max_depth = max(self.max_depth, len(self.items))  # Максимальная глубина очереди
+
+    def take(self) -> list:
+        """Все события очереди для обработки. Вызывается под блокировкой диспетчера"""
+        if self.overflow == 'conflate':  # Если события хранятся по ключу
+            items = list(self.items.values())  # то берем значения
+        else:  # Для остальных политик
+            items = list(self.items)  # берем все события
+        self.items.clear()  # Очередь пуста
+        return items
+
+    def stats(self) -> dict:
+        """Статистика очереди. Задержка - время от получения события до начала обработки"""
+        return dict(depth=len(self.items), max_depth=self.max_depth, maxsize=self.maxsize, overflow=self.overflow,
+                    received=self.received, processed=self.processed, dropped=self.dropped, conflated=self.conflated, blocked=self.blocked,
+                    last_lag=self.last_lag, max_lag=self.max_lag, avg_lag=self.total_lag / self.processed if self.processed else 0.0)
+
+
+class CallbackDispatcher:
+    """Передача функций обратного вызова от потока чтения соединения к обработчикам
+
+    Поток чтения только ставит событие в очередь своей команды и сразу читает дальше.
+    Обработчики вызываются в пуле потоков. События одной команды обрабатываются по порядку одним потоком,
+    события разных команд - параллельно
+    """
+    logger = logging.getLogger('QuikPy.CallbackDispatcher')  # Будем вести лог
+
+    def __init__(self, handler, workers=1, maxsize=10000, overflow='block', conflate=()):
+        """Инициализация
+
+        :param handler: Обработчик события. Функция с параметром data (событие в виде JSON)
+        :param int workers: Кол-во потоков обработчиков
+        :param int maxsize: Максимальное кол-во событий в очереди одной команды
+        :param str|dict overflow: Политика при переполнении для всех команд или словарь команда -> политика. Для команд не из словаря - block
+        :param tuple[str] conflate: Команды, по которым всегда доставляется только последнее событие по ключу (политика conflate)
+        """
+        if workers < 1:  # Если обработчиков нет
+            raise ValueError(f'Кол-во потоков обработчиков должно быть больше 0. Задано {workers}')
+        self.handler = handler  # Обработчик события
+        self.maxsize = maxsize  # Максимальное кол-во событий в очереди одной команды
+        self.overflow = overflow  # Политика при переполнении
+        self.conflate = set(conflate)  # Команды со слиянием событий по ключу
+        self.condition = Condition()  # Ожидание событий обработчиками и места в очереди потоком чтения
+        self.queues = {}  # Очереди событий: команда QUIK# -> очередь
+        self.ready = deque()  # Очереди с событиями, которые ждут свободного обработчика
+        self.closed = False  # Диспетчер остановлен
+        self.threads = [Thread(target=self.worker, name=f'CallbackWorker{i}', daemon=True) for i in range(workers)]  # Потоки обработчиков
+        for thread in self.threads:  # Пробегаемся по всем потокам обработчиков
+            thread.start()  # Запускаем поток
+
+    def queue(self, cmd) -> CallbackQueue:
+        """Очередь событий команды. Создается при первом событии. Вызывается под блокировкой
+
+        :param str cmd: Команда QUIK#
+        """
+        queue = self.queues.get(cmd)  # Очередь событий команды
+        if queue is None:  # Если событий этой команды еще не было
+            if cmd in self.conflate:  # Если по команде доставляем только последнее событие по ключу
+                overflow = 'conflate'  # то события сливаются всегда
+            else:  # Для остальных команд
+                overflow = self.overflow.get(cmd, 'block') if isinstance(self.overflow, dict) else self.overflow  # Политика при переполнении для команды
+            queue = self.queues[cmd] = CallbackQueue(cmd, self.maxsize, overflow)  # Создаем очередь
+        return queue
+
+    @staticmethod
+    def conflation_key(data):
+        """Ключ слияния события: тикер и, если есть, интервал и параметр
+
+        :param dict data: Событие в виде JSON
+        """
+        event = data.get('data')  # Данные события
+        if not isinstance(event, dict):  # Если у события нет данных тикера
+            return None  # то все события команды сливаются в одно последнее
+        return (event.get('class_code', event.get('class')), event.get('sec_code', event.get('sec')),
+                event.get('interval'), event.get('param'))  # Режим торгов, тикер, интервал, параметр
+
+    def put(self, cmd, data, key=None):
+        """Постановка события в очередь команды. Вызывается из потока чтения
+
+        :param str cmd: Команда QUIK#
+        :param data: Событие
+        :param key: Ключ слияния для политики conflate. None - вычислить по событию
+        """
+        with self.condition:
+            queue = self.queue(cmd)  # Очередь событий команды
+            if queue.overflow == 'block':  # Если при переполнении ждем
+                if queue.full():  # Если очередь заполнена
+                    queue.blocked += 1  # Поток чтения ждет места в очереди
+                    while queue.full() and not self.closed:  # Пока обработчик не освободит место
+                        self.condition.wait()
+            elif queue.overflow == 'conflate' and key is None:  # Если события сливаются по ключу, но он не задан
+                key = self.conflation_key(data)  # то вычисляем ключ по событию
+            queue.put((monotonic(), data), key)  # Ставим событие в очередь
+            if not queue.scheduled and not queue.busy:  # Если очередь не ждет обработчика и не обрабатывается
+                queue.scheduled = True  # то она будет ждать обработчика
+                self.ready.append(queue)  # Ставим ее в список ожидающих
+                self.condition.notify_all()  # Будим обработчики
+
+    def worker(self):
+        """Поток обработчика. Берет очередь с событиями и обрабатывает все ее события по порядку"""
+        while True:  # Пока поток нужен
+            with self.condition:
+                while not self.ready and not self.closed:  # Пока нет очередей с событиями
+                    self.condition.wait()  # ждем
+                if self.closed:  # Если диспетчер остановлен
+                    return  # то выходим, дальше не продолжаем
+                queue = self.ready.popleft()  # Очередь с событиями
+                queue.scheduled = False  # Она больше не ждет обработчика
+                queue.busy = True  # События очереди обрабатываются этим потоком
+                items = queue.take()  # Забираем все события очереди
+                self.condition.notify_all()  # Место в очереди освободилось. Будим поток чтения
+            for received, data in items:  # Пробегаемся по всем событиям
+                lag = monotonic() - received  # Задержка обработки события
+                queue.last_lag = lag
+                queue.max_lag = max(queue.max_lag, lag)
+                queue.total_lag += lag
+                try:  # Ошибка обработчика не должна останавливать поток
+                    self.handler(data)  # Вызываем обработчик
+                except Exception:  # Если в обработчике возникла ошибка
+                    self.logger.exception(f'Ошибка в обработчике {queue.cmd}')  # то выводим ее в лог
+                queue.processed += 1  # Кол-во обработанных событий
+            with self.condition:
+                queue.busy = False  # События очереди обработаны
+                if queue.items and not queue.scheduled:  # Если пока обрабатывали, пришли новые события
+                    queue.scheduled = True  # то очередь снова ждет обработчика
+                    self.ready.append(queue)  # Ставим ее в список ожидающих
+                    self.condition.notify_all()  # Будим обработчики
+
+    def stats(self) -> dict:
+        """Статистика очередей по командам QUIK#"""
+        with self.condition:
+            return {cmd: queue.stats() for cmd, queue in self.queues.items()}
+
+    def conflation_stats(self) -> dict:
+        """Кол-во событий, замененных более новыми, по командам и ключам"""
+        with self.condition:
+            return {cmd: dict(queue.conflated_by_key) for cmd, queue in self.queues.items() if queue.overflow == 'conflate'}
+
+    def close(self):
+        """Остановка потоков обработчиков. Необработанные события отбрасываются"""
+        with self.condition:
+            self.closed = True  # Диспетчер остановлен
+            self.condition.notify_all()  # Будим все потоки
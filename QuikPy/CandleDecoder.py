@@ -0,0 +1,49 @@
+from operator import itemgetter  # Поля свечи без цикла Python по ключам
+
+import numpy as np  # Столбцы свечей
+
+
+class CandleDecoder:
+    """Перевод свечей QUIK (ответ get_candles_from_data_source, get_candles_since) в столбцы NumPy
+
+    Вместо pd.json_normalize по списку вложенных словарей и сборки даты/времени через pd.to_datetime из 6-и столбцов
+    каждое поле свечи один раз переносится в заранее выделенный массив нужного типа, а дата и время считаются векторно.
+    DataFrame строится из готовых столбцов без копирования только при необходимости
+
+    Пример:
+    candles = qp_provider.get_candles_since('TQBR', 'SBER', 5, count=1000)
+    columns = CandleDecoder.decode(candles)  # columns['close'] - массив NumPy
+    df = CandleDecoder.to_dataframe(columns)  # или сразу CandleDecoder.to_dataframe(candles)
+    """
+    prices = ('open', 'high', 'low', 'close')  # Столбцы цен
+    columns = ('datetime',) + prices + ('volume',)  # Все столбцы в порядке DataFrame
+    datetime_fields = itemgetter('year', 'month', 'day', 'hour', 'min', 'sec')  # Поля даты и времени свечи QUIK
+
+    @classmethod
+    def decode(cls, candles) -> dict[str, np.ndarray]:
+        """Свечи в виде столбцов
+
+        :param list[dict] candles: Свечи в формате QUIK
+        :return: datetime - секунды с 01.01.1970 по времени свечи (МСК) int64, open/high/low/close - float64, volume - int64
+        """
+        size = len(candles)  # Кол-во свечей
+        columns = {price: np.fromiter((candle[price] for candle in candles), np.float64, size) for price in cls.prices}  # Цены
+        columns['volume'] = np.fromiter((candle['volume'] for candle in candles), np.int64, size)  # Объемы
+        fields = np.fromiter((cls.datetime_fields(candle['datetime']) for candle in candles), np.dtype((np.int64, 6)), size)  # Год, месяц, день, час, минута, секунда
+        days = ((fields[:, 0] - 1970).astype('datetime64[Y]').astype('datetime64[M]') + (fields[:, 1] - 1)).astype('datetime64[D]').astype(np.int64) + fields[:, 2] - 1  # Дни с 01.01.1970
+        columns['datetime'] = days * 86400 + fields[:, 3] * 3600 + fields[:, 4] * 60 + fields[:, 5]  # Секунды с 01.01.1970
+        return {column: columns[column] for column in cls.columns}
+
+    @classmethod
+    def to_dataframe(cls, candles):
+        """Свечи в виде pandas DataFrame с индексом и столбцом datetime, как в Examples/Bars.get_candles_from_provider
+
+        :param list[dict]|dict[str, np.ndarray] candles: Свечи в формате QUIK или столбцы из decode
+        :return: pandas DataFrame со столбцами datetime, open, high, low, close, volume
+        """
+        import pandas as pd  # pandas нужен только для DataFrame. Столбцы без него
+        columns = candles if isinstance(candles, dict) else cls.decode(candles)  # Столбцы
+        dt = pd.DatetimeIndex(columns['datetime'].astype('datetime64[s]').astype('datetime64[ns]'), name='datetime')  # Дата и время
+        df = pd.DataFrame({column: columns[column] for column in cls.columns[1:]}, index=dt, copy=False)  # Цены и объемы
+        df.insert(0, 'datetime', dt)  # Колонка datetime нужна, чтобы не удалять одинаковые OHLCV на разное время
+        return df
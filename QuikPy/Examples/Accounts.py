@@ -18,13 +18,14 @@ if __name__ == '__main__':  # Точка входа при запуске это
                         handlers=[logging.FileHandler('Accounts.log'), logging.StreamHandler()])  # Лог записываем в файл и выводим на консоль
     logging.Formatter.converter = lambda *args: datetime.now(tz=qp_provider.tz_msk).timetuple()  # В логе время указываем по МСК
 
-    class_codes = qp_provider.get_classes_list()['data']  # Режимы торгов через запятую
+    class_codes = qp_provider.get_classes()  # Режимы торгов через запятую. Из QUIK получаются один раз за торговую сессию
     class_codes_list = class_codes[:-1].split(',')  # Удаляем последнюю запятую, разбиваем значения по запятой в список режимов торгов
     trade_accounts = qp_provider.get_trade_accounts()['data']  # Все торговые счета
     money_limits = qp_provider.get_money_limits()['data']  # Все денежные лимиты (остатки на счетах)
     depo_limits = qp_provider.get_all_depo_limits()['data']  # Все лимиты по бумагам (позиции по инструментам)
     orders = qp_provider.get_all_orders()['data']  # Все заявки
     stop_orders = qp_provider.get_all_stop_orders()['data']  # Все стоп заявки
+    positions_class_codes = qp_provider.sec_codes_to_class_codes({depo_limit['sec_code'] for depo_limit in depo_limits if depo_limit['currentbal'] != 0})  # Режимы торгов всех позиций одним пакетом запросов
 
     for trade_account in trade_accounts:  # Пробегаемся по всем счетам (Коды клиента/Фирма/Счет)
         trade_account_class_codes = trade_account['class_codes'][1:-1].split('|')  # Режимы торгов счета. Удаляем первую и последнюю вертикальную черту, разбиваем значения по вертикальной черте
@@ -66,7 +67,7 @@ if __name__ == '__main__':  # Точка входа при запуске это
                                          depoLimit['currentbal'] != 0]  # Берем только открытые позиции по фирме и дню
                 for firm_kind_depo_limit in firm_kind_depo_limits:  # Пробегаемся по всем позициям
                     sec_code = firm_kind_depo_limit["sec_code"]  # Код тикера
-                    class_code = qp_provider.get_security_class(class_codes, sec_code)['data']  # Код режима торгов из всех режимов по тикеру
+                    class_code = positions_class_codes[sec_code]  # Код режима торгов тикера
                     entry_price = qp_provider.quik_price_to_price(class_code, sec_code, float(firm_kind_depo_limit["wa_position_price"]))  # Цена входа в рублях за штуку
                     last_price = qp_provider.quik_price_to_price(class_code, sec_code, float(qp_provider.get_param_ex(class_code, sec_code, 'LAST')['data']['param_value']))  # Последняя цена сделки в рублях за штуку
                     si = qp_provider.get_symbol_info(class_code, sec_code)  # Спецификация тикера
@@ -0,0 +1,45 @@
+import logging  # Выводим лог на консоль и в файл
+from datetime import datetime  # Дата и время
+from contextlib import aclosing  # Закрытие асинхронного итератора сразу после выхода из async for
+import asyncio  # Асинхронная работа с QUIK
+
+from QuikPy import AsyncQuikPy  # Асинхронная работа с QUIK из Python через LUA скрипты QUIK#
+
+
+async def print_candles(client, class_code, sec_code, interval, count):
+    """Получение новых свечей через async for
+
+    :param AsyncQuikPy client: Асинхронный провайдер QUIK
+    :param str class_code: Код режима торгов
+    :param str sec_code: Тикер
+    :param int interval: Кол-во в минутах
+    :param int count: Кол-во свечей, после которого заканчиваем получение
+    """
+    async with aclosing(client.candles(class_code, sec_code, interval)) as candles:  # Подписка на новые свечи. При первой подписке получим все свечки с начала прошлой сессии
+        async for candle in candles:  # Пробегаемся по всем новым свечам
+            logger.info(f'{class_code}.{sec_code} M{interval}: {candle}')
+            count -= 1  # Осталось получить свечей
+            if count == 0:  # Если получили все свечи
+                break  # то выходим
+    logger.info(f'Получено свечей на интервал {interval}. Подписка отменена при закрытии итератора')
+
+
+async def main():
+    async with AsyncQuikPy() as client:  # Подключение к локальному запущенному терминалу QUIK по портам по умолчанию
+        logging.Formatter.converter = lambda *args: datetime.now(tz=client.tz_msk).timetuple()  # В логе время указываем по МСК
+        logger.info(f'Отклик QUIK на команду Ping: {(await client.ping())["data"]}')
+        class_code = 'SPBFUT'  # Фьючерсы
+        sec_codes = ('SiH5', 'RIH5')  # Для фьючерсов: <Код тикера><Месяц экспирации: 3-H, 6-M, 9-U, 12-Z><Последняя цифра года>
+        last_prices = await asyncio.gather(*[client.get_param_ex(class_code, sec_code, 'LAST') for sec_code in sec_codes])  # Запросы отправляются одновременно
+        for sec_code, last_price in zip(sec_codes, last_prices):  # Пробегаемся по всем тикерам
+            logger.info(f'Последняя цена сделки {class_code}.{sec_code}: {last_price["data"]["param_value"]}')
+        await asyncio.gather(*[print_candles(client, class_code, sec_code, 1, 3) for sec_code in sec_codes])  # Свечи по всем тикерам получаем в одном потоке
+
+
+if __name__ == '__main__':  # Точка входа при запуске этого скрипта
+    logger = logging.getLogger('QuikPy.AsyncStream')  # Будем вести лог
+    logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',  # Формат сообщения
+                        datefmt='%d.%m.%Y %H:%M:%S',  # Формат даты
+                        level=logging.DEBUG,  # Уровень логируемых событий NOTSET/DEBUG/INFO/WARNING/ERROR/CRITICAL
+                        handlers=[logging.FileHandler('AsyncStream.log'), logging.StreamHandler()])  # Лог записываем в файл и выводим на консоль
+    asyncio.run(main())  # Запускаем асинхронный скрипт
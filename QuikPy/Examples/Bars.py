@@ -6,6 +6,7 @@ import os.path
 import pandas as pd
 
 from QuikPy import QuikPy  # Работа с QUIK из Python через LUA скрипты QUIK#
+from QuikPy.CandleDecoder import CandleDecoder  # Перевод свечей QUIK в столбцы
 
 
 logger = logging.getLogger('QuikPy.Bars')  # Будем вести лог. Определяем здесь, т.к. возможен внешний вызов ф-ии
@@ -42,35 +43,22 @@ def load_candles_from_file(class_code, security_code, tf) -> pd.DataFrame:
 
 
 # noinspection PyShadowingNames
-def get_candles_from_provider(qp_provider, class_code, security_code, tf) -> pd.DataFrame:
+def get_candles_from_provider(qp_provider, class_code, security_code, tf, since=None) -> pd.DataFrame:
     """Получение бар из провайдера
 
     :param QuikPy qp_provider: Провайдер QUIK
     :param str class_code: Код режима торгов
     :param str security_code: Код тикера
     :param str tf: Временной интервал https://ru.wikipedia.org/wiki/Таймфрейм
+    :param datetime since: Дата и время последнего известного бара. Из QUIK получаем бары начиная с него. None - все бары
     """
     time_frame, _ = qp_provider.timeframe_to_quik_timeframe(tf)  # Временной интервал QUIK
-    logger.info(f'Получение истории {class_code}.{security_code} {tf} из QUIK')
-    history = qp_provider.get_candles_from_data_source(class_code, security_code, time_frame)  # Получаем все бары из QUIK
-    if not history:  # Если бары не получены
-        logger.error('Ошибка при получении истории: История не получена')
-        return pd.DataFrame()  # то выходим, дальше не продолжаем
-    if 'data' not in history:  # Если бар нет в словаре
-        logger.error(f'Ошибка при получении истории: {history}')
-        return pd.DataFrame()  # то выходим, дальше не продолжаем
-    new_bars = history['data']  # Получаем все бары из QUIK
+    logger.info(f'Получение истории {class_code}.{security_code} {tf} из QUIK' + (f' с {since:{dt_format}}' if since is not None else ''))
+    new_bars = qp_provider.get_candles_since(class_code, security_code, time_frame, since)  # Получаем из QUIK только новые бары
     if len(new_bars) == 0:  # Если новых бар нет
         logger.info('Новых записей нет')
         return pd.DataFrame()  # то выходим, дальше не продолжаем
-    pd_bars = pd.json_normalize(new_bars)  # Переводим список бар в pandas DataFrame
-    pd_bars.rename(columns={'datetime.year': 'year', 'datetime.month': 'month', 'datetime.day': 'day',
-                            'datetime.hour': 'hour', 'datetime.min': 'minute', 'datetime.sec': 'second'},
-                   inplace=True)  # Чтобы получить дату/время переименовываем колонки
-    pd_bars['datetime'] = pd.to_datetime(pd_bars[['year', 'month', 'day', 'hour', 'minute', 'second']])  # Собираем дату/время из колонок
-    pd_bars = pd_bars[['datetime', 'open', 'high', 'low', 'close', 'volume']]  # Отбираем нужные колонки. Дата и время нужны, чтобы не удалять одинаковые OHLCV на разное время
-    pd_bars.index = pd_bars['datetime']  # Дата/время также будет индексом
-    pd_bars.volume = pd.to_numeric(pd_bars.volume, downcast='integer')  # Объемы могут быть только целыми
+    pd_bars = CandleDecoder.to_dataframe(new_bars)  # Переводим список бар в pandas DataFrame с колонками datetime, OHLCV и индексом datetime. Объемы целые
     pd_bars.drop_duplicates(keep='last', inplace=True)  # Могут быть получены дубли, удаляем их
     logger.info(f'Первый бар    : {pd_bars.index[0]:{dt_format}}')
     logger.info(f'Последний бар : {pd_bars.index[-1]:{dt_format}}')
@@ -93,7 +81,7 @@ def save_candles_to_file(qp_provider, class_code, security_codes, tf='D1',
     """
     for security_code in security_codes:  # Пробегаемся по всем тикерам
         file_bars = load_candles_from_file(class_code, security_code, tf)  # Получаем бары из файла
-        pd_bars = get_candles_from_provider(qp_provider, class_code, security_code, tf)  # Получаем бары из провайдера
+        pd_bars = get_candles_from_provider(qp_provider, class_code, security_code, tf, None if file_bars.empty else file_bars.index[-1])  # Получаем из провайдера бары после последнего бара в файле
         if pd_bars.empty:  # Если бары не получены
             logger.info('Новых бар нет')
             continue  # то переходим к следующему тикеру, дальше не продолжаем
@@ -115,7 +103,8 @@ def save_candles_to_file(qp_provider, class_code, security_codes, tf='D1',
             logger.info('Новых бар нет')
             continue  # то переходим к следующему тикеру, дальше не продолжаем
         if not file_bars.empty:  # Если файл существует
-            pd_bars = pd.concat([file_bars, pd_bars]).drop_duplicates(keep='last').sort_index()  # Объединяем файл с данными из QUIK, убираем дубликаты, сортируем заново
+            pd_bars = pd.concat([file_bars, pd_bars])  # Объединяем файл с данными из QUIK
+            pd_bars = pd_bars[~pd_bars.index.duplicated(keep='last')].sort_index()  # Последний бар файла мог быть не завершен. Оставляем его из QUIK, сортируем заново
         pd_bars = pd_bars[['open', 'high', 'low', 'close', 'volume']]  # Отбираем нужные колонки. Дата и время будет экспортирована как индекс
         filename = f'{datapath}{class_code}.{security_code}_{tf}.txt'
         logger.info('Сохранение файла')
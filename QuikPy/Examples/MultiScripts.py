@@ -25,6 +25,7 @@ def script2(provider: QuikPy):  # 2-ой скрипт
 if __name__ == '__main__':  # Точка входа при запуске этого скрипта
     logger = logging.getLogger('QuikPy.MultiScripts')  # Будем вести лог
     qp_provider = QuikPy()  # Подключение к локальному запущенному терминалу QUIK по портам по умолчанию
+    # qp_provider = QuikPy(pipelined=True)  # Конвейерный режим. Скрипты не ждут друг друга, ответы сопоставляются с запросами по id
 
     logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',  # Формат сообщения
                         datefmt='%d.%m.%Y %H:%M:%S',  # Формат даты
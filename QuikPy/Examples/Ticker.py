@@ -18,8 +18,14 @@ if __name__ == '__main__':  # Точка входа при запуске это
     # datanames = ('SBER',)  # Тикер без режима торгов
     datanames = ('TQBR.SBER', 'TQBR.HYDR', 'SPBFUT.SiU4', 'SPBFUT.RIU4', 'SPBFUT.BRU4', 'SPBFUT.CNYRUBF')  # Кортеж тикеров
 
-    for dataname in datanames:  # Пробегаемся по всем тикерам
-        class_code, sec_code = qp_provider.dataname_to_class_sec_codes(dataname)  # Код режима торгов и тикер
+    class_sec_codes = qp_provider.datanames_to_class_sec_codes(datanames)  # Коды режимов торгов и тикеры. Тикеры без режима торгов ищутся одним пакетом запросов
+    qp_provider.prefetch_symbols(class_sec_codes)  # Спецификации всех тикеров получаем одним запросом. Дальше берем их из справочника
+    with qp_provider.batch():  # Запросы по всем тикерам отправляем одним пакетом. Ответы получим после выхода из with
+        snapshots = [(qp_provider.get_trade_account(class_code),
+                      qp_provider.get_param_ex(class_code, sec_code, 'LAST'),
+                      qp_provider.get_param_ex(class_code, sec_code, 'STEPPRICE')) for class_code, sec_code in class_sec_codes]  # Торговый счет, последняя цена сделки, стоимость шага цены
+
+    for (class_code, sec_code), (trade_account, last_price, step_price) in zip(class_sec_codes, snapshots):  # Пробегаемся по всем тикерам
         si = qp_provider.get_symbol_info(class_code, sec_code)  # Спецификация тикера
         logger.debug(f'Ответ от сервера: {si}')
         logger.info(f'Информация о тикере {si["class_code"]}.{si["sec_code"]} ({si["short_name"]}):')  # Короткое наименование инструмента
@@ -30,11 +36,11 @@ if __name__ == '__main__':  # Точка входа при запуске это
         logger.info(f'- Шаг цены: {min_price_step}')
         scale = si['scale']  # Кол-во десятичных знаков
         logger.info(f'- Кол-во десятичных знаков: {scale}')
-        trade_account = qp_provider.get_trade_account(class_code)['data']  # Торговый счет для класса тикера
+        trade_account = trade_account.result()['data']  # Торговый счет для класса тикера
         logger.info(f'- Торговый счет: {trade_account}')
-        last_price = float(qp_provider.get_param_ex(class_code, sec_code, 'LAST')['data']['param_value'])  # Последняя цена сделки
+        last_price = float(last_price.result()['data']['param_value'])  # Последняя цена сделки
         logger.info(f'- Последняя цена сделки: {last_price}')
-        step_price = float(qp_provider.get_param_ex(class_code, sec_code, 'STEPPRICE')['data']['param_value'])  # Стоимость шага цены
+        step_price = float(step_price.result()['data']['param_value'])  # Стоимость шага цены
         if lot_size > 1 and step_price:  # Если есть лот и стоимость шага цены
             logger.info(f'- Стоимость шага цены: {step_price} руб.')
             lot_price = last_price // min_price_step * step_price  # Цена за лот в рублях
@@ -43,4 +49,5 @@ if __name__ == '__main__':  # Точка входа при запуске это
             logger.info(f'- Цена за штуку: {lot_price} / {lot_size} = {pcs_price} руб.')
             logger.info(f'- Последняя цена сделки: {qp_provider.price_to_quik_price(class_code, sec_code, pcs_price)} из цены за штуку в рублях')
 
+    logger.debug(f'Справочник тикеров: {qp_provider.symbols.stats()}')  # Кол-во спецификаций, попаданий и промахов
     qp_provider.close_connection_and_thread()  # Перед выходом закрываем соединение для запросов и поток обработки функций обратного вызова
@@ -0,0 +1,75 @@
+from json import loads  # Принимать данные в QUIK будем через JSON
+from time import perf_counter  # Замер времени разбора
+
+
+class LineDecoder:
+    """Разбор потока байт из соединения с QUIK# на сообщения
+
+    QUIK# отправляет каждое сообщение одной строкой JSON в кодировке Windows 1251, завершенной переводом строки.
+    Граница сообщения ищется в байтах. Каждое сообщение переводится из Windows 1251 и разбирается из JSON ровно один раз.
+    Время разбора растет линейно от размера сообщения, даже если оно пришло множеством фрагментов
+    """
+    encoding = 'cp1251'  # Кодировка сообщений QUIK#
+
+    def __init__(self, metrics=None):
+        """Инициализация
+
+        :param Metrics metrics: Метрики. Если заданы и включены, то замеряется время разбора и размер каждого сообщения
+        """
+        self.metrics = metrics  # Метрики
+        self.buffer = bytearray()  # Байты, еще не разобранные на сообщения
+        self.scanned = 0  # Кол-во байт в начале буфера, в которых уже точно нет перевода строки
+
+    def lines(self, fragment) -> list[bytes]:
+        """Законченные сообщения в виде строк байт
+
+        :param bytes fragment: Фрагмент, принятый из соединения
+        :return: Список законченных сообщений без перевода строки. Пустые строки пропускаются
+        """
+        self.buffer += fragment  # Добавляем фрагмент в конец буфера
+        if self.buffer.find(b'\n', self.scanned) == -1:  # Если в новых байтах нет перевода строки
+            self.scanned = len(self.buffer)  # то в следующий раз будем искать только в новом фрагменте
+            return []  # Законченных сообщений нет
+        end = self.buffer.rfind(b'\n')  # Конец последнего законченного сообщения
+        lines = bytes(self.buffer[:end]).split(b'\n')  # Разбиваем законченные сообщения
+        del self.buffer[:end + 1]  # В буфере остается только начало незаконченного сообщения
+        self.scanned = len(self.buffer)  # В нем перевода строки нет
+        return [line for line in lines if line not in (b'', b'\r')]  # Пустые строки не разбираем
+
+    def messages(self, fragment) -> list[dict]:
+        """Законченные сообщения в виде JSON
+
+        :param bytes fragment: Фрагмент, принятый из соединения
+        :return: Список законченных сообщений
+        """
+        return [self.message(line) for line in self.lines(fragment)]
+
+    def message(self, line):
+        """Разбор одного сообщения с замером времени разбора и размера, если метрики включены
+
+        :param bytes line: Сообщение в виде строки байт без перевода строки
+        :return: Сообщение в виде JSON
+        """
+        if self.metrics is None or not self.metrics.enabled:  # Если метрики не ведем
+            return self.decode(line)  # то просто разбираем сообщение
+        start = perf_counter()  # Время начала разбора
+        message = self.decode(line)  # Разбираем сообщение
+        elapsed = perf_counter() - start  # Время разбора
+        cmd = message.get('cmd') if isinstance(message, dict) else None  # Команда QUIK#
+        self.metrics.observe(cmd, 'decode', elapsed)
+        self.metrics.observe(cmd, 'bytes_received', len(line))
+        return message
+
+    @classmethod
+    def decode(cls, line):
+        """Разбор одного сообщения
+
+        :param bytes line: Сообщение в виде строки байт без перевода строки
+        :return: Сообщение в виде JSON
+        """
+        return loads(line.decode(cls.encoding))  # Переводим из кодировки Windows 1251, разбираем JSON
+
+    def reset(self):
+        """Сброс незаконченного сообщения. Например, после переподключения"""
+        self.buffer.clear()
+        self.scanned = 0
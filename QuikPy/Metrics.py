@@ -0,0 +1,167 @@
+from collections import defaultdict  # Счетчики по командам
+from threading import Lock  # Метрики пишутся из разных потоков
+
+
+class Histogram:
+    """Гистограмма с логарифмически-линейными интервалами (как в HdrHistogram)
+
+    Значения хранятся целыми числами в единицах scale. Интервал значения - старшие significant_bits бит значения,
+    поэтому относительная ошибка не превышает 2 ** (1 - significant_bits) при любом диапазоне значений.
+    Память - только на непустые интервалы
+    """
+    significant_bits = 7  # Кол-во значащих бит интервала. Ошибка не более 1.6%
+
+    def __init__(self, scale=1.0):
+        """Инициализация
+
+        :param float scale: Единица хранения значения. Например, 1e-9 для времени в секундах (хранится в наносекундах)
+        """
+        self.scale = scale  # Единица хранения значения
+        self.buckets = defaultdict(int)  # Нижняя граница интервала -> кол-во значений
+        self.count = 0  # Кол-во значений
+        self.total = 0  # Сумма значений в единицах хранения
+        self.min = None  # Минимальное значение в единицах хранения
+        self.max = None  # Максимальное значение в единицах хранения
+
+    def record(self, value):
+        """Добавление значения
+
+        :param float value: Значение. Например, время в секундах или размер в байтах
+        """
+        value = int(value / self.scale)  # Значение в единицах хранения
+        shift = max(value.bit_length() - self.significant_bits, 0)  # Сколько младших бит отбрасываем
+        self.buckets[value >> shift << shift] += 1  # Нижняя граница интервала
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def upper(self, lower) -> int:
+        """Верхняя граница интервала в единицах хранения
+
+        :param int lower: Нижняя граница интервала
+        """
+        return lower + (1 << max(lower.bit_length() - self.significant_bits, 0)) - 1
+
+    def percentile(self, percent) -> float:
+        """Значение, не больше которого percent процентов значений
+
+        :param float percent: Процент от 0 до 100
+        """
+        if not self.count:  # Если значений нет
+            return 0.0
+        rank = percent / 100 * self.count  # Кол-во значений не больше искомого
+        seen = 0  # Кол-во значений в пройденных интервалах
+        for lower in sorted(self.buckets):  # Пробегаемся по всем интервалам по возрастанию
+            seen += self.buckets[lower]
+            if seen >= rank:  # Если искомое значение в этом интервале
+                return min(self.upper(lower), self.max) * self.scale  # то возвращаем верхнюю границу интервала
+        return self.max * self.scale
+
+    def cumulative(self) -> list[tuple[float, int]]:
+        """Верхние границы интервалов и кол-во значений не больше них. Для формата Prometheus"""
+        seen = 0  # Кол-во значений в пройденных интервалах
+        result = []
+        for lower in sorted(self.buckets):  # Пробегаемся по всем интервалам по возрастанию
+            seen += self.buckets[lower]
+            result.append((self.upper(lower) * self.scale, seen))
+        return result
+
+    def stats(self) -> dict:
+        """Кол-во, сумма, минимум, максимум, среднее и процентили"""
+        if not self.count:  # Если значений нет
+            return dict(count=0, sum=0.0, min=0.0, max=0.0, mean=0.0, p50=0.0, p90=0.0, p99=0.0, p999=0.0)
+        return dict(count=self.count, sum=self.total * self.scale, min=self.min * self.scale, max=self.max * self.scale,
+                    mean=self.total * self.scale / self.count, p50=self.percentile(50), p90=self.percentile(90),
+                    p99=self.percentile(99), p999=self.percentile(99.9))
+
+
+class Metrics:
+    """Счетчики и гистограммы по командам QUIK#
+
+    Гистограммы времени (в секундах):
+    - rtt - время от отправки запроса до получения ответа
+    - lock_wait - ожидание блокировки соединения или свободного соединения пула
+    - decode - разбор сообщения из JSON
+    - handler - выполнение обработчика функции обратного вызова
+    Гистограммы размера (в байтах): bytes_sent - запрос, bytes_received - ответ или функция обратного вызова.
+    Счетчики: requests - запросы, errors - ошибки соединения, events - функции обратного вызова
+
+    Включаются и выключаются в любой момент через enabled. Когда выключены, каждая точка замера стоит одну проверку атрибута
+    """
+    times = ('rtt', 'lock_wait', 'decode', 'handler')  # Гистограммы времени
+    sizes = ('bytes_sent', 'bytes_received')  # Гистограммы размера
+    counters = ('requests', 'errors', 'events')  # Счетчики
+    descriptions = {'rtt': 'Время от отправки запроса до получения ответа', 'lock_wait': 'Ожидание соединения для запроса',
+                    'decode': 'Разбор сообщения из JSON', 'handler': 'Выполнение обработчика функции обратного вызова',
+                    'bytes_sent': 'Размер запроса', 'bytes_received': 'Размер ответа или функции обратного вызова',
+                    'requests': 'Кол-во запросов', 'errors': 'Кол-во ошибок соединения', 'events': 'Кол-во функций обратного вызова'}  # Описания для Prometheus
+
+    def __init__(self, enabled=False, prefix='quikpy'):
+        """Инициализация
+
+        :param bool enabled: Вести метрики
+        :param str prefix: Префикс названий метрик в формате Prometheus
+        """
+        self.enabled = enabled  # Вести метрики
+        self.prefix = prefix  # Префикс названий метрик
+        self.lock = Lock()  # Метрики пишутся из потоков запросов и функций обратного вызова
+        self.values = {}  # (команда, метрика) -> гистограмма или кол-во
+
+    def observe(self, cmd, name, value):
+        """Добавление значения в гистограмму
+
+        :param str cmd: Команда QUIK#
+        :param str name: Метрика из times или sizes
+        :param float value: Время в секундах или размер в байтах
+        """
+        with self.lock:
+            histogram = self.values.get((cmd, name))  # Гистограмма метрики команды
+            if histogram is None:  # Если значений еще не было
+                histogram = self.values[cmd, name] = Histogram(1e-9 if name in self.times else 1)  # то создаем гистограмму. Время храним в наносекундах
+            histogram.record(value)
+
+    def count(self, cmd, name, value=1):
+        """Увеличение счетчика
+
+        :param str cmd: Команда QUIK#
+        :param str name: Метрика из counters
+        :param int value: На сколько увеличить
+        """
+        with self.lock:
+            self.values[cmd, name] = self.values.get((cmd, name), 0) + value
+
+    def stats(self) -> dict:
+        """Метрики по командам: команда -> метрика -> кол-во или статистика гистограммы"""
+        with self.lock:
+            result = defaultdict(dict)
+            for (cmd, name), value in self.values.items():  # Пробегаемся по всем метрикам
+                result[cmd][name] = value.stats() if isinstance(value, Histogram) else value
+            return dict(result)
+
+    def prometheus(self) -> str:
+        """Метрики в текстовом формате Prometheus"""
+        lines = []  # Строки текстового формата
+        with self.lock:
+            for name in self.counters + self.times + self.sizes:  # Пробегаемся по всем метрикам
+                series = sorted((cmd, value) for (cmd, metric), value in self.values.items() if metric == name)  # Значения метрики по командам
+                if not series:  # Если значений нет
+                    continue  # то метрику не выводим
+                if name in self.counters:  # Счетчик
+                    metric = f'{self.prefix}_{name}_total'
+                    lines += [f'# HELP {metric} {self.descriptions[name]}', f'# TYPE {metric} counter']
+                    lines += [f'{metric}{{cmd="{cmd}"}} {value}' for cmd, value in series]
+                    continue
+                metric = f'{self.prefix}_{name}_seconds' if name in self.times else f'{self.prefix}_{name}'  # Гистограмма
+                lines += [f'# HELP {metric} {self.descriptions[name]}', f'# TYPE {metric} histogram']
+                for cmd, histogram in series:  # Пробегаемся по всем командам
+                    lines += [f'{metric}_bucket{{cmd="{cmd}",le="{upper:.9g}"}} {seen}' for upper, seen in histogram.cumulative()]
+                    lines += [f'{metric}_bucket{{cmd="{cmd}",le="+Inf"}} {histogram.count}',
+                              f'{metric}_sum{{cmd="{cmd}"}} {histogram.total * histogram.scale:.9g}',
+                              f'{metric}_count{{cmd="{cmd}"}} {histogram.count}']
+        return '\n'.join(lines) + '\n'
+
+    def reset(self):
+        """Сброс всех метрик"""
+        with self.lock:
+            self.values.clear()
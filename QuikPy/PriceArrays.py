@@ -0,0 +1,72 @@
+import numpy as np  # Конвертация целых столбцов цен и кол-ва одной операцией
+
+from . import PriceRules  # Правила перевода цен и кол-ва по спецификации тикера
+
+
+class PriceArrays:
+    """Конвертация массивов цен и кол-ва по спецификации тикера
+
+    Те же правила PriceRules, что и у price_to_valid_price, price_to_quik_price, quik_price_to_price, lots_to_size, size_to_lots,
+    но для всего массива сразу: спецификация и стоимость шага цены берутся один раз, а расчет выполняется NumPy без цикла Python.
+    Принимает списки, массивы NumPy, столбцы pandas. Возвращает массивы NumPy
+    """
+    bond_class_codes = PriceRules.bond_class_codes  # Облигации
+
+    @staticmethod
+    def to_int(values) -> np.ndarray:
+        """Перевод массива в целые числа"""
+        return values.astype(np.int64)
+
+    @classmethod
+    def valid_prices(cls, si, quik_prices) -> np.ndarray:
+        """Перевод цен в цены, которые примет QUIK в заявке
+
+        :param dict si: Спецификация тикера. None - цены не изменяются
+        :param quik_prices: Цены в QUIK
+        :return: Цены, кратные шагу цены. Если кол-во десятичных знаков = 0, то целые числа
+        """
+        return PriceRules.valid_price(si, np.asarray(quik_prices, dtype=np.float64), np.round, cls.to_int)
+
+    @classmethod
+    def prices_to_quik_prices(cls, class_code, si, step_price, prices) -> np.ndarray:
+        """Перевод цен в рублях за штуку в цены QUIK, которые примет QUIK в заявке
+
+        :param str class_code: Код режима торгов
+        :param dict si: Спецификация тикера. None - цены не изменяются
+        :param float step_price: Стоимость шага цены. Нужна только для фьючерсов
+        :param prices: Цены в рублях за штуку
+        :return: Цены в QUIK
+        """
+        return PriceRules.price_to_quik_price(class_code, si, step_price, np.asarray(prices, dtype=np.float64), np.round, cls.to_int)
+
+    @staticmethod
+    def quik_prices_to_prices(class_code, si, step_price, quik_prices) -> np.ndarray:
+        """Перевод цен QUIK в цены в рублях за штуку
+
+        :param str class_code: Код режима торгов
+        :param dict si: Спецификация тикера. None - цены не изменяются
+        :param float step_price: Стоимость шага цены. Нужна только для фьючерсов
+        :param quik_prices: Цены в QUIK
+        :return: Цены в рублях за штуку
+        """
+        return PriceRules.quik_price_to_price(class_code, si, step_price, np.asarray(quik_prices, dtype=np.float64))
+
+    @classmethod
+    def lots_to_sizes(cls, si, lots) -> np.ndarray:
+        """Перевод лотов в штуки
+
+        :param dict si: Спецификация тикера. None - кол-во не изменяется
+        :param lots: Кол-во лотов
+        :return: Кол-во штук
+        """
+        return PriceRules.lots_to_size(si, np.asarray(lots), cls.to_int)
+
+    @staticmethod
+    def sizes_to_lots(si, sizes) -> np.ndarray:
+        """Перевод штук в лоты
+
+        :param dict si: Спецификация тикера. None - кол-во не изменяется
+        :param sizes: Кол-во штук
+        :return: Кол-во лотов
+        """
+        return PriceRules.size_to_lots(si, np.asarray(sizes))
@@ -0,0 +1,105 @@
+"""Правила перевода цен и кол-ва по спецификации тикера
+
+Одни и те же для чисел (функции конвертации QuikPy и AsyncQuikPy) и массивов NumPy (PriceArrays): используются только операции,
+которые работают и с теми, и с другими. Округление и перевод в целые числа задает вызывающий.
+NumPy здесь не импортируется, чтобы не замедлять им запуск
+"""
+bond_class_codes = ('TQOB', 'TQCB', 'TQRD', 'TQIR')  # Облигации (Т+ Гособлигации, Т+ Облигации, Т+ Облигации Д, Т+ Облигации ПИР)
+
+
+def needs_step_price(class_code, si) -> bool:
+    """Нужна ли стоимость шага цены. Только для найденного фьючерса
+
+    :param str class_code: Код режима торгов
+    :param dict si: Спецификация тикера. None - тикер не найден
+    """
+    return bool(si) and class_code == 'SPBFUT'
+
+
+def valid_price(si, quik_price, round_to=round, to_int=int):
+    """Перевод цены в цену, которую примет QUIK в заявке
+
+    :param dict si: Спецификация тикера. None - цена не изменяется
+    :param quik_price: Цена в QUIK
+    :param round_to: Округление до заданного кол-ва десятичных знаков
+    :param to_int: Перевод в целые числа
+    :return: Цена, кратная шагу цены. Если кол-во десятичных знаков = 0, то целое число
+    """
+    if not si:  # Если тикер не найден
+        return quik_price  # то цена не изменяется
+    min_price_step = si['min_price_step']  # Шаг цены
+    price = quik_price // min_price_step * min_price_step  # Цена должна быть кратна шагу цены
+    scale = si['scale']  # Кол-во десятичных знаков
+    if scale > 0:  # Если задано кол-во десятичных знаков
+        return round_to(price, scale)  # то округляем цену кратно шага цены
+    return to_int(price)  # Если кол-во десятичных знаков = 0, то переводим цену в целое число
+
+
+def price_to_quik_price(class_code, si, step_price, price, round_to=round, to_int=int):
+    """Перевод цены в рублях за штуку в цену QUIK, которую примет QUIK в заявке
+
+    :param str class_code: Код режима торгов
+    :param dict si: Спецификация тикера. None - цена не изменяется
+    :param float step_price: Стоимость шага цены. Нужна только для фьючерсов
+    :param price: Цена в рублях за штуку
+    :param round_to: Округление до заданного кол-ва десятичных знаков
+    :param to_int: Перевод в целые числа
+    :return: Цена в QUIK
+    """
+    if not si:  # Если тикер не найден
+        return price  # то цена не изменяется
+    quik_price = price  # Изначально считаем, что цена не изменится
+    if class_code in bond_class_codes:  # Для облигаций
+        quik_price = price * 100 / si['face_value']  # Пункты цены для котировок облигаций представляют собой проценты номинала облигации
+    elif class_code == 'SPBFUT':  # Для рынка фьючерсов
+        lot_size = si['lot_size']  # Лот
+        if lot_size > 1 and step_price:  # Если есть лот и стоимость шага цены
+            lot_price = price * lot_size  # Цена в рублях за лот
+            quik_price = lot_price * si['min_price_step'] / step_price  # Цена в QUIK
+    return valid_price(si, quik_price, round_to, to_int)  # Возращаем цену, которую примет QUIK в заявке
+
+
+def quik_price_to_price(class_code, si, step_price, quik_price):
+    """Перевод цены QUIK в цену в рублях за штуку
+
+    :param str class_code: Код режима торгов
+    :param dict si: Спецификация тикера. None - цена не изменяется
+    :param float step_price: Стоимость шага цены. Нужна только для фьючерсов
+    :param quik_price: Цена в QUIK
+    :return: Цена в рублях за штуку
+    """
+    if not si:  # Если тикер не найден
+        return quik_price  # то цена не изменяется
+    if class_code in bond_class_codes:  # Для облигаций
+        return quik_price / 100 * si['face_value']  # Пункты цены для котировок облигаций представляют собой проценты номинала облигации
+    elif class_code == 'SPBFUT':  # Для рынка фьючерсов
+        lot_size = si['lot_size']  # Лот
+        if lot_size > 1 and step_price:  # Если есть лот и стоимость шага цены
+            lot_price = quik_price // si['min_price_step'] * step_price  # Цена за лот
+            return lot_price / lot_size  # Цена за штуку
+    return quik_price  # В остальных случаях цена не изменяется
+
+
+def lots_to_size(si, lots, to_int=int):
+    """Перевод лотов в штуки
+
+    :param dict si: Спецификация тикера. None - кол-во не изменяется
+    :param lots: Кол-во лотов
+    :param to_int: Перевод в целые числа
+    :return: Кол-во штук
+    """
+    if si and si['lot_size']:  # Если тикер найден, и задано кол-во штук в лоте
+        return to_int(lots * si['lot_size'])  # то возвращаем кол-во в штуках
+    return lots  # В остальных случаях возвращаем кол-во в лотах
+
+
+def size_to_lots(si, size):
+    """Перевод штук в лоты
+
+    :param dict si: Спецификация тикера. None - кол-во не изменяется
+    :param size: Кол-во штук
+    :return: Кол-во лотов
+    """
+    if si and int(si['lot_size']):  # Если тикер найден, и задано кол-во штук в лоте
+        return size // int(si['lot_size'])  # то возвращаем кол-во в лотах
+    return size  # В остальных случаях возвращаем кол-во в штуках
@@ -0,0 +1,1308 @@
+from typing import Union, Generator  # Объединение типов, шаги функций из нескольких запросов
+from datetime import datetime  # Дата и время свечей
+import logging  # Будем вести лог
+
+from pytz import timezone  # Работаем с временнОй зоной
+
+from .Recorder import Recorder  # Запись потока функций обратного вызова
+from . import PriceRules  # Правила перевода цен и кол-ва по спецификации тикера
+
+
+class QuikBase:
+    """Общая часть QuikPy и AsyncQuikPy без ввода-вывода: запросы QUIK# и функции, выполняющие несколько запросов
+
+    Запрос отправляет process_request клиента. Функция из нескольких запросов написана один раз в виде шагов: генератор отдает
+    запрос (функция и ее параметры) или список запросов и получает ответ. Шаги выполняет run_steps клиента.
+    В QuikPy функции возвращают ответ, в AsyncQuikPy - awaitable, который нужно ждать через await
+    """
+    tz_msk = timezone('Europe/Moscow')  # QUIK работает по московскому времени
+    currency = 'SUR'  # Суммы будем получать в рублях
+    limit_kind = 1  # Основной режим торгов T1
+    futures_firm_id = 'SPBFUT'  # Код фирмы для срочного рынка. Если ваш брокер поставил другую фирму для срочного рынка, то измените ее
+    logger = logging.getLogger('QuikPy')  # Будем вести лог
+    callbacks = {'OnFirm': 'on_firm', 'OnAllTrade': 'on_all_trade', 'OnTrade': 'on_trade', 'OnOrder': 'on_order',
+                 'OnAccountBalance': 'on_account_balance', 'OnFuturesLimitChange': 'on_futures_limit_change',
+                 'OnFuturesLimitDelete': 'on_futures_limit_delete', 'OnFuturesClientHolding': 'on_futures_client_holding',
+                 'OnMoneyLimit': 'on_money_limit', 'OnMoneyLimitDelete': 'on_money_limit_delete', 'OnDepoLimit': 'on_depo_limit',
+                 'OnDepoLimitDelete': 'on_depo_limit_delete', 'OnAccountPosition': 'on_account_position', 'OnStopOrder': 'on_stop_order',
+                 'OnTransReply': 'on_trans_reply', 'OnParam': 'on_param', 'OnQuote': 'on_quote', 'OnDisconnected': 'on_disconnected',
+                 'OnConnected': 'on_connected', 'OnClose': 'on_close', 'OnStop': 'on_stop', 'OnInit': 'on_init',
+                 'NewCandle': 'on_new_candle', 'lua_error': 'on_error'}  # Функции обратного вызова: команда QUIK# -> обработчик
+    handler_names = frozenset(callbacks.values())  # Названия обработчиков функций обратного вызова
+
+    @classmethod
+    def make_accounts(cls, trade_accounts, money_limits) -> list[dict]:
+        """Счета из торговых счетов и денежных лимитов
+
+        :param list[dict] trade_accounts: Все торговые счета
+        :param list[dict] money_limits: Все денежные лимиты (остатки на счетах)
+        :return: Счета
+        """
+        client_codes = {}  # Индекс денежных лимитов: фирма -> код клиента первого денежного лимита фирмы
+        for money_limit in money_limits:  # Пробегаемся по всем денежным лимитам один раз
+            client_codes.setdefault(money_limit['firmid'], money_limit['client_code'])
+        accounts = []  # Счета
+        for i, account in enumerate(trade_accounts):  # Пробегаемся по всем торговым счетам
+            firm_id = account['firmid']  # Фирма
+            client_code = client_codes.get(firm_id, '')  # Код клиента
+            class_codes: list[str] = account['class_codes'][1:-1].split('|')  # Список режимов торгов счета. Убираем первую и последнюю вертикальную черту, разбиваем по вертикальной черте
+            accounts.append(dict(  # Добавляем торговый счет
+                account_id=i, client_code=client_code, firm_id=firm_id, trade_account_id=account['trdaccid'],  # Номер счета / Код клиента / Фирма / Счет
+                class_codes=class_codes, futures=(firm_id == cls.futures_firm_id)))  # Режимы торгов / Счет срочного рынка
+        return accounts
+
+    # Фукнции отладки QUIK#
+
+    def ping(self, trans_id=0):
+        """Проверка соединения. Отправка строки 'ping'. Получение строки 'pong'
+
+        :param int trans_id: Код транзакции
+        :return: Строка 'pong'
+        """
+        return self.process_request({'data': 'Ping', 'id': trans_id, 'cmd': 'ping', 't': ''})
+
+    def echo(self, message, trans_id=0):
+        """Отправка и получение одного и того же сообщения (эхо)
+
+        :param str message: Сообщение
+        :param int trans_id: Код транзакции
+        :return: Это же сообщение
+        """
+        return self.process_request({'data': message, 'id': trans_id, 'cmd': 'echo', 't': ''})
+
+    def divide_string_by_zero(self, trans_id=0):
+        """Тест обработки ошибок. Выполняется деление строки на 0 с выдачей ошибки
+
+        :param int trans_id: Код транзакции
+        """
+        return self.process_request({'data': '', 'id': trans_id, 'cmd': 'divide_string_by_zero', 't': ''})
+
+    def is_quik(self, trans_id=0):
+        """Скрипт запущен в QUIK
+
+        :param int trans_id: Код транзакции
+        """
+        return self.process_request({'data': '', 'id': trans_id, 'cmd': 'is_quik', 't': ''})
+
+    # 2.1 Сервисные функции
+
+    def is_connected(self, trans_id=0):  # 2.1.1 Функция предназначена для определения состояния подключения клиентского места к серверу
+        """Состояние подключения терминала к серверу QUIK
+
+        :param int trans_id: Код транзакции
+        :return: 1 - подключено / 0 - не подключено
+        """
+        return self.process_request({'data': '', 'id': trans_id, 'cmd': 'isConnected', 't': ''})
+
+    def get_script_path(self, trans_id=0):  # 2.1.2 Функция возвращает путь, по которому находится запускаемый скрипт, без завершающего обратного слеша (\). Например, C:\QuikFront\Scripts
+        """Путь скрипта
+
+        :param int trans_id: Код транзакции
+        :return: Путь скрипта без завершающего обратного слэша
+        """
+        return self.process_request({'data': '', 'id': trans_id, 'cmd': 'getScriptPath', 't': ''})
+
+    def get_info_param(self, params, trans_id=0):  # 2.1.3 Функция возвращает значения параметров информационного окна (пункт меню Система / О программе / Информационное окно…)
+        """Значения параметров информационного окна
+
+        :param str params: Параметр. Список возможных параметров на стр. 8
+        :param int trans_id: Код транзакции
+        """
+        return self.process_request({'data': params, 'id': trans_id, 'cmd': 'getInfoParam', 't': ''})
+
+    # message - 2.1.4. Сообщение в терминале QUIK. Реализовано в виде 3-х отдельных функций message_info/message_warning/message_error в QUIK# ниже
+
+    def sleep(self, time, trans_id=0):  # 2.1.5 Функция приостанавливает выполнение скрипта
+        """Приостановка скрипта. Время в миллисекундах
+
+        :param int time: Время в миллисекундах
+        :param int trans_id: Код транзакции
+        """
+        return self.process_request({'data': time, 'id': trans_id, 'cmd': 'sleep', 't': ''})
+
+    def get_working_folder(self, trans_id=0):  # 2.1.6 Функция возвращает путь, по которому находится файл info.exe, исполняющий данный скрипт, без завершающего обратного слеша (\). Например, c:\QuikFront
+        """Путь к info.exe, исполняющего скрипт
+
+        :param int trans_id: Код транзакции
+        :return: Путь к info.exe, исполняющего скрипта, без завершающего обратного слэша
+        """
+        return self.process_request({'data': '', 'id': trans_id, 'cmd': 'getWorkingFolder', 't': ''})
+
+    def print_dbg_str(self, message, trans_id=0):  # 2.1.7 Функция для вывода отладочной информации
+        """Вывод отладочной информации. Можно посмотреть с помощью DebugView
+
+        :param str message: Отладочная информация
+        :param int trans_id: Код транзакции
+        """
+        return self.process_request({'data': message, 'id': trans_id, 'cmd': 'PrintDbgStr', 't': ''})
+
+    # sysdate - 2.1.8. Системные дата и время
+    # isDarkTheme - 2.1.9. Тема оформления. true - тёмная, false - светлая
+
+    # Сервисные функции QUIK#
+
+    def message_info(self, message, trans_id=0):  # В QUIK LUA message icon_type=1
+        """Отправка информационного сообщения в терминал QUIK
+
+        :param str message: Информационное сообщение
+        :param int trans_id: Код транзакции
+        """
+        return self.process_request({'data': message, 'id': trans_id, 'cmd': 'message', 't': ''})
+
+    def message_warning(self, message, trans_id=0):  # В QUIK LUA message icon_type=2
+        """Отправка сообщения с предупреждением в терминал QUIK
+
+        :param str message: Сообщение с предупреждением
+        :param int trans_id: Код транзакции
+        """
+        return self.process_request({'data': message, 'id': trans_id, 'cmd': 'warning_message', 't': ''})
+
+    def message_error(self, message, trans_id=0):  # В QUIK LUA message icon_type=3
+        """Отправка сообщения об ошибке в терминал QUIK
+
+        :param str message: Сообщение об ошибке
+        :param int trans_id: Код транзакции
+        """
+        return self.process_request({'data': message, 'id': trans_id, 'cmd': 'error_message', 't': ''})
+
+    # 3.1. Функции для обращения к строкам произвольных таблиц
+
+    # getItem - 3.1.1. Строка таблицы
+    # getOrderByNumber - 3.1.2. Заявка
+    # getNumberOf - 3.1.3. Кол-во записей в таблице
+    # SearchItems - 3.1.4. Быстрый поиск по таблице заданной функцией поиска
+
+    def get_trade_accounts(self, trans_id=0):  # QUIK#
+        """Торговые счета, у которых указаны поддерживаемые классы инструментов
+
+        :param int trans_id: Код транзакции
+        """
+        return self.process_request({'data': '', 'id': trans_id, 'cmd': 'getTradeAccounts', 't': ''})
+
+    def get_trade_account(self, class_code, trans_id=0):  # QUIK#
+        """Торговый счет для режима торгов
+
+        :param str class_code: Код режима торгов
+        :param int trans_id: Код транзакции
+        """
+        return self.process_request({'data': class_code, 'id': trans_id, 'cmd': 'getTradeAccount', 't': ''})
+
+    def get_all_orders(self, trans_id=0):  # QUIK#
+        """Все заявки
+
+        :param int trans_id: Код транзакции
+        """
+        return self.process_request({'data': f'', 'id': trans_id, 'cmd': 'get_orders', 't': ''})
+
+    def get_orders(self, class_code, sec_code, trans_id=0):  # QUIK#
+        """Заявки по тикеру
+
+        :param str class_code: Код режима торгов
+        :param str sec_code: Тикер
+        :param int trans_id: Код транзакции
+        """
+        return self.process_request({'data': f'{class_code}|{sec_code}', 'id': trans_id, 'cmd': 'get_orders', 't': ''})
+
+    def get_order_by_number(self, order_id, trans_id=0):  # QUIK#
+        """Заявка по номеру
+
+        :param str order_id: Номер заявки
+        :param int trans_id: Код транзакции
+        """
+        return self.process_request({'data': order_id, 'id': trans_id, 'cmd': 'getOrder_by_Number', 't': ''})
+
+    def get_order_by_id(self, class_code, sec_code, order_trans_id, trans_id=0):  # QUIK#
+        """Заявка по тикеру и коду транзакции заявки
+
+        :param str class_code: Код режима торгов
+        :param str sec_code: Тикер
+        :param str order_trans_id: Код транзакции заявки
+        :param int trans_id: Код транзакции
+        """
+        return self.process_request({'data': f'{class_code}|{sec_code}|{order_trans_id}', 'id': trans_id, 'cmd': 'getOrder_by_ID', 't': ''})
+
+    def get_order_by_class_number(self, class_code, order_id, trans_id=0):  # QUIK#
+        """Заявка по режиму торгов и номеру
+
+        :param str class_code: Код режима торгов
+        :param str order_id: Номер заявки
+        :param int trans_id: Код транзакции
+        """
+        return self.process_request({'data': f'{class_code}|{order_id}', 'id': trans_id, 'cmd': 'getOrder_by_Number', 't': ''})
+
+    def get_money_limits(self, trans_id=0):  # QUIK#
+        """Все позиции по деньгам
+
+        :param int trans_id: Код транзакции
+        """
+        return self.process_request({'data': '', 'id': trans_id, 'cmd': 'getMoneyLimits', 't': ''})
+
+    def get_client_code(self, trans_id=0):  # QUIK#
+        """Основной (первый) код клиента
+
+        :param int trans_id: Код транзакции
+        """
+        return self.process_request({'data': '', 'id': trans_id, 'cmd': 'getClientCode', 't': ''})
+
+    def get_client_codes(self, trans_id=0):  # QUIK#
+        """Все коды клиента
+
+        :param int trans_id: Код транзакции
+        """
+        return self.process_request({'data': '', 'id': trans_id, 'cmd': 'getClientCodes', 't': ''})
+
+    def get_all_depo_limits(self, trans_id=0):  # QUIK#
+        """Лимиты по всем инструментам
+
+        :param int trans_id: Код транзакции
+        """
+        return self.process_request({'data': '', 'id': trans_id, 'cmd': 'get_depo_limits', 't': ''})
+
+    def get_depo_limits(self, sec_code, trans_id=0):  # QUIK#
+        """Лимиты по инструменту
+
+        :param str sec_code: Тикер
+        :param int trans_id: Код транзакции
+        """
+        return self.process_request({'data': sec_code, 'id': trans_id, 'cmd': 'get_depo_limits', 't': ''})
+
+    def get_all_trades(self, trans_id=0):  # QUIK#
+        """Все сделки
+
+        :param int trans_id: Код транзакции
+        """
+        return self.process_request({'data': f'', 'id': trans_id, 'cmd': 'get_trades', 't': ''})
+
+    def get_trades(self, class_code, sec_code, trans_id=0):  # QUIK#
+        """Сделки по инструменту
+
+        :param str class_code: Код режима торгов
+        :param str sec_code: Тикер
+        :param int trans_id: Код транзакции
+        """
+        return self.process_request({'data': f'{class_code}|{sec_code}', 'id': trans_id, 'cmd': 'get_trades', 't': ''})
+
+    def get_trades_by_order_number(self, order_num, trans_id=0):  # QUIK#
+        """Сделки по номеру заявки
+
+        :param str order_num: Номер заявки
+        :param int trans_id: Код транзакции
+        """
+        return self.process_request({'data': order_num, 'id': trans_id, 'cmd': 'get_Trades_by_OrderNumber', 't': ''})
+
+    def get_all_stop_orders(self, trans_id=0):  # QUIK#
+        """Все стоп заявки
+
+        :param int trans_id: Код транзакции
+        """
+        return self.process_request({'data': '', 'id': trans_id, 'cmd': 'get_stop_orders', 't': ''})
+
+    def get_stop_orders(self, class_code, sec_code, trans_id=0):  # QUIK#
+        """Стоп заявки по инструменту
+
+        :param str class_code: Код режима торгов
+        :param str sec_code: Тикер
+        :param int trans_id: Код транзакции
+        """
+        return self.process_request({'data': f'{class_code}|{sec_code}', 'id': trans_id, 'cmd': 'get_stop_orders', 't': ''})
+
+    def get_all_trade(self, trans_id=0):  # QUIK#
+        """Все обезличенные сделки
+
+        :param int trans_id: Код транзакции
+        """
+        return self.process_request({'data': f'', 'id': trans_id, 'cmd': 'get_all_trades', 't': ''})
+
+    def get_trade(self, class_code, sec_code, trans_id=0):  # QUIK#
+        """Обезличенные сделки по инструменту
+
+        :param str class_code: Код режима торгов
+        :param str sec_code: Тикер
+        :param int trans_id: Код транзакции
+        """
+        return self.process_request({'data': f'{class_code}|{sec_code}', 'id': trans_id, 'cmd': 'get_all_trades', 't': ''})
+
+    # 3.2 Функции для обращения к спискам доступных параметров
+
+    def get_classes_list(self, trans_id=0):  # 3.2.1 Функция предназначена для получения списка режимов торгов, переданных с сервера в ходе сеанса связи
+        """Все режимы торгов
+
+        :param int trans_id: Код транзакции
+        :return: Все режимы торгов разделенные запятыми. В конце также запятая
+        """
+        return self.process_request({'data': '', 'id': trans_id, 'cmd': 'getClassesList', 't': ''})
+
+    def get_class_info(self, class_code, trans_id=0):  # 3.2.2 Функция предназначена для получения информации о режиме торгов
+        """Информация о режиме торгов
+
+        :param str class_code: Код режима торгов
+        :param int trans_id: Код транзакции
+        """
+        return self.process_request({'data': class_code, 'id': trans_id, 'cmd': 'getClassInfo', 't': ''})
+
+    def get_class_securities(self, class_code, trans_id=0):  # 3.2.3 Функция предназначена для получения списка кодов инструментов для списка режимов торгов, заданного списком кодов
+        """Тикеры режима торгов
+
+        :param str class_code: Код режима торгов
+        :param int trans_id: Код транзакции
+        """
+        return self.process_request({'data': class_code, 'id': trans_id, 'cmd': 'getClassSecurities', 't': ''})
+
+    def get_option_board(self, class_code, sec_code, trans_id=0):  # QUIK#
+        """Доска опционов
+
+        :param str class_code: Код режима торгов
+        :param str sec_code: Тикер
+        :param int trans_id: Код транзакции
+        """
+        return self.process_request({'data': f'{class_code}|{sec_code}', 'id': trans_id, 'cmd': 'getOptionBoard', 't': ''})
+
+    # 3.3 Функции для получения информации по денежным средствам
+
+    def get_money(self, client_code, firm_id, tag, curr_code, trans_id=0):  # 3.3.1 Функция предназначена для получения информации по денежным позициям
+        """Денежные позиции
+
+        :param str client_code: Код клиента
+        :param str firm_id: Код фирмы
+        :param str tag: Идентификатор денежного лимита
+        :param str curr_code: Код валюты. SUR для рублей
+        :param int trans_id: Код транзакции
+        """
+        return self.process_request({'data': f'{client_code}|{firm_id}|{tag}|{curr_code}', 'id': trans_id, 'cmd': 'getMoney', 't': ''})
+
+    def get_money_ex(self, firm_id, client_code, tag, curr_code, limit_kind, trans_id=0):  # 3.3.2 Функция предназначена для получения информации по денежным позициям указанного типа
+        """Денежные позиции указанного типа
+
+        :param str firm_id: Код фирмы
+        :param str client_code: Код клиента
+        :param str tag: Идентификатор денежного лимита
+        :param str curr_code: Код валюты. SUR для рублей
+        :param int limit_kind: Срок расчетов
+        :param int trans_id: Код транзакции
+        """
+        return self.process_request({'data': f'{firm_id}|{client_code}|{tag}|{curr_code}|{limit_kind}', 'id': trans_id, 'cmd': 'getMoneyEx', 't': ''})
+
+    # 3.4 Функции для получения позиций по инструментам
+
+    def get_depo(self, client_code, firm_id, sec_code, account, trans_id=0):  # 3.4.1 Функция предназначена для получения позиций по инструментам
+        """Позиции по инструментам
+
+        :param str client_code: Код клиента
+        :param str firm_id: Код фирмы
+        :param str sec_code: Тикер
+        :param str account: Счет
+        :param int trans_id: Код транзакции
+        """
+        return self.process_request({'data': f'{client_code}|{firm_id}|{sec_code}|{account}', 'id': trans_id, 'cmd': 'getDepo', 't': ''})
+
+    def get_depo_ex(self, firm_id, client_code, sec_code, account, limit_kind, trans_id=0):  # 3.4.2 Функция предназначена для получения позиций по инструментам указанного типа
+        """Позиции по инструментам указанного типа
+
+        :param str firm_id: Код фирмы
+        :param str client_code: Код клиента
+        :param str sec_code: Тикер
+        :param str account: Счет
+        :param int limit_kind: Срок расчетов
+        :param int trans_id: Код транзакции
+        """
+        return self.process_request({'data': f'{firm_id}|{client_code}|{sec_code}|{account}|{limit_kind}', 'id': trans_id, 'cmd': 'getDepoEx', 't': ''})
+
+    # 3.5 Функция для получения информации по фьючерсным лимитам
+
+    def get_futures_limit(self, firm_id, account_id, limit_type, curr_code, trans_id=0):  # 3.5.1 Функция предназначена для получения информации по фьючерсным лимитам
+        """Фьючерсные лимиты
+
+        :param str firm_id: Код фирмы
+        :param str account_id: Счет
+        :param int limit_type: Срок расчетов (limit_kind)
+        :param str curr_code: Код валюты. SUR для рублей
+        :param int trans_id: Код транзакции
+        """
+        return self.process_request({'data': f'{firm_id}|{account_id}|{limit_type}|{curr_code}', 'id': trans_id, 'cmd': 'getFuturesLimit', 't': ''})
+
+    def get_futures_client_limits(self, trans_id=0):  # QUIK#
+        """Все фьючерсные лимиты
+
+        :param int trans_id: Код транзакции
+        """
+        return self.process_request({'data': '', 'id': trans_id, 'cmd': 'getFuturesClientLimits', 't': ''})
+
+    # 3.6 Функция для получения информации по фьючерсным позициям
+
+    def get_futures_holding(self, firm_id, account_id, sec_code, position_type, trans_id=0):  # 3.6.1 Функция предназначена для получения информации по фьючерсным позициям
+        """Фьючерсные позиции
+
+        :param str firm_id: Код фирмы
+        :param str account_id: Счет
+        :param str sec_code: Тикер
+        :param str position_type: Тип лимита. Возможные значения: 0 – не определён; 1 – основной счет; 2 – клиентские и дополнительные счета; 4 – все счета торг. членов
+        :param int trans_id: Код транзакции
+        """
+        return self.process_request({'data': f'{firm_id}|{account_id}|{sec_code}|{position_type}', 'id': trans_id, 'cmd': 'getFuturesHolding', 't': ''})
+
+    def get_futures_holdings(self, trans_id=0):  # QUIK#
+        """Все фьючерсные позиции
+
+        :param int trans_id: Код транзакции
+        """
+        return self.process_request({'data': '', 'id': trans_id, 'cmd': 'getFuturesClientHoldings', 't': ''})
+
+    # 3.7 Функция для получения информации по инструменту
+
+    def get_security_info(self, class_code, sec_code, trans_id=0):  # 3.7.1 Функция предназначена для получения информации по инструменту
+        """Информация по инструменту
+
+        :param str class_code: Код режима торгов
+        :param str sec_code: Тикер
+        :param int trans_id: Код транзакции
+        """
+        return self.process_request({'data': f'{class_code}|{sec_code}', 'id': trans_id, 'cmd': 'getSecurityInfo', 't': ''})
+
+    def get_security_info_bulk(self, class_sec_codes, trans_id=0):  # QUIK#
+        """Информация по инструментам
+
+        :param list[str] class_sec_codes: Список кодов режимов торгов и тикеров. Например: ['TQBR|SBER', 'SPBFUT|CNYRUBF']
+        :param int trans_id: Код транзакции
+        """
+        return self.process_request({'data': class_sec_codes, 'id': trans_id, 'cmd': 'getSecurityInfoBulk', 't': ''})
+
+    def get_security_class(self, classes_list, sec_code, trans_id=0):  # QUIK#
+        """Режим торгов по коду инструмента из заданных режимов торгов
+
+        :param str classes_list: Режимы торгов через запятую, по которым будет поиск
+        :param str sec_code: Тикер
+        :param int trans_id: Код транзакции
+        """
+        return self.process_request({'data': f'{classes_list}|{sec_code}', 'id': trans_id, 'cmd': 'getSecurityClass', 't': ''})
+
+    # 3.8 Функция для получения даты торговой сессии
+
+    # getTradeDate - 3.8.1. Дата текущей торговой сессии
+
+    # 3.9 Функция для получения стакана по указанному классу и инструменту
+
+    def get_quote_level2(self, class_code, sec_code, trans_id=0):  # 3.9.1 Функция предназначена для получения стакана по указанному режиму торгов и инструменту
+        """Стакан по классу и инструменту
+
+        :param str class_code: Код режима торгов
+        :param str sec_code: Тикер
+        :param int trans_id: Код транзакции
+        """
+        return self.process_request({'data': f'{class_code}|{sec_code}', 'id': trans_id, 'cmd': 'GetQuoteLevel2', 't': ''})
+
+    # 3.10 Функции для работы с графиками
+
+    # getLinesCount - 3.10.1. Кол-во линий в графике
+
+    def get_num_candles(self, tag, trans_id=0):  # 3.10.2 Функция предназначена для получения информации о количестве свечек по выбранному идентификатору
+        """Кол-во свечей по идентификатору
+
+        :param str tag: Строковый идентификатор графика или индикатора
+        :param int trans_id: Код транзакции
+        """
+        return self.process_request({'data': tag, 'id': trans_id, 'cmd': 'get_num_candles', 't': ''})
+
+    # getCandlesByIndex - 3.10.3. Информация о свечках (реализовано в get_candles)
+    # CreateDataSource - 3.10.4. Создание источника данных c функциями: (реализовано в get_candles_from_data_source)
+    # - SetUpdateCallback - Привязка функции обратного вызова на изменение свечи
+    # - O, H, L, C, V, T - Функции получения цен, объемов и времени
+    # - Size - Функция кол-ва свечек в источнике данных
+    # - Close - Функция закрытия источника данных. Терминал прекращает получать данные с сервера
+    # - SetEmptyCallback - Функция сброса функции обратного вызова на изменение свечи
+
+    def get_candles(self, tag, line, first_candle, count, trans_id=0):  # QUIK#
+        """Свечи по идентификатору графика
+
+        :param str tag: Строковый идентификатор графика или индикатора
+        :param int line: Номер линии графика или индикатора
+        :param int first_candle: Номер первой свечи
+        :param int count: Кол-во свечей. 0 - все
+        :param int trans_id: Код транзакции
+        """
+        return self.process_request({'data': f'{tag}|{line}|{first_candle}|{count}', 'id': trans_id, 'cmd': 'get_candles', 't': ''})
+
+    def get_candles_from_data_source(self, class_code, sec_code, interval, param='-', count=0):  # QUIK#
+        """Свечи
+
+        :param str class_code: Код режима торгов
+        :param str sec_code: Тикер
+        :param int interval: Кол-во в минутах: 0 (тик), 1, 2, 3, 4, 5, 6, 10, 15, 20, 30, 60 (1 час), 120 (2 часа), 240 (4 часа), 1440 (день), 10080 (неделя), 23200 (месяц)
+        :param str param: Если параметр не задан, то заказываются данные на основании Таблицы обезличенных сделок, если задан – данные по этому параметру
+        :param int count: Кол-во свечей. 0 - все
+        """
+        return self.process_request({'data': f'{class_code}|{sec_code}|{interval}|{param}|{count}', 'id': '1', 'cmd': 'get_candles_from_data_source', 't': ''})
+
+    def candles_window(self, interval, since) -> int:
+        """Оценка кол-ва последних свечей, в которое попадет свеча с заданной датой и временем
+
+        :param int interval: Кол-во в минутах. 0 (тик) - окно по умолчанию
+        :param datetime since: Дата и время по МСК
+        :return: Кол-во свечей с запасом
+        """
+        if not interval:  # Для тиков время не дает оценки кол-ва
+            return 1000  # Берем окно по умолчанию
+        minutes = (datetime.now(self.tz_msk).replace(tzinfo=None) - since).total_seconds() / 60  # Сколько минут прошло с заданной свечи
+        return max(int(minutes // interval) + 2, 2)  # Кол-во свечей за это время, заданная и текущая свечи
+
+    @staticmethod
+    def candle_datetime(candle) -> datetime:
+        """Дата и время свечи QUIK
+
+        :param dict candle: Свеча в формате QUIK
+        :return: Дата и время по МСК
+        """
+        dt = candle['datetime']  # Дата и время свечи QUIK
+        return datetime(dt['year'], dt['month'], dt['day'], dt['hour'], dt['min'], dt['sec'])
+
+    def candles_since(self, candles, since) -> list[dict]:
+        """Свечи начиная с заданной даты и времени
+
+        :param list[dict] candles: Свечи в формате QUIK от старых к новым
+        :param datetime since: Дата и время по МСК. None - все свечи
+        """
+        if since is None:  # Если дата и время не заданы
+            return candles  # то нужны все свечи
+        start = len(candles)  # Номер первой нужной свечи
+        while start and self.candle_datetime(candles[start - 1]) >= since:  # Идем с конца, пока свечи не раньше заданной
+            start -= 1
+        return candles[start:]
+
+    def get_candles_since(self, class_code, sec_code, interval, since=None, count=0, param='-') -> list[dict]:
+        """Свечи из источника данных без загрузки всей истории
+
+        Без даты и времени - последние count свечей. С датой и временем - свечи начиная с нее. Окно последних свечей оценивается
+        по времени, прошедшему с этой даты, и удваивается, пока не дойдет до нее или до начала истории
+
+        :param str class_code: Код режима торгов
+        :param str sec_code: Тикер
+        :param int interval: Кол-во в минутах: 0 (тик), 1, 2, 3, 4, 5, 6, 10, 15, 20, 30, 60 (1 час), 120 (2 часа), 240 (4 часа), 1440 (день), 10080 (неделя), 23200 (месяц)
+        :param datetime since: Дата и время по МСК последней известной свечи. Она тоже возвращается, т.к. могла быть не завершена. None - последние count свечей
+        :param int count: Кол-во последних свечей, если не задана дата и время. 0 - все
+        :param str param: Если параметр не задан, то заказываются данные на основании Таблицы обезличенных сделок, если задан – данные по этому параметру
+        :return: Свечи в формате QUIK от старых к новым. Пустой список, если свечи не получены
+        """
+        return self.run_steps(self.get_candles_since_steps(class_code, sec_code, interval, since, count, param))
+
+    def get_candles_since_steps(self, class_code, sec_code, interval, since, count, param) -> Generator:
+        """Шаги получения свечей начиная с заданной даты и времени"""
+        window = count if since is None else self.candles_window(interval, since)  # Кол-во последних свечей в запросе
+        while True:  # Пока не дошли до заданной свечи
+            history = yield self.get_candles_from_data_source, class_code, sec_code, interval, param, window  # Последние свечи
+            if 'data' not in history:  # Если свечи не получены
+                self.logger.error(f'Свечи {self.class_sec_codes_to_dataname(class_code, sec_code)} не получены: {history}')
+                return []
+            candles = history['data']  # Свечи от старых к новым
+            if since is None or not window or len(candles) < window or self.candle_datetime(candles[0]) <= since:  # Если получили всю историю или дошли до заданной свечи
+                return self.candles_since(candles, since)  # то возвращаем свечи начиная с нее
+            window *= 2  # Иначе увеличиваем окно
+
+    def subscribe_to_candles(self, class_code, sec_code, interval, param='-', trans_id=0):  # QUIK#
+        """Подписка на свечи
+
+        :param str class_code: Код режима торгов
+        :param str sec_code: Тикер
+        :param int interval: Кол-во в минутах: 0 (тик), 1, 2, 3, 4, 5, 6, 10, 15, 20, 30, 60 (1 час), 120 (2 часа), 240 (4 часа), 1440 (день), 10080 (неделя), 23200 (месяц)
+        :param str param: Если параметр не задан, то заказываются данные на основании Таблицы обезличенных сделок, если задан – данные по этому параметру
+        :param int trans_id: Код транзакции
+        """
+        request = {'data': f'{class_code}|{sec_code}|{interval}|{param}', 'id': trans_id, 'cmd': 'subscribe_to_candles', 't': ''}  # Запрос
+        subscription = {'subscription': 'candles', 'class_code': class_code, 'sec_code': sec_code, 'interval': interval, 'param': param}  # Подписка
+        return self.run_steps(self.subscribe_steps(subscription, request, request))  # Если на эти свечи уже подписан другой компонент, то QUIK# возвращает запрос подписки без изменений
+
+    def unsubscribe_from_candles(self, class_code, sec_code, interval, param='-', trans_id=0):  # QUIK#
+        """Отмена подписки на свечи
+
+        :param str class_code: Код режима торгов
+        :param str sec_code: Тикер
+        :param int interval: Кол-во в минутах: 0 (тик), 1, 2, 3, 4, 5, 6, 10, 15, 20, 30, 60 (1 час), 120 (2 часа), 240 (4 часа), 1440 (день), 10080 (неделя), 23200 (месяц)
+        :param str param: Если параметр не задан, то заказываются данные на основании Таблицы обезличенных сделок, если задан – данные по этому параметру
+        :param int trans_id: Код транзакции
+        """
+        request = {'data': f'{class_code}|{sec_code}|{interval}|{param}', 'id': trans_id, 'cmd': 'unsubscribe_from_candles', 't': ''}  # Запрос
+        subscription = {'subscription': 'candles', 'class_code': class_code, 'sec_code': sec_code, 'interval': interval, 'param': param}  # Подписка
+        return self.run_steps(self.unsubscribe_steps(subscription, request, request))  # Если эти свечи еще нужны другим компонентам, то QUIK# возвращает запрос отмены подписки без изменений
+
+    def is_subscribed(self, class_code, sec_code, interval, param='-', trans_id=0):  # QUIK#
+        """Есть ли подписка на свечи
+
+        :param str class_code: Код режима торгов
+        :param str sec_code: Тикер
+        :param int interval: Кол-во в минутах: 0 (тик), 1, 2, 3, 4, 5, 6, 10, 15, 20, 30, 60 (1 час), 120 (2 часа), 240 (4 часа), 1440 (день), 10080 (неделя), 23200 (месяц)
+        :param str param: Если параметр не задан, то заказываются данные на основании Таблицы обезличенных сделок, если задан – данные по этому параметру
+        :param int trans_id: Код транзакции
+        """
+        return self.process_request({'data': f'{class_code}|{sec_code}|{interval}|{param}', 'id': trans_id, 'cmd': 'is_subscribed', 't': ''})
+
+    # 3.11 Функции для работы с заявками
+
+    def send_transaction(self, transaction, trans_id=0):  # 3.11.1 Функция предназначена для отправки транзакций в торговую систему
+        """Отправка транзакции в торговую систему
+
+        :param dict transaction: Транзакция в виде словаря. Формат и правила формирования описаны в Руководстве пользователя QUIK https://arqatech.com/ru/support/files/ Файл 6. Совместная работа с другими приложениями. Пункт 6.9.2
+        :param int trans_id: Код транзакции
+        """
+        return self.process_request({'data': transaction, 'id': trans_id, 'cmd': 'sendTransaction', 't': ''})
+
+    # CalcBuySell - 3.11.2. Максимальное кол-во лотов в заявке
+
+    # 3.12 Функции для получения значений таблицы "Текущие торги"
+
+    def get_param_ex(self, class_code, sec_code, param_name, trans_id=0):  # 3.12.1 Функция предназначена для получения значений всех параметров биржевой информации из таблицы Текущие торги. С помощью этой функции можно получить любое из значений Таблицы текущих торгов для заданных кодов класса и инструмента
+        """Таблица текущих торгов
+
+        :param str class_code: Код режима торгов
+        :param str sec_code: Тикер
+        :param str param_name: Параметр
+        :param int trans_id: Код транзакции
+        """
+        return self.process_request({'data': f'{class_code}|{sec_code}|{param_name}', 'id': trans_id, 'cmd': 'getParamEx', 't': ''})
+
+    def get_param_ex2(self, class_code, sec_code, param_name, trans_id=0):  # 3.12.2 Функция предназначена для получения значений всех параметров биржевой информации из Таблицы текущих торгов с возможностью в дальнейшем отказаться от получения определенных параметров, заказанных с помощью функции ParamRequest
+        """Таблица текущих торгов по инструменту с возможностью отказа от получения
+
+        :param str class_code: Код режима торгов
+        :param str sec_code: Тикер
+        :param str param_name: Параметр
+        :param int trans_id: Код транзакции
+        """
+        return self.process_request({'data': f'{class_code}|{sec_code}|{param_name}', 'id': trans_id, 'cmd': 'getParamEx2', 't': ''})
+
+    def get_param_ex2_bulk(self, class_sec_codes_params, trans_id=0):  # QUIK#
+        """Таблица текущих торгов по инструментам с возможностью отказа от получения
+
+        :param set[str] class_sec_codes_params: Список кодов режимов торгов, тикеров, параметров. Например: {'TQBR|SBER|SEC_SCALE', 'SPBFUT|CNYRUBF|SEC_PRICE_STEP'}
+        :param int trans_id: Код транзакции
+        """
+        return self.process_request({'data': class_sec_codes_params, 'id': trans_id, 'cmd': 'getParamEx2Bulk', 't': ''})
+
+    # 3.13 Функции для получения параметров таблицы "Клиентский портфель"
+
+    def get_portfolio_info(self, firm_id, client_code, trans_id=0):  # 3.13.1 Функция предназначена для получения значений параметров таблицы Клиентский портфель, соответствующих идентификатору участника торгов firmid, коду клиента client_code и сроку расчетов limit_kind со значением 0
+        """Клиентский портфель
+
+        :param str firm_id: Код фирмы
+        :param str client_code: Код клиента
+        :param int trans_id: Код транзакции
+        """
+        return self.process_request({'data': f'{firm_id}|{client_code}', 'id': trans_id, 'cmd': 'getPortfolioInfo', 't': ''})
+
+    def get_portfolio_info_ex(self, firm_id, client_code, limit_kind, trans_id=0):  # 3.13.2 Функция предназначена для получения значений параметров таблицы Клиентский портфель, соответствующих идентификатору участника торгов firmid, коду клиента client_code и сроку расчетов limit_kind со значением, заданным пользователем.
+        """Клиентский портфель по сроку расчетов
+
+        :param str firm_id: Код фирмы
+        :param str client_code: Код клиента
+        :param int limit_kind: Срок расчетов
+        :param int trans_id: Код транзакции
+        """
+        return self.process_request({'data': f'{firm_id}|{client_code}|{limit_kind}', 'id': trans_id, 'cmd': 'getPortfolioInfoEx', 't': ''})
+
+    # 3.14 Функции для получения параметров таблицы "Купить/Продать"
+
+    # getBuySellInfo - 3.14.1. Параметры таблицы купить/продать
+    # getBuySellInfoEx - 3.14.2. Параметры таблицы купить/продать с дополнительными полями вывода
+
+    # 3.15 Функции для работы с таблицами Рабочего места QUIK
+
+    # AddColumn - 3.15.1. Добавление колонки в таблицу
+    # AllocTable - 3.15.2. Структура, описывающая таблицу
+    # Clear - 3.15.3. Удаление содержимого таблицы
+    # CreateWindow - 3.15.4. Создание окна таблицы
+    # DeleteRow - 3.15.5. Удаление строки из таблицы
+    # DestroyTable - 3.15.6. Закрытие окна таблицы
+    # InsertRow - 3.15.7. Добавление строки в таблицу
+    # IsWindowClosed - 3.15.8. Закрыто ли окно с таблицей
+    # GetCell - 3.15.9. Данные ячейки таблицы
+    # GetTableSize - 3.15.10. Кол-во строк и столбцов таблицы
+    # GetWindowCaption - 3.15.11. Заголовок окна таблицы
+    # GetWindowRect - 3.15.12. Координаты верхнего левого и правого нижнего углов таблицы
+    # SetCell - 3.15.13. Установка значения ячейки таблицы
+    # SetWindowCaption - 3.15.14. Установка заголовка окна таблицы
+    # SetWindowPos - 3.15.15. Установка верхнего левого угла, и размеры таблицы
+    # SetTableNotificationCallback - 3.15.16. Установка функции обратного вызова для обработки событий в таблице
+    # RGB - 3.15.17. Преобразование каждого цвета в одно число для функци SetColor
+    # SetColor - 3.15.18. Установка цвета ячейки, столбца или строки таблицы
+    # Highlight - 3.15.19. Подсветка диапазона ячеек цветом фона и цветом текста на заданное время с плавным затуханием
+    # SetSelectedRow - 3.15.20. Выделение строки таблицы
+
+    # 3.16 Функции для работы с метками
+
+    def add_label(self, price, cur_date, cur_time, qty, path, chart_tag, alignment, background, trans_id=0):  # 3.16.1 Добавляет метку с заданными параметрами
+        """Добавление метки на график"""
+        return self.process_request({'data': f'{price}|{cur_date}|{cur_time}|{qty}|{path}|{chart_tag}|{alignment}|{background}', 'id': trans_id, 'cmd': 'AddLabel', 't': ''})
+
+    def del_label(self, chart_tag, label_id, trans_id=0):  # 3.16.2 Удаляет метку с заданными параметрами
+        """Удаление метки с графика"""
+        return self.process_request({'data': f'{chart_tag}|{label_id}', 'id': trans_id, 'cmd': 'DelLabel', 't': ''})
+
+    def del_all_labels(self, chart_tag, trans_id=0):  # 3.16.3 Команда удаляет все метки на диаграмме с указанным графиком
+        """Удаление всех меток с графика"""
+        return self.process_request({'data': chart_tag, 'id': trans_id, 'cmd': 'DelAllLabels', 't': ''})
+
+    def get_label_params(self, chart_tag, label_id, trans_id=0):  # 3.16.4 Команда позволяет получить параметры метки
+        """Получение параметров метки"""
+        return self.process_request({'data': f'{chart_tag}|{label_id}', 'id': trans_id, 'cmd': 'GetLabelParams', 't': ''})
+
+    # SetLabelParams - 3.16.5. Установка параметров метки
+
+    # 3.17 Функции для заказа стакана котировок
+
+    def subscribe_level2_quotes(self, class_code, sec_code, trans_id=0):  # 3.17.1 Функция заказывает на сервер получение стакана по указанному классу и инструменту
+        """Подписка на стакан
+
+        :param str class_code: Код режима торгов
+        :param str sec_code: Тикер
+        :param int trans_id: Код транзакции
+        """
+        request = {'data': f'{class_code}|{sec_code}', 'id': trans_id, 'cmd': 'Subscribe_Level_II_Quotes', 't': ''}  # Запрос
+        subscription = {'subscription': 'quotes', 'class_code': class_code, 'sec_code': sec_code}  # Подписка
+        return self.run_steps(self.subscribe_steps(subscription, request, dict(request, data=True)))  # Если на этот стакан уже подписан другой компонент, то подписка есть
+
+    def unsubscribe_level2_quotes(self, class_code, sec_code, trans_id=0):  # 3.17.2 Функция отменяет заказ на получение с сервера стакана по указанному классу и инструменту
+        """Отмена подписки на стакан
+
+        :param str class_code: Код режима торгов
+        :param str sec_code: Тикер
+        :param int trans_id: Код транзакции
+        """
+        request = {'data': f'{class_code}|{sec_code}', 'id': trans_id, 'cmd': 'Unsubscribe_Level_II_Quotes', 't': ''}  # Запрос
+        subscription = {'subscription': 'quotes', 'class_code': class_code, 'sec_code': sec_code}  # Подписка
+        return self.run_steps(self.unsubscribe_steps(subscription, request, dict(request, data=True)))  # Если этот стакан еще нужен другим компонентам, то подписку в QUIK не отменяем
+
+    def is_subscribed_level2_quotes(self, class_code, sec_code, trans_id=0):  # 3.17.3 Функция позволяет узнать, заказан ли с сервера стакан по указанному классу и инструменту
+        """Есть ли подписка на стакан
+
+        :param str class_code: Код режима торгов
+        :param str sec_code: Тикер
+        :param int trans_id: Код транзакции
+        """
+        return self.process_request({'data': f'{class_code}|{sec_code}', 'id': trans_id, 'cmd': 'IsSubscribed_Level_II_Quotes', 't': ''})
+
+    # 3.18 Функции для заказа параметров Таблицы текущих торгов
+
+    def param_request(self, class_code, sec_code, param_name, trans_id=0):  # 3.18.1 Функция заказывает получение параметров Таблицы текущих торгов
+        """Заказ получения таблицы текущих торгов по инструменту
+
+        :param str class_code: Код режима торгов
+        :param str sec_code: Тикер
+        :param str param_name: Параметр
+        :param int trans_id: Код транзакции
+        """
+        return self.process_request({'data': f'{class_code}|{sec_code}|{param_name}', 'id': trans_id, 'cmd': 'paramRequest', 't': ''})
+
+    def cancel_param_request(self, class_code, sec_code, param_name, trans_id=0):  # 3.18.2 Функция отменяет заказ на получение параметров Таблицы текущих торгов
+        """Отмена заказа получения таблицы текущих торгов по инструменту
+
+        :param str class_code: Код режима торгов
+        :param str sec_code: Тикер
+        :param str param_name: Параметр
+        :param int trans_id: Код транзакции
+        """
+        return self.process_request({'data': f'{class_code}|{sec_code}|{param_name}', 'id': trans_id, 'cmd': 'cancelParamRequest', 't': ''})
+
+    def param_request_bulk(self, class_sec_codes_params, trans_id=0):  # QUIK#
+        """Заказ получения таблицы текущих торгов по инструментам
+
+        :param set[str] class_sec_codes_params: Список кодов режимов торгов, тикеров, параметров. Например: {'TQBR|SBER|SEC_SCALE', 'SPBFUT|CNYRUBF|SEC_PRICE_STEP'}
+        :param int trans_id: Код транзакции
+        """
+        return self.process_request({'data': class_sec_codes_params, 'id': trans_id, 'cmd': 'paramRequestBulk', 't': ''})
+
+    def cancel_param_request_bulk(self, class_sec_codes_params, trans_id=0):  # QUIK#
+        """Отмена заказа получения таблицы текущих торгов по инструментам
+
+        :param set[str] class_sec_codes_params: Список кодов режимов торгов, тикеров, параметров. Например: {'TQBR|SBER|SEC_SCALE', 'SPBFUT|CNYRUBF|SEC_PRICE_STEP'}
+        :param int trans_id: Код транзакции
+        """
+        return self.process_request({'data': class_sec_codes_params, 'id': trans_id, 'cmd': 'cancelParamRequestBulk', 't': ''})
+
+    # 3.19 Функции для получения информации по единой денежной позиции
+
+    def get_trd_acc_by_client_code(self, firm_id, client_code, trans_id=0):  # 3.19.1 Функция возвращает торговый счет срочного рынка, соответствующий коду клиента фондового рынка с единой денежной позицией
+        """Торговый счет срочного рынка по коду клиента фондового рынка
+
+        :param str firm_id: Код фирмы
+        :param str client_code: Код клиента
+        :param int trans_id: Код транзакции
+        """
+        return self.process_request({'data': f'{firm_id}|{client_code}', 'id': trans_id, 'cmd': 'getTrdAccByClientCode', 't': ''})
+
+    def get_client_code_by_trd_acc(self, firm_id, trade_account_id, trans_id=0):  # 3.19.2 Функция возвращает код клиента фондового рынка с единой денежной позицией, соответствующий торговому счету срочного рынка
+        """Код клиента фондового рынка с единой денежной позицией по торговому счету срочного рынка
+
+        :param str firm_id: Код фирмы
+        :param str trade_account_id: Счет
+        :param int trans_id: Код транзакции
+        """
+        return self.process_request({'data': f'{firm_id}|{trade_account_id}', 'id': trans_id, 'cmd': 'getClientCodeByTrdAcc', 't': ''})
+
+    def is_ucp_client(self, firm_id, client, trans_id=0):  # 3.19.3 Функция предназначена для получения признака, указывающего имеет ли клиент единую денежную позицию
+        """Имеет ли клиент единую денежную позицию
+
+        :param str firm_id: Код фирмы
+        :param str client: Код клиента фондового рынка или торговый счет срочного рынка
+        :param int trans_id: Код транзакции
+        """
+        return self.process_request({'data': f'{firm_id}|{client}', 'id': trans_id, 'cmd': 'IsUcpClient', 't': ''})
+
+    # Запросы
+
+    def process_request(self, request):
+        """Отправка запроса в виде словаря и получение ответа в виде JSON из QUIK. Реализует клиент
+
+        :param dict request: Запрос в виде словаря
+        :returns: Ответ JSON
+        """
+        raise NotImplementedError
+
+    def process_requests(self, requests):
+        """Отправка запросов одной записью в соединение и получение ответов в порядке запросов. Реализует клиент
+
+        :param list[dict] requests: Запросы в виде словарей
+        :return: Ответы JSON
+        """
+        raise NotImplementedError
+
+    def run_steps(self, steps):
+        """Выполнение шагов функции из нескольких запросов. Реализует клиент
+
+        :param Generator steps: Шаги. Отдают запрос (функция и ее параметры) или список запросов, получают ответ или список ответов
+        :return: Результат шагов
+        """
+        raise NotImplementedError
+
+    def stats(self) -> dict:
+        """Метрики по командам QUIK#: кол-во запросов и функций обратного вызова, ошибок, гистограммы времени и размеров
+
+        :return: Команда -> метрика -> кол-во или статистика гистограммы (count, sum, min, max, mean, p50, p90, p99, p999)
+        """
+        return self.metrics.stats()
+
+    def start_recording(self, record, **kwargs):
+        """Начало записи всех функций обратного вызова со временем получения. Если запись уже ведется, она останавливается
+
+        :param str|Recorder record: Файл записи или готовый Recorder
+        :param kwargs: Параметры Recorder: max_file_size, block_size, level, flush_interval, max_pending
+        """
+        self.stop_recording()
+        self.recorder = record if isinstance(record, Recorder) else Recorder(record, **kwargs)
+
+    def stop_recording(self):
+        """Окончание записи функций обратного вызова. Оставшиеся записи сохраняются на диск"""
+        recorder, self.recorder = self.recorder, None  # Поток чтения перестает писать со следующего фрагмента
+        if recorder:  # Если запись велась
+            recorder.close()  # то сохраняем оставшиеся записи и закрываем файл
+
+    @staticmethod
+    def encode_request(request) -> bytes:
+        """Запрос в виде словаря для отправки в QUIK
+
+        :param dict request: Запрос в виде словаря
+        :return: Запрос в кодировке Windows 1251 с переводом строки
+        """
+        return f'{request}\r\n'.replace("'", '"').encode('cp1251')  # Переводим: словарь -> строка, одинарные кавычки -> двойные, кодировка UTF8 -> Windows 1251
+
+    # Подписки (функции обратного вызова)
+
+    def default_handler(self, data):
+        """Пустой обработчик события по умолчанию. Его можно заменить на пользовательский"""
+        pass
+
+    @staticmethod
+    def subscription_requests(subscription) -> tuple[dict, dict]:
+        """Запросы проверки и возобновления подписки
+
+        :param dict subscription: Подписка
+        :return: Запрос проверки подписки, запрос подписки
+        """
+        if subscription['subscription'] == 'quotes':  # Подписка на стакан
+            data = f'{subscription["class_code"]}|{subscription["sec_code"]}'
+            return ({'data': data, 'id': 0, 'cmd': 'IsSubscribed_Level_II_Quotes', 't': ''},
+                    {'data': data, 'id': 0, 'cmd': 'Subscribe_Level_II_Quotes', 't': ''})
+        data = f'{subscription["class_code"]}|{subscription["sec_code"]}|{subscription["interval"]}|{subscription["param"]}'  # Подписка на свечки
+        return ({'data': data, 'id': 0, 'cmd': 'is_subscribed', 't': ''},
+                {'data': data, 'id': 0, 'cmd': 'subscribe_to_candles', 't': ''})
+
+    def resubscribe(self):
+        """Возобновление подписок, которых нет в QUIK. Проверка и подписка выполняются пакетами: по одной записи в соединение на все подписки"""
+        return self.run_steps(self.resubscribe_steps())
+
+    def resubscribe_steps(self) -> Generator:
+        """Шаги возобновления подписок"""
+        subscriptions = list(self.subscriptions)  # Подписки. Список может меняться из других потоков
+        requests = [self.subscription_requests(subscription) for subscription in subscriptions]  # Запросы проверки и возобновления подписок
+        results = yield self.process_requests, [check for check, _ in requests]  # Проверяем все подписки одним пакетом
+        missing = [(subscription, subscribe) for subscription, (_, subscribe), result in zip(subscriptions, requests, results) if not result['data']]  # Подписки, которых нет в QUIK
+        yield self.process_requests, [subscribe for _, subscribe in missing]  # Возобновляем их одним пакетом
+        for subscription, _ in missing:  # Пробегаемся по всем возобновленным подпискам
+            self.logger.debug(f'Повторная подписка: {subscription}')
+
+    def subscribe_steps(self, subscription, request, shared_result) -> Generator:
+        """Шаги подписки
+
+        :param dict subscription: Подписка
+        :param dict request: Запрос подписки
+        :param dict shared_result: Ответ, если на это уже подписан другой компонент
+        """
+        result, _ = yield from self.acquire_subscription_steps(subscription, request, shared_result)
+        return result
+
+    def acquire_subscription_steps(self, subscription, request, shared_result) -> Generator:
+        """Шаги взятия ссылки на подписку. В QUIK обращаемся только при первой подписке, остальные подписавшиеся ждут ее результата.
+        Если подписки в QUIK нет, то ссылки первого и ждущих подписавшихся не берутся, и все они получают ответ QUIK.
+        При ошибке соединения ссылка остается, и подписка возобновится после переподключения
+
+        :param dict subscription: Подписка
+        :param dict request: Запрос подписки
+        :param dict shared_result: Ответ, если на это уже подписан другой компонент
+        :return: Ответ, ссылка на подписку взята
+        """
+        if not self.subscriptions.acquire(subscription):  # Если на это уже подписан другой компонент
+            pending = self.subscriptions.waiting(subscription)  # Подписка, которую он еще оформляет
+            if pending is not None:  # Если подписка еще оформляется
+                yield pending.event.wait,  # то ждем ее результата
+                if pending.subscribed is False:  # Если подписки в QUIK нет. Ссылка уже удалена из реестра
+                    return pending.result, False  # то возвращаем ответ QUIK первому подписавшемуся
+            return shared_result, True  # В QUIK не обращаемся
+        result = subscribed = None  # Ответ и результат подписки неизвестны, пока QUIK не ответил
+        try:  # Пробуем подписаться в QUIK
+            result = yield self.process_request, request
+            check, _ = self.subscription_requests(subscription)  # Запрос проверки подписки
+            subscribed = bool((yield self.process_request, check)['data'])  # Есть ли подписка в QUIK
+        finally:  # Ждущие подписавшиеся получают результат подписки в любом случае. Если подписки нет, то она удаляется из реестра
+            self.subscriptions.complete(subscription, subscribed, result)
+        return result, subscribed
+
+    def unsubscribe_steps(self, subscription, request, shared_result) -> Generator:
+        """Шаги отмены подписки. В QUIK обращаемся только при отмене последней подписки
+
+        :param dict subscription: Подписка
+        :param dict request: Запрос отмены подписки
+        :param dict shared_result: Ответ, если это еще нужно другим компонентам
+        """
+        if not self.subscriptions.release(subscription):  # Если это еще нужно другим компонентам
+            return shared_result  # то подписку в QUIK не отменяем
+        return (yield self.process_request, request)
+
+    # Функции конвертации
+
+    def dataname_to_class_sec_codes(self, dataname) -> Union[tuple[str, str], None]:
+        """Код режима торгов и тикер из названия тикера
+
+        :param str dataname: Название тикера
+        :return: Код режима торгов и тикер
+        """
+        return self.run_steps(self.dataname_to_class_sec_codes_steps(dataname))
+
+    def dataname_to_class_sec_codes_steps(self, dataname) -> Generator:
+        """Шаги dataname_to_class_sec_codes"""
+        (class_sec_codes,) = yield from self.datanames_to_class_sec_codes_steps([dataname], False)  # Справочник сохранится в файл при закрытии
+        return class_sec_codes
+
+    def datanames_to_class_sec_codes(self, datanames) -> list[tuple[str, str]]:
+        """Коды режимов торгов и тикеры из списка названий тикеров. Режимы торгов тикеров без кода режима торгов получаются одним пакетом запросов
+
+        :param list[str] datanames: Названия тикеров
+        :return: Коды режимов торгов и тикеры в порядке списка
+        """
+        return self.run_steps(self.datanames_to_class_sec_codes_steps(datanames))
+
+    def datanames_to_class_sec_codes_steps(self, datanames, save=True) -> Generator:
+        """Шаги datanames_to_class_sec_codes
+
+        :param list[str] datanames: Названия тикеров
+        :param bool save: Сохранить справочник в файл после пакета. False - при закрытии
+        """
+        symbols_parts = [dataname.split('.') for dataname in datanames]  # По разделителю пытаемся разбить тикеры на части. Формат <Код режима торгов>.<Код тикера>
+        class_codes = yield from self.sec_codes_to_class_codes_steps([parts[0] for parts in symbols_parts if len(parts) < 2], save)  # Режимы торгов тикеров без кода режима торгов
+        return [(parts[0], '.'.join(parts[1:])) if len(parts) >= 2 else (class_codes[parts[0]], parts[0]) for parts in symbols_parts]
+
+    def get_classes(self) -> str:
+        """Все режимы торгов через запятую. Из QUIK получаются один раз за торговую сессию"""
+        return self.run_steps(self.get_classes_steps())
+
+    def get_classes_steps(self) -> Generator:
+        """Шаги get_classes"""
+        self.symbols.check_session_end()  # Если наступила новая торговая сессия, то режимы торгов устарели
+        if self.symbols.classes is None:  # Если режимов торгов нет в справочнике
+            self.symbols.set_classes((yield (self.get_classes_list,))['data'])  # то получаем их из QUIK. В файл сохраняются вместе с пакетом режимов торгов тикеров
+        return self.symbols.classes
+
+    def sec_codes_to_class_codes(self, sec_codes) -> dict:
+        """Коды режимов торгов тикеров. Тикеры, которых нет в справочнике, ищутся по всем режимам торгов одним пакетом запросов
+
+        :param list[str] sec_codes: Тикеры
+        :return: Тикер -> код режима торгов. Пустая строка, если тикер не найден
+        """
+        return self.run_steps(self.sec_codes_to_class_codes_steps(sec_codes))
+
+    def sec_codes_to_class_codes_steps(self, sec_codes, save=True) -> Generator:
+        """Шаги sec_codes_to_class_codes
+
+        :param list[str] sec_codes: Тикеры
+        :param bool save: Сохранить справочник в файл после пакета. False - при закрытии
+        """
+        class_codes = {sec_code: self.symbols.get_class_code(sec_code) for sec_code in sec_codes}  # Режимы торгов из справочника
+        missing = [sec_code for sec_code, class_code in class_codes.items() if class_code is None]  # Тикеры, которых нет в справочнике
+        if missing:  # Если нужно получить режимы торгов из QUIK
+            classes = yield from self.get_classes_steps()  # Все режимы торгов через запятую
+            responses = yield [(self.get_security_class, classes, sec_code) for sec_code in missing]  # Режимы торгов из всех режимов по тикерам одним пакетом
+            for sec_code, response in zip(missing, responses):  # Пробегаемся по всем ответам
+                class_code = response.get('data')  # Код режима торгов
+                class_codes[sec_code] = class_code or ''  # Тикер может быть не найден
+                if class_code:  # Если тикер найден
+                    self.symbols.set_class_code(sec_code, class_code)  # то заносим его режим торгов в справочник
+            if save:  # Если справочник нужно сохранить после пакета
+                self.symbols.save()  # то сохраняем его в файл один раз
+        return class_codes
+
+    @staticmethod
+    def class_sec_codes_to_dataname(class_code, sec_code):
+        """Название тикера из кода режима торгов и кода тикера
+
+        :param str class_code: Код режима торгов
+        :param str sec_code: Код тикера
+        :return: Название тикера
+        """
+        return f'{class_code}.{sec_code}'
+
+    def get_symbol_info(self, class_code, sec_code, reload=False):
+        """Спецификация тикера
+
+        :param str class_code: Код режима торгов
+        :param str sec_code: Код тикера
+        :param bool reload: Получить информацию из QUIK
+        :return: Значение из кэша/QUIK или None, если тикер не найден
+        """
+        return self.run_steps(self.symbol_info_steps(class_code, sec_code, reload))
+
+    def symbol_info_steps(self, class_code, sec_code, reload=False) -> Generator:
+        """Шаги get_symbol_info"""
+        if not reload:  # Если можно взять информацию из справочника
+            symbol_info = self.symbols.get((class_code, sec_code))  # Информация о тикере из справочника
+            if symbol_info is not None:  # Если информация есть и не устарела
+                return symbol_info  # то возвращаем ее, не обращаясь к QUIK
+        symbol_info = yield self.get_security_info, class_code, sec_code  # Получаем информацию о тикере из QUIK
+        if 'data' not in symbol_info:  # Если ответ не пришел (возникла ошибка). Например, для опциона
+            self.logger.error(f'Информация о {self.class_sec_codes_to_dataname(class_code, sec_code)} не найдена')
+            return None  # то возвращаем пустое значение
+        self.symbols[(class_code, sec_code)] = symbol_info['data']  # Заносим информацию о тикере в справочник. В файл она сохранится с пакетом prefetch_symbols или при закрытии
+        return symbol_info['data']
+
+    def prefetch_symbols(self, class_sec_codes, reload=False) -> dict:
+        """Получение спецификаций списка тикеров одним запросом. Дальше get_symbol_info и функции конвертации берут их из справочника
+
+        Для фьючерсов одним пакетом запросов получается и стоимость шага цены. Функции конвертации цен берут ее из справочника,
+        пока не истек ее срок годности SymbolCache.step_price_ttl, а потом снова запрашивают ее из QUIK
+
+        :param list[tuple[str, str]] class_sec_codes: Коды режимов торгов и тикеров. Например: [('TQBR', 'SBER'), ('SPBFUT', 'SiH5')]
+        :param bool reload: Получить информацию из QUIK, даже если она есть в справочнике
+        :return: (Код режима торгов, тикер) -> спецификация или None, если тикер не найден
+        """
+        return self.run_steps(self.prefetch_symbols_steps(class_sec_codes, reload))
+
+    def prefetch_symbols_steps(self, class_sec_codes, reload=False) -> Generator:
+        """Шаги prefetch_symbols"""
+        keys = list(dict.fromkeys(tuple(key) for key in class_sec_codes))  # Тикеры без повторов в порядке списка
+        missing = keys if reload else [key for key in keys if self.symbols.get(key) is None]  # Тикеры, которых нет в справочнике
+        if missing:  # Если нужно получить информацию из QUIK
+            symbols_info = (yield self.get_security_info_bulk, [f'{class_code}|{sec_code}' for class_code, sec_code in missing]).get('data') or []  # Информация в порядке запроса
+            for (class_code, sec_code), symbol_info in zip(missing, symbols_info):  # Пробегаемся по всем полученным тикерам
+                if symbol_info is None:  # Если тикер не найден
+                    self.logger.error(f'Информация о {self.class_sec_codes_to_dataname(class_code, sec_code)} не найдена')
+                    continue
+                self.symbols[(class_code, sec_code)] = symbol_info  # Заносим информацию о тикере в справочник
+            self.symbols.save()  # Сохраняем справочник в файл один раз
+        step_price_keys = [key for key in keys if key in self.symbols and PriceRules.needs_step_price(key[0], self.symbols[key])
+                           and (reload or self.symbols.get_step_price(key) is None)]  # Фьючерсы без стоимости шага цены в справочнике
+        if step_price_keys:  # Если нужно получить стоимость шага цены из QUIK
+            responses = yield [(self.get_param_ex, class_code, sec_code, 'STEPPRICE') for class_code, sec_code in step_price_keys]  # Стоимость шага цены одним пакетом
+            for key, response in zip(step_price_keys, responses):  # Пробегаемся по всем ответам
+                self.set_step_price(key, response)
+        return {key: self.symbols[key] if key in self.symbols else None for key in keys}
+
+    @staticmethod
+    def timeframe_to_quik_timeframe(tf) -> tuple[int, bool]:
+        """Перевод временнОго интервала во временной интервал QUIK
+
+        :param str tf: Временной интервал https://ru.wikipedia.org/wiki/Таймфрейм
+        :return: Временной интервал QUIK, внутридневной интервал
+        """
+        if 'MN' in tf:  # Месячный временной интервал
+            return 23200, False
+        if tf[0:1] == 'W':  # Недельный временной интервал
+            return 10080, False
+        if tf[0:1] == 'D':  # Дневной временной интервал
+            return 1440, False
+        if tf[0:1] == 'M':  # Минутный временной интервал
+            minutes = int(tf[1:])  # Кол-во минут
+            if minutes in (1, 2, 3, 4, 5, 6, 10, 15, 20, 30, 60, 120, 240):  # Разрешенные временнЫе интервалы в QUIK
+                return minutes, True
+        raise NotImplementedError  # С остальными временнЫми интервалами не работаем, в т.ч. и с тиками (интервал = 0)
+
+    @staticmethod
+    def quik_timeframe_to_timeframe(tf) -> tuple[str, bool]:
+        """Перевод временнОго интервала QUIK во временной интервал
+
+        :param int tf: Временной интервал QUIK
+        :return: Временной интервал https://ru.wikipedia.org/wiki/Таймфрейм, внутридневной интервал
+        """
+        if tf == 23200:  # Месячный временной интервал
+            return 'MN1', False
+        if tf == 10080:  # Недельный временной интервал
+            return 'W1', False
+        if tf == 1440:  # Дневной временной интервал
+            return 'D1', False
+        if tf in (1, 2, 3, 4, 5, 6, 10, 15, 20, 30, 60, 120, 240):  # Минутный временной интервал
+            return f'M{tf}', True
+        raise NotImplementedError  # С остальными временнЫми интервалами не работаем , в т.ч. и с тиками (интервал = 0)
+
+    def price_to_valid_price(self, class_code, sec_code, quik_price) -> Union[int, float]:
+        """Перевод цены в цену, которую примет QUIK в заявке
+
+        :param str class_code: Код режима торгов
+        :param str sec_code: Тикер
+        :param float quik_price: Цена в QUIK
+        :return: Цена, которую примет QUIK в зявке
+        """
+        return self.run_steps(self.convert_steps(class_code, sec_code, PriceRules.valid_price, quik_price))
+
+    def price_to_quik_price(self, class_code, sec_code, price) -> Union[int, float]:
+        """Перевод цены в рублях за штуку в цену QUIK
+
+        Для фьючерсов нужна стоимость шага цены. Она берется из справочника (prefetch_symbols или предыдущая конвертация),
+        а если ее срок годности SymbolCache.step_price_ttl истек, то запрашивается из QUIK
+
+        :param str class_code: Код режима торгов
+        :param str sec_code: Тикер
+        :param float price: Цена в рублях за штуку
+        :return: Цена в QUIK
+        """
+        return self.run_steps(self.convert_price_steps(class_code, sec_code, PriceRules.price_to_quik_price, price))
+
+    def quik_price_to_price(self, class_code, sec_code, quik_price) -> float:
+        """Перевод цены QUIK в цену в рублях за штуку
+
+        Стоимость шага цены фьючерсов берется из справочника так же, как в price_to_quik_price
+
+        :param str class_code: Код режима торгов
+        :param str sec_code: Тикер
+        :param float quik_price: Цена в QUIK
+        :return: Цена в рублях за штуку
+        """
+        return self.run_steps(self.convert_price_steps(class_code, sec_code, PriceRules.quik_price_to_price, quik_price))
+
+    def lots_to_size(self, class_code, sec_code, lots) -> int:
+        """Перевод лотов в штуки
+
+        :param str class_code: Код режима торгов
+        :param str sec_code: Тикер
+        :param int lots: Кол-во лотов
+        :return: Кол-во штук
+        """
+        return self.run_steps(self.convert_steps(class_code, sec_code, PriceRules.lots_to_size, lots))
+
+    def size_to_lots(self, class_code, sec_code, size) -> int:
+        """Перевод штуки в лоты
+
+        :param str class_code: Код режима торгов
+        :param str sec_code: Тикер
+        :param int size: Кол-во штук
+        :return: Кол-во лотов
+        """
+        return self.run_steps(self.convert_steps(class_code, sec_code, PriceRules.size_to_lots, size))
+
+    @property
+    def price_arrays(self):
+        """Конвертация массивов PriceArrays. NumPy импортируется при первом обращении, чтобы не замедлять им запуск"""
+        from .PriceArrays import PriceArrays
+        return PriceArrays
+
+    def price_to_valid_price_array(self, class_code, sec_code, quik_prices):
+        """Перевод массива цен в цены, которые примет QUIK в заявке. Спецификация тикера берется один раз
+
+        :param str class_code: Код режима торгов
+        :param str sec_code: Тикер
+        :param quik_prices: Цены в QUIK: список, массив NumPy или столбец pandas
+        :return: Массив NumPy цен, которые примет QUIK в заявке
+        """
+        return self.run_steps(self.convert_steps(class_code, sec_code, self.price_arrays.valid_prices, quik_prices))
+
+    def price_to_quik_price_array(self, class_code, sec_code, prices):
+        """Перевод массива цен в рублях за штуку в цены QUIK. Спецификация тикера и стоимость шага цены берутся один раз
+
+        :param str class_code: Код режима торгов
+        :param str sec_code: Тикер
+        :param prices: Цены в рублях за штуку: список, массив NumPy или столбец pandas
+        :return: Массив NumPy цен в QUIK
+        """
+        return self.run_steps(self.convert_price_steps(class_code, sec_code, self.price_arrays.prices_to_quik_prices, prices))
+
+    def quik_price_to_price_array(self, class_code, sec_code, quik_prices):
+        """Перевод массива цен QUIK в цены в рублях за штуку. Спецификация тикера и стоимость шага цены берутся один раз
+
+        :param str class_code: Код режима торгов
+        :param str sec_code: Тикер
+        :param quik_prices: Цены в QUIK: список, массив NumPy или столбец pandas
+        :return: Массив NumPy цен в рублях за штуку
+        """
+        return self.run_steps(self.convert_price_steps(class_code, sec_code, self.price_arrays.quik_prices_to_prices, quik_prices))
+
+    def lots_to_size_array(self, class_code, sec_code, lots):
+        """Перевод массива лотов в штуки. Спецификация тикера берется один раз
+
+        :param str class_code: Код режима торгов
+        :param str sec_code: Тикер
+        :param lots: Кол-во лотов: список, массив NumPy или столбец pandas
+        :return: Массив NumPy кол-ва штук
+        """
+        return self.run_steps(self.convert_steps(class_code, sec_code, self.price_arrays.lots_to_sizes, lots))
+
+    def size_to_lots_array(self, class_code, sec_code, sizes):
+        """Перевод массива штук в лоты. Спецификация тикера берется один раз
+
+        :param str class_code: Код режима торгов
+        :param str sec_code: Тикер
+        :param sizes: Кол-во штук: список, массив NumPy или столбец pandas
+        :return: Массив NumPy кол-ва лотов
+        """
+        return self.run_steps(self.convert_steps(class_code, sec_code, self.price_arrays.sizes_to_lots, sizes))
+
+    def convert_steps(self, class_code, sec_code, convert, *args) -> Generator:
+        """Шаги конвертации по спецификации тикера
+
+        :param str class_code: Код режима торгов
+        :param str sec_code: Тикер
+        :param convert: Правило конвертации. Получает спецификацию тикера и args
+        """
+        si = yield from self.symbol_info_steps(class_code, sec_code)  # Спецификация тикера
+        return convert(si, *args)
+
+    def convert_price_steps(self, class_code, sec_code, convert, *args) -> Generator:
+        """Шаги конвертации цен по спецификации тикера и стоимости шага цены
+
+        :param str class_code: Код режима торгов
+        :param str sec_code: Тикер
+        :param convert: Правило конвертации. Получает код режима торгов, спецификацию тикера, стоимость шага цены и args
+        """
+        si = yield from self.symbol_info_steps(class_code, sec_code)  # Спецификация тикера
+        step_price = None  # Стоимость шага цены нужна только для фьючерсов
+        if PriceRules.needs_step_price(class_code, si):  # Если это фьючерс
+            step_price = self.symbols.get_step_price((class_code, sec_code))  # то берем ее из справочника
+            if step_price is None:  # Если ее нет в справочнике или истек ее срок годности
+                step_price = self.set_step_price((class_code, sec_code), (yield self.get_param_ex, class_code, sec_code, 'STEPPRICE'))  # то получаем ее из QUIK
+        return convert(class_code, si, step_price, *args)
+
+    def set_step_price(self, key, response):
+        """Занесение стоимости шага цены из ответа QUIK в справочник
+
+        :param tuple[str, str] key: Код режима торгов, тикер
+        :param dict response: Ответ getParamEx на запрос STEPPRICE
+        :return: Стоимость шага цены или None, если она не получена
+        """
+        try:  # Пробуем разобрать стоимость шага цены
+            step_price = float(response['data']['param_value'])
+        except (KeyError, TypeError, ValueError):  # Если ответ не пришел или параметра нет
+            self.logger.error(f'Стоимость шага цены {self.class_sec_codes_to_dataname(*key)} не получена: {response}')
+            return None
+        self.symbols.set_step_price(key, step_price)
+        return step_price
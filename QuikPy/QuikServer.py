@@ -0,0 +1,583 @@
+from datetime import datetime, timedelta  # Дата и время бар
+from json import dumps  # Ответы и функции обратного вызова в формате JSON
+from random import Random  # Синтетические цены
+from socket import socket, AF_INET, SOCK_STREAM, SOL_SOCKET, SO_REUSEADDR, SHUT_RDWR  # Соединения с клиентами
+from threading import Thread, Lock, Event, Condition  # Потоки соединений и потоков событий
+from time import monotonic, sleep, time  # Темп потоков событий, время сообщений
+import logging  # Будем вести лог
+
+from .LineDecoder import LineDecoder  # Разбор потока байт на сообщения QUIK#
+
+
+def default_fixtures() -> dict:
+    """Данные, которыми отвечает сервер по умолчанию: тикеры, параметры текущих торгов, счета, лимиты"""
+    securities = {
+        ('TQBR', 'SBER'): dict(short_name='Сбербанк', name='Сбербанк России ПАО ао', face_unit='SUR', face_value=3, scale=2, lot_size=10, min_price_step=0.01, mat_date=0, isin_code='RU0009029540'),
+        ('TQBR', 'GAZP'): dict(short_name='ГАЗПРОМ ао', name='"Газпром" (ПАО) ао', face_unit='SUR', face_value=5, scale=2, lot_size=10, min_price_step=0.01, mat_date=0, isin_code='RU0007661625'),
+        ('SPBFUT', 'SiH5'): dict(short_name='Si-3.25', name='Фьючерсный контракт Si-3.25', face_unit='SUR', face_value=1, scale=0, lot_size=1, min_price_step=1, mat_date=20250320, isin_code=''),
+        ('SPBFUT', 'RIH5'): dict(short_name='RTS-3.25', name='Фьючерсный контракт RTS-3.25', face_unit='SUR', face_value=1, scale=0, lot_size=1, min_price_step=10, mat_date=20250320, isin_code=''),
+    }  # Спецификации тикеров без кодов
+    params = {('TQBR', 'SBER'): dict(LAST=280.5, STEPPRICE=0.01), ('TQBR', 'GAZP'): dict(LAST=135.2, STEPPRICE=0.01),
+              ('SPBFUT', 'SiH5'): dict(LAST=89500, STEPPRICE=1), ('SPBFUT', 'RIH5'): dict(LAST=101350, STEPPRICE=17.92)}  # Параметры текущих торгов
+    return dict(
+        securities=securities, params=params,
+        trade_accounts=[dict(firmid='MC0001', trdaccid='L01-00000F00', class_codes='|TQBR|', description='Фондовый рынок', trdacc_type=0, status=0),
+                        dict(firmid='SPBFUT', trdaccid='SPBFUT000ab', class_codes='|SPBFUT|SPBOPT|', description='Срочный рынок', trdacc_type=0, status=0)],
+        money_limits=[dict(firmid='MC0001', client_code='000001', tag='EQTV', currcode='SUR', limit_kind=0, currentbal=100000.0, openbal=100000.0),
+                      dict(firmid='MC0001', client_code='000001', tag='EQTV', currcode='SUR', limit_kind=1, currentbal=100000.0, openbal=100000.0)],
+        depo_limits=[], orders=[], stop_orders=[], trades=[], futures_holdings=[],
+        futures_limit=dict(cbplused=0.0, cbplimit=100000.0, varmargin=0.0, accruedint=0.0, currcode='SUR'),
+        history_size=5000)  # Кол-во бар истории по каждому тикеру и интервалу
+
+
+class QuikServer:
+    """Заменитель QUIK# для нагрузочного тестирования и проверки QuikPy без терминала QUIK
+
+    Говорит на том же протоколе, что и QuikSharp.lua: строки JSON в кодировке Windows 1251 с переводом строки.
+    Отвечает на частые запросы (ping, getSecurityInfo, get_candles_from_data_source, getParamEx, sendTransaction, ...) из данных fixtures.
+    На остальные запросы отвечает lua_error, как QuikSharp.lua на нереализованную команду.
+    Отправляет синтетические потоки NewCandle, OnQuote, OnAllTrade с заданным темпом во все соединения для функций обратного вызова.
+    В отличие от QuikSharp.lua принимает сразу несколько пар соединений (и пул соединений для запросов)
+
+    Пример:
+    with QuikServer() as server:
+        server.stream('OnAllTrade', rate=10000)
+        qp_provider = QuikPy()
+    """
+    logger = logging.getLogger('QuikPy.QuikServer')  # Будем вести лог
+    streams = ('NewCandle', 'OnQuote', 'OnAllTrade')  # Синтетические потоки событий
+    chunk_size = 1000  # Максимальное кол-во событий в одной записи в соединение
+
+    def __init__(self, host='127.0.0.1', requests_port=34130, callbacks_port=34131, fixtures=None, seed=0):
+        """Инициализация. Сервер запускается в start или при входе в with
+
+        :param str host: IP адрес, на котором принимаем соединения
+        :param int requests_port: Порт для запросов. 0 - любой свободный
+        :param int callbacks_port: Порт для функций обратного вызова. 0 - любой свободный
+        :param dict fixtures: Данные, которые заменяют данные по умолчанию (default_fixtures)
+        :param int seed: Начальное значение генератора синтетических цен. Одинаковое значение - одинаковые данные
+        """
+        self.host = host  # IP адрес
+        self.requests_port = requests_port  # Порт для запросов
+        self.callbacks_port = callbacks_port  # Порт для функций обратного вызова
+        self.fixtures = {**default_fixtures(), **(fixtures or {})}  # Данные для ответов
+        self.random = Random(seed)  # Генератор синтетических цен
+        self.prices = {key: float(params['LAST']) for key, params in self.fixtures['params'].items()}  # Последние цены тикеров
+        self.history = {}  # История бар: (код режима торгов, тикер, интервал) -> список бар
+        self.candle_subscriptions = set()  # Подписки на свечки: строки класс|тикер|интервал|параметр
+        self.quote_subscriptions = set()  # Подписки на стаканы: (код режима торгов, тикер)
+        self.servers = []  # Соединения, которые принимают клиентов
+        self.requests_clients = []  # Соединения для запросов
+        self.callbacks_clients = []  # Соединения для функций обратного вызова
+        self.clients_condition = Condition()  # Ожидание подключения клиентов
+        self.callbacks_lock = Lock()  # Функции обратного вызова отправляются из разных потоков
+        self.stop_event = Event()  # Остановка потоков событий
+        self.threads = []  # Потоки событий
+        self.order_num = 1000000  # Номер следующей заявки
+        self.requests = 0  # Кол-во обработанных запросов
+        self.callbacks = 0  # Кол-во отправленных функций обратного вызова
+        self.commands = {
+            'ping': self.ping, 'echo': self.echo, 'isConnected': lambda msg: 1, 'is_quik': lambda msg: 1,
+            'getClassesList': self.get_classes_list, 'getClassInfo': self.get_class_info, 'getClassSecurities': self.get_class_securities,
+            'getSecurityInfo': self.get_security_info, 'getSecurityInfoBulk': self.get_security_info_bulk, 'getSecurityClass': self.get_security_class,
+            'getParamEx': self.get_param_ex, 'getParamEx2': self.get_param_ex, 'getParamEx2Bulk': self.get_param_ex_bulk,
+            'paramRequest': lambda msg: True, 'paramRequestBulk': lambda msg: [True] * len(msg['data']),
+            'cancelParamRequest': lambda msg: True, 'cancelParamRequestBulk': lambda msg: [True] * len(msg['data']),
+            'getTradeAccounts': lambda msg: self.fixtures['trade_accounts'], 'getTradeAccount': self.get_trade_account,
+            'getMoneyLimits': lambda msg: self.fixtures['money_limits'], 'get_depo_limits': lambda msg: self.fixtures['depo_limits'],
+            'get_orders': lambda msg: self.fixtures['orders'], 'get_stop_orders': lambda msg: self.fixtures['stop_orders'],
+            'get_trades': lambda msg: self.fixtures['trades'], 'getFuturesClientHoldings': lambda msg: self.fixtures['futures_holdings'],
+            'getFuturesLimit': lambda msg: self.fixtures['futures_limit'],
+            'getClientCode': lambda msg: self.fixtures['money_limits'][0]['client_code'] if self.fixtures['money_limits'] else None,
+            'getClientCodes': lambda msg: sorted({limit['client_code'] for limit in self.fixtures['money_limits']}),
+            'getInfoParam': lambda msg: datetime.now().strftime('%H:%M:%S') if msg['data'] == 'SERVERTIME' else '',
+            'sendTransaction': self.send_transaction, 'GetQuoteLevel2': lambda msg: self.make_quote(*msg['data'].split('|')[:2]),
+            'get_candles_from_data_source': self.get_candles_from_data_source,
+            'subscribe_to_candles': self.subscribe_to_candles, 'unsubscribe_from_candles': self.unsubscribe_from_candles, 'is_subscribed': self.is_subscribed,
+            'Subscribe_Level_II_Quotes': self.subscribe_level2_quotes, 'Unsubscribe_Level_II_Quotes': self.unsubscribe_level2_quotes,
+            'IsSubscribed_Level_II_Quotes': lambda msg: tuple(msg['data'].split('|')[:2]) in self.quote_subscriptions,
+        }  # Команды QUIK# -> обработчик. Обработчик возвращает данные ответа. None - ответ без данных, как у QuikSharp.lua
+
+    # Запуск и остановка
+
+    def start(self):
+        """Запуск сервера: прием соединений для запросов и функций обратного вызова"""
+        for port, handler, name in ((self.requests_port, self.requests_handler, 'Requests'), (self.callbacks_port, self.callbacks_handler, 'Callbacks')):
+            server = socket(AF_INET, SOCK_STREAM)  # Соединение, которое принимает клиентов
+            server.setsockopt(SOL_SOCKET, SO_REUSEADDR, 1)  # Порт можно сразу занять заново после остановки
+            server.bind((self.host, port))
+            server.listen(16)
+            self.servers.append(server)
+            Thread(target=self.accept_handler, args=(server, handler), name=f'QuikServer{name}Accept', daemon=True).start()
+        self.requests_port = self.servers[0].getsockname()[1]  # Порт для запросов. Если был задан 0, то выбранный системой
+        self.callbacks_port = self.servers[1].getsockname()[1]  # Порт для функций обратного вызова
+        self.logger.info(f'Сервер запущен на {self.host}:{self.requests_port}/{self.callbacks_port}')
+        return self
+
+    def stop(self):
+        """Остановка сервера: остановка потоков событий, закрытие всех соединений"""
+        self.stop_streams()
+        for server in self.servers:  # Пробегаемся по всем соединениям, которые принимают клиентов
+            self.close_socket(server)
+        self.servers.clear()
+        self.disconnect_clients()
+
+    def restart(self):
+        """Перезапуск скрипта QuikSharp.lua: разрыв всех соединений клиентов, сброс подписок. Сервер продолжает принимать соединения"""
+        self.candle_subscriptions.clear()
+        self.quote_subscriptions.clear()
+        self.disconnect_clients()
+
+    def disconnect_clients(self):
+        """Разрыв всех соединений клиентов"""
+        with self.clients_condition:
+            clients = self.requests_clients + self.callbacks_clients  # Все соединения клиентов
+            self.requests_clients.clear()
+            self.callbacks_clients.clear()
+        for client in clients:  # Пробегаемся по всем соединениям клиентов
+            self.close_socket(client)
+
+    @staticmethod
+    def close_socket(sock):
+        """Закрытие соединения с пробуждением потока, который ждет в нем данных
+
+        :param socket sock: Соединение
+        """
+        try:  # Будим поток, который ждет данных
+            sock.shutdown(SHUT_RDWR)
+        except OSError:  # Если соединение уже разорвано
+            pass  # то будить некого
+        sock.close()
+
+    def wait_clients(self, count=1, timeout=None) -> bool:
+        """Ожидание подключения клиентов к порту функций обратного вызова
+
+        :param int count: Кол-во соединений для функций обратного вызова
+        :param float timeout: Максимальное время ожидания в секундах. None - без ограничения
+        :return: Клиенты подключились
+        """
+        with self.clients_condition:
+            return self.clients_condition.wait_for(lambda: len(self.callbacks_clients) >= count, timeout)
+
+    def stats(self) -> dict:
+        """Кол-во обработанных запросов, отправленных функций обратного вызова и подключенных клиентов"""
+        return dict(requests=self.requests, callbacks=self.callbacks,
+                    requests_clients=len(self.requests_clients), callbacks_clients=len(self.callbacks_clients))
+
+    def __enter__(self):
+        """Вход в класс, например, с with"""
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        """Выход из класса, например, с with"""
+        self.stop()
+
+    # Соединения
+
+    def accept_handler(self, server, handler):
+        """Поток приема соединений
+
+        :param socket server: Соединение, которое принимает клиентов
+        :param handler: Обработчик нового соединения
+        """
+        while True:  # Пока сервер не остановлен
+            try:  # Пробуем принять соединение
+                client = server.accept()[0]
+            except OSError:  # Если сервер остановлен
+                return  # то выходим, дальше не продолжаем
+            handler(client)
+
+    def requests_handler(self, client):
+        """Новое соединение для запросов. Запросы обрабатываются в отдельном потоке по порядку
+
+        :param socket client: Соединение
+        """
+        with self.clients_condition:
+            self.requests_clients.append(client)
+        Thread(target=self.requests_thread, args=(client,), name='QuikServerRequests', daemon=True).start()
+
+    def callbacks_handler(self, client):
+        """Новое соединение для функций обратного вызова
+
+        :param socket client: Соединение
+        """
+        with self.clients_condition:
+            self.callbacks_clients.append(client)
+            self.clients_condition.notify_all()  # Будим ожидающих подключения клиентов
+
+    def requests_thread(self, client):
+        """Поток обработки запросов одного соединения. Ответы на все запросы одного фрагмента отправляются одной записью
+
+        :param socket client: Соединение для запросов
+        """
+        decoder = LineDecoder()  # Разбор запросов
+        while True:  # Пока соединение открыто
+            try:  # Пробуем прочитать фрагмент
+                fragment = client.recv(1048576)
+            except OSError:  # Если соединение разорвано
+                fragment = b''
+            if not fragment:  # Если соединение закрыто
+                break
+            responses = []  # Ответы на запросы фрагмента
+            for line in decoder.lines(fragment):  # Пробегаемся по всем полученным полностью запросам
+                try:  # Пробуем разобрать запрос
+                    msg = decoder.decode(line.replace(b'\r', b''))
+                except ValueError as e:  # Если запрос не в формате JSON
+                    self.logger.error(f'Запрос не разобран: {e} {line}')  # то QuikSharp.lua его пропускает
+                    continue
+                responses.append(self.encode(self.process(msg)))
+            try:  # Пробуем отправить ответы
+                client.sendall(b''.join(responses))
+            except OSError:  # Если соединение разорвано
+                break
+        with self.clients_condition:
+            if client in self.requests_clients:  # Если соединение не закрыли при перезапуске
+                self.requests_clients.remove(client)
+        client.close()
+
+    def process(self, msg) -> dict:
+        """Обработка запроса
+
+        :param dict msg: Запрос
+        :return: Ответ. Как и QuikSharp.lua, это запрос с замененными данными
+        """
+        self.requests += 1
+        command = self.commands.get(msg.get('cmd'))  # Обработчик команды
+        if command is None:  # Если команда не реализована
+            msg['lua_error'] = f'Command not implemented in Lua qsfunctions module: {msg.get("cmd")}'
+            msg['cmd'] = 'lua_error'
+            return msg
+        try:  # Пробуем выполнить команду
+            data = command(msg)
+        except Exception as e:  # Если возникла ошибка
+            msg['lua_error'] = f'Lua error: {e}'
+            msg['cmd'] = 'lua_error'
+            return msg
+        if data is None:  # Если данных нет
+            msg.pop('data', None)  # то dkjson не выводит ключ data
+        else:  # Если данные есть
+            msg['data'] = data
+        return msg
+
+    @staticmethod
+    def encode(msg) -> bytes:
+        """Сообщение в том виде, как его отправляет QuikSharp.lua: JSON без пробелов в кодировке Windows 1251 с переводом строки
+
+        :param dict msg: Сообщение
+        """
+        return (dumps(msg, ensure_ascii=False, separators=(',', ':')) + '\n').encode('cp1251', errors='replace')
+
+    def send_callback(self, cmd, data):
+        """Отправка функции обратного вызова во все соединения
+
+        :param str cmd: Команда QUIK#
+        :param data: Данные
+        """
+        self.broadcast(self.encode({'cmd': cmd, 'data': data, 't': int(time() * 1000)}))
+
+    def broadcast(self, raw_data, count=1):
+        """Отправка готовых функций обратного вызова во все соединения
+
+        :param bytes raw_data: Функции обратного вызова в кодировке Windows 1251, каждая с переводом строки
+        :param int count: Кол-во функций обратного вызова
+        """
+        with self.callbacks_lock:  # Записи из разных потоков не должны перемешиваться
+            for client in list(self.callbacks_clients):  # Пробегаемся по всем соединениям
+                try:  # Пробуем отправить
+                    client.sendall(raw_data)
+                except OSError:  # Если соединение разорвано
+                    with self.clients_condition:
+                        if client in self.callbacks_clients:
+                            self.callbacks_clients.remove(client)  # то больше в него не отправляем
+            self.callbacks += count
+
+    # Команды
+
+    @staticmethod
+    def ping(msg):
+        """Проверка соединения"""
+        msg['t'] = 0
+        return 'Pong' if msg['data'] == 'Ping' else f'{msg["data"]} is not Ping'
+
+    @staticmethod
+    def echo(msg):
+        """Эхо"""
+        return msg.get('data')
+
+    def class_codes(self) -> list[str]:
+        """Режимы торгов в порядке первого появления в спецификациях"""
+        return list(dict.fromkeys(class_code for class_code, _ in self.fixtures['securities']))
+
+    def get_classes_list(self, msg):
+        """Режимы торгов через запятую"""
+        return ''.join(f'{class_code},' for class_code in self.class_codes())
+
+    def get_class_info(self, msg):
+        """Информация о режиме торгов"""
+        return dict(firmid='', name=msg['data'], code=msg['data'], npars=0, nsecs=len(self.get_class_securities(msg)[:-1].split(',')))
+
+    def get_class_securities(self, msg):
+        """Тикеры режима торгов через запятую"""
+        return ''.join(f'{sec_code},' for class_code, sec_code in self.fixtures['securities'] if class_code == msg['data'])
+
+    def security_info(self, class_code, sec_code):
+        """Спецификация тикера или None, если тикер не найден
+
+        :param str class_code: Код режима торгов
+        :param str sec_code: Тикер
+        """
+        info = self.fixtures['securities'].get((class_code, sec_code))  # Спецификация без кодов
+        return None if info is None else dict(info, class_code=class_code, class_name=class_code, code=sec_code, sec_code=sec_code)
+
+    def get_security_info(self, msg):
+        """Спецификация тикера"""
+        return self.security_info(*msg['data'].split('|')[:2])
+
+    def get_security_info_bulk(self, msg):
+        """Спецификации списка тикеров. Для ненайденных - null"""
+        return [self.security_info(*item.split('|')[:2]) for item in msg['data']]
+
+    def get_security_class(self, msg):
+        """Режим торгов тикера из заданных режимов торгов"""
+        classes_list, sec_code = msg['data'].split('|')[:2]
+        return next((class_code for class_code in classes_list.split(',') if (class_code, sec_code) in self.fixtures['securities']), '')
+
+    def param(self, class_code, sec_code, param_name) -> dict:
+        """Параметр текущих торгов в формате getParamEx
+
+        :param str class_code: Код режима торгов
+        :param str sec_code: Тикер
+        :param str param_name: Параметр
+        """
+        if param_name == 'LAST' and (class_code, sec_code) in self.prices:  # Последняя цена меняется синтетическими потоками
+            value = self.prices[class_code, sec_code]
+        else:  # Остальные параметры берем из данных
+            value = self.fixtures['params'].get((class_code, sec_code), {}).get(param_name)
+        if value is None:  # Если параметра нет
+            return dict(param_type='0', param_value='', param_image='', result='0')
+        return dict(param_type='1', param_value=f'{value:.6f}', param_image=str(value), result='1')
+
+    def get_param_ex(self, msg):
+        """Параметр текущих торгов"""
+        return self.param(*msg['data'].split('|')[:3])
+
+    def get_param_ex_bulk(self, msg):
+        """Параметры текущих торгов списком"""
+        return [self.param(*item.split('|')[:3]) for item in msg['data']]
+
+    def get_trade_account(self, msg):
+        """Торговый счет для режима торгов"""
+        return next((account['trdaccid'] for account in self.fixtures['trade_accounts'] if f'|{msg["data"]}|' in account['class_codes']), None)
+
+    def send_transaction(self, msg):
+        """Отправка транзакции. Ответ на транзакцию приходит функцией обратного вызова OnTransReply"""
+        transaction = msg['data']  # Транзакция
+        self.order_num += 1  # Номер заявки
+        reply = dict(trans_id=int(transaction.get('TRANS_ID', 0)), status=3, result_msg=f'Заявка N {self.order_num} зарегистрирована',
+                     order_num=self.order_num, class_code=transaction.get('CLASSCODE', ''), sec_code=transaction.get('SECCODE', ''),
+                     account=transaction.get('ACCOUNT', ''), client_code=transaction.get('CLIENT_CODE', ''))  # Ответ на транзакцию
+        Thread(target=self.send_callback, args=('OnTransReply', reply), daemon=True).start()  # Ответ на транзакцию придет после ответа на запрос
+        return True
+
+    def get_candles_from_data_source(self, msg):
+        """Последние count бар по тикеру и интервалу. 0 - все бары истории"""
+        class_code, sec_code, interval, _, count = msg['data'].split('|')[:5]
+        candles = self.candles(class_code, sec_code, int(interval))  # История бар
+        count = int(count)
+        return candles[-count:] if count else candles
+
+    def subscribe_to_candles(self, msg):
+        """Подписка на свечки"""
+        self.candle_subscriptions.add(msg['data'])
+        return msg['data']
+
+    def unsubscribe_from_candles(self, msg):
+        """Отмена подписки на свечки"""
+        self.candle_subscriptions.discard(msg['data'])
+        return msg['data']
+
+    def is_subscribed(self, msg):
+        """Есть ли подписка на свечки"""
+        return msg['data'] in self.candle_subscriptions
+
+    def subscribe_level2_quotes(self, msg):
+        """Подписка на стакан"""
+        self.quote_subscriptions.add(tuple(msg['data'].split('|')[:2]))
+        return True
+
+    def unsubscribe_level2_quotes(self, msg):
+        """Отмена подписки на стакан"""
+        self.quote_subscriptions.discard(tuple(msg['data'].split('|')[:2]))
+        return True
+
+    # Синтетические данные
+
+    def next_price(self, class_code, sec_code) -> float:
+        """Следующая цена тикера: случайное блуждание с шагом цены
+
+        :param str class_code: Код режима торгов
+        :param str sec_code: Тикер
+        """
+        step = self.fixtures['securities'].get((class_code, sec_code), {}).get('min_price_step', 0.01)  # Шаг цены
+        price = self.prices.get((class_code, sec_code), 100.0) + self.random.randint(-3, 3) * step  # Сдвигаем цену на несколько шагов
+        price = round(max(price, step), 6)  # Цена не может быть меньше шага цены
+        self.prices[class_code, sec_code] = price
+        return price
+
+    @staticmethod
+    def quik_datetime(dt) -> dict:
+        """Дата и время в формате QUIK
+
+        :param datetime dt: Дата и время
+        """
+        return dict(year=dt.year, month=dt.month, day=dt.day, hour=dt.hour, min=dt.minute, sec=dt.second,
+                    ms=dt.microsecond // 1000, mcs=dt.microsecond, week_day=dt.isoweekday() % 7)
+
+    def make_candle(self, class_code, sec_code, interval, dt) -> dict:
+        """Синтетический бар
+
+        :param str class_code: Код режима торгов
+        :param str sec_code: Тикер
+        :param int interval: Интервал в минутах
+        :param datetime dt: Дата и время начала бара
+        """
+        prices = [self.next_price(class_code, sec_code) for _ in range(4)]  # Цены внутри бара
+        return dict(open=prices[0], high=max(prices), low=min(prices), close=prices[-1], volume=self.random.randint(1, 1000),
+                    datetime=self.quik_datetime(dt), sec=sec_code, **{'class': class_code}, interval=interval)
+
+    def candles(self, class_code, sec_code, interval) -> list[dict]:
+        """История бар по тикеру и интервалу. Создается один раз, продолжается потоком NewCandle
+
+        :param str class_code: Код режима торгов
+        :param str sec_code: Тикер
+        :param int interval: Интервал в минутах. 0 (тики) - бары по минуте
+        """
+        key = (class_code, sec_code, interval)  # Ключ истории
+        if key not in self.history:  # Если истории еще нет
+            step = timedelta(minutes=max(interval, 1))  # Длительность бара
+            size = self.fixtures['history_size']  # Кол-во бар истории
+            start = datetime.now().replace(second=0, microsecond=0) - step * size  # Дата и время первого бара
+            self.history[key] = [self.make_candle(class_code, sec_code, interval, start + step * i) for i in range(size)]
+        return self.history[key]
+
+    def new_candle(self, class_code, sec_code, interval) -> dict:
+        """Следующий бар истории для потока NewCandle
+
+        :param str class_code: Код режима торгов
+        :param str sec_code: Тикер
+        :param int interval: Интервал в минутах
+        """
+        candles = self.candles(class_code, sec_code, interval)  # История бар
+        last = candles[-1]['datetime']  # Дата и время последнего бара
+        dt = datetime(last['year'], last['month'], last['day'], last['hour'], last['min']) + timedelta(minutes=max(interval, 1))  # Дата и время нового бара
+        candle = self.make_candle(class_code, sec_code, interval, dt)
+        candles.append(candle)
+        return candle
+
+    def make_quote(self, class_code, sec_code, depth=10) -> dict:
+        """Синтетический стакан в формате getQuoteLevel2: цены и кол-ва строками
+
+        :param str class_code: Код режима торгов
+        :param str sec_code: Тикер
+        :param int depth: Кол-во котировок на покупку и на продажу
+        """
+        price = self.next_price(class_code, sec_code)  # Цена
+        step = self.fixtures['securities'].get((class_code, sec_code), {}).get('min_price_step', 0.01)  # Шаг цены
+        return dict(bid_count=f'{depth:.6f}', offer_count=f'{depth:.6f}',
+                    bid=[dict(price=f'{price - step * i:.6f}', quantity=str(self.random.randint(1, 500))) for i in range(depth, 0, -1)],  # Покупки по возрастанию цены
+                    offer=[dict(price=f'{price + step * i:.6f}', quantity=str(self.random.randint(1, 500))) for i in range(1, depth + 1)],  # Продажи по возрастанию цены
+                    class_code=class_code, sec_code=sec_code, server_time=datetime.now().strftime('%H:%M:%S'))
+
+    def make_all_trade(self, class_code, sec_code) -> dict:
+        """Синтетическая обезличенная сделка
+
+        :param str class_code: Код режима торгов
+        :param str sec_code: Тикер
+        """
+        self.order_num += 1  # Номер сделки
+        price = self.next_price(class_code, sec_code)  # Цена
+        qty = self.random.randint(1, 100)  # Кол-во
+        return dict(trade_num=self.order_num, flags=self.random.choice((1025, 1026)), price=price, qty=qty, value=price * qty,
+                    accruedint=0, yield_=0, settlecode='', reporate=0, repovalue=0, repo2value=0, repoterm=0,
+                    sec_code=sec_code, class_code=class_code, datetime=self.quik_datetime(datetime.now()),
+                    period=1, open_interest=0, exchange_code='', exec_market='')
+
+    def events(self, cmd):
+        """Бесконечный генератор событий синтетического потока. Инструменты берутся из подписок, если их нет - все тикеры из данных
+
+        :param str cmd: Поток: NewCandle, OnQuote, OnAllTrade
+        """
+        while True:  # Пока поток нужен
+            if cmd == 'NewCandle':  # Новые бары
+                keys = [subscription.split('|') for subscription in sorted(self.candle_subscriptions)] or \
+                       [(class_code, sec_code, '1', '-') for class_code, sec_code in self.fixtures['securities']]  # Подписки на свечки
+                for class_code, sec_code, interval, _ in keys:  # Пробегаемся по всем подпискам
+                    yield self.new_candle(class_code, sec_code, int(interval))
+            elif cmd == 'OnQuote':  # Изменения стаканов
+                for class_code, sec_code in sorted(self.quote_subscriptions) or list(self.fixtures['securities']):
+                    yield self.make_quote(class_code, sec_code)
+            elif cmd == 'OnAllTrade':  # Обезличенные сделки
+                for class_code, sec_code in list(self.fixtures['securities']):
+                    yield self.make_all_trade(class_code, sec_code)
+            else:  # Поток не поддерживается
+                raise ValueError(f'Поток {cmd} не поддерживается. Возможные значения: {self.streams}')
+
+    def stream(self, cmd, rate=1000.0, count=None) -> Thread:
+        """Запуск синтетического потока событий
+
+        :param str cmd: Поток: NewCandle, OnQuote, OnAllTrade
+        :param float rate: Кол-во событий в секунду. None - как можно быстрее
+        :param int count: Кол-во событий. None - пока не вызван stop_streams
+        :return: Поток событий
+        """
+        if cmd not in self.streams:  # Если поток не поддерживается
+            raise ValueError(f'Поток {cmd} не поддерживается. Возможные значения: {self.streams}')
+        self.stop_event.clear()
+        thread = Thread(target=self.stream_thread, args=(cmd, rate, count), name=f'QuikServer{cmd}', daemon=True)
+        self.threads.append(thread)
+        thread.start()
+        return thread
+
+    def stream_thread(self, cmd, rate, count):
+        """Поток событий. События отправляются пачками, чтобы держать темп и при высоких rate
+
+        :param str cmd: Поток: NewCandle, OnQuote, OnAllTrade
+        :param float rate: Кол-во событий в секунду. None - как можно быстрее
+        :param int count: Кол-во событий. None - без ограничения
+        """
+        events = self.events(cmd)  # Генератор событий
+        start = monotonic()  # Время запуска потока
+        sent = 0  # Кол-во отправленных событий
+        while not self.stop_event.is_set() and (count is None or sent < count):  # Пока поток нужен
+            size = self.chunk_size  # Кол-во событий в пачке
+            if rate:  # Если задан темп
+                size = min(size, int((monotonic() - start) * rate) - sent)  # то отправляем только события, время которых уже пришло
+                if size <= 0:  # Если время следующего события еще не пришло
+                    sleep(min(1 / rate, 0.01))  # то ждем
+                    continue
+            if count is not None:  # Если задано кол-во событий
+                size = min(size, count - sent)  # то не отправляем больше
+            t = int(time() * 1000)  # Время создания событий
+            raw_data = b''.join(self.encode({'cmd': cmd, 'data': next(events), 't': t}) for _ in range(size))  # Пачка событий
+            self.broadcast(raw_data, size)
+            sent += size
+
+    def stop_streams(self):
+        """Остановка всех потоков событий"""
+        self.stop_event.set()
+        for thread in self.threads:  # Пробегаемся по всем потокам событий
+            thread.join()
+        self.threads.clear()
+
+
+if __name__ == '__main__':  # Точка входа при запуске этого скрипта. Запуск из корня проекта: python -m QuikPy.QuikServer
+    logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', datefmt='%d.%m.%Y %H:%M:%S', level=logging.INFO)
+    with QuikServer() as quik_server:  # Сервер на портах QUIK# по умолчанию
+        for stream_cmd, stream_rate in (('NewCandle', 1), ('OnQuote', 100), ('OnAllTrade', 1000)):  # Пробегаемся по всем потокам
+            quik_server.stream(stream_cmd, stream_rate)  # Запускаем поток
+        try:  # Работаем до Ctrl+C
+            while True:
+                sleep(10)
+                quik_server.logger.info(quik_server.stats())
+        except KeyboardInterrupt:
+            pass
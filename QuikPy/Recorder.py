@@ -0,0 +1,141 @@
+from collections import deque  # Буфер записей между потоком чтения и потоком записи на диск
+from pathlib import Path  # Файлы записи
+from struct import Struct  # Двоичный формат файла
+from threading import Thread, Event  # Поток записи на диск
+from time import monotonic_ns, time_ns  # Время получения функций обратного вызова
+import logging  # Будем вести лог
+import zlib  # Сжатие блоков
+
+
+class Recorder:
+    """Запись потока функций обратного вызова QUIK# в файлы для профилирования, разбора ситуаций и воспроизведения (Replay)
+
+    Формат файла (все числа little-endian):
+    - Заголовок: сигнатура QPYREC1, монотонное время и время UTC открытия файла в наносекундах
+    - Блоки: размер сжатых данных, размер исходных данных, данные, сжатые zlib
+    - Записи внутри блока: монотонное время получения в наносекундах, длина строки, строка JSON в кодировке Windows 1251 без перевода строки
+
+    Поток чтения соединения только добавляет строку в буфер в памяти. Сжатие и запись на диск выполняются в отдельном потоке.
+    При превышении размера файл закрывается и продолжается следующий: callbacks.qpr -> callbacks.0000.qpr, callbacks.0001.qpr, ...
+    """
+    logger = logging.getLogger('QuikPy.Recorder')  # Будем вести лог
+    magic = b'QPYREC1\0'  # Сигнатура файла
+    header = Struct('<8sqq')  # Заголовок файла: сигнатура, монотонное время, время UTC в наносекундах
+    block_header = Struct('<II')  # Заголовок блока: размер сжатых данных, размер исходных данных
+    record_header = Struct('<qI')  # Заголовок записи: монотонное время в наносекундах, длина строки
+
+    def __init__(self, path, max_file_size=256 * 1024 * 1024, block_size=1024 * 1024, level=1, flush_interval=0.5, max_pending=1000000):
+        """Инициализация. Сразу запускает поток записи на диск
+
+        :param str path: Файл записи. К имени добавляется номер файла. Существующие файлы не перезаписываются
+        :param int max_file_size: Размер файла в байтах, после которого начинается следующий файл
+        :param int block_size: Размер исходных данных блока в байтах, после которого блок сжимается и записывается
+        :param int level: Степень сжатия zlib от 1 (быстрее) до 9 (меньше)
+        :param float flush_interval: Через сколько секунд записывать на диск неполный блок
+        :param int max_pending: Максимальное кол-во записей в памяти. Если диск не успевает, новые записи отбрасываются, поток чтения не ждет
+        """
+        self.path = Path(path)  # Файл записи
+        self.max_file_size = max_file_size  # Размер файла для перехода на следующий
+        self.block_size = block_size  # Размер исходных данных блока
+        self.level = level  # Степень сжатия
+        self.flush_interval = flush_interval  # Интервал записи неполного блока
+        self.max_pending = max_pending  # Максимальное кол-во записей в памяти
+        self.pending = deque()  # Записи, ожидающие записи на диск: (монотонное время, строка). Добавление и извлечение потокобезопасны
+        self.index = len(self.files(path))  # Номер следующего файла. Продолжаем после существующих
+        self.file = None  # Текущий файл
+        self.file_size = 0  # Размер текущего файла
+        self.records = 0  # Кол-во записанных записей
+        self.raw_bytes = 0  # Размер записанных исходных данных
+        self.compressed_bytes = 0  # Размер записанных сжатых данных
+        self.blocks = 0  # Кол-во записанных блоков
+        self.dropped = 0  # Кол-во отброшенных записей
+        self.exit_event = Event()  # Остановка потока записи
+        self.thread = Thread(target=self.flush_handler, name='RecorderThread', daemon=True)  # Поток записи на диск
+        self.thread.start()
+
+    @classmethod
+    def files(cls, path) -> list[Path]:
+        """Файлы записи по порядку
+
+        :param str path: Файл записи, как он был задан в Recorder, или один конкретный файл
+        """
+        path = Path(path)
+        if path.exists():  # Если задан конкретный файл
+            return [path]
+        return sorted(path.parent.glob(f'{path.stem}.[0-9][0-9][0-9][0-9]{path.suffix}'))  # Файлы с номерами
+
+    def write(self, line, timestamp=None):
+        """Добавление строки в буфер. Вызывается из потока чтения соединения и никогда не ждет
+
+        :param bytes line: Функция обратного вызова в кодировке Windows 1251 без перевода строки
+        :param int timestamp: Монотонное время получения в наносекундах. None - текущее
+        """
+        if len(self.pending) >= self.max_pending:  # Если диск не успевает за потоком
+            self.dropped += 1  # то запись отбрасываем
+            return
+        self.pending.append((monotonic_ns() if timestamp is None else timestamp, line))
+
+    def flush_handler(self):
+        """Поток записи на диск. Записывает полные блоки сразу, неполный - раз в flush_interval"""
+        while not self.exit_event.wait(self.flush_interval):  # Пока поток нужен, просыпаемся раз в flush_interval
+            self.flush()
+        self.flush()  # Записываем оставшиеся записи
+
+    def flush(self):
+        """Сжатие и запись на диск всех записей из буфера"""
+        pending = self.pending  # Буфер записей
+        block = []  # Части исходных данных блока
+        size = 0  # Размер исходных данных блока
+        for _ in range(len(pending)):  # Забираем столько записей, сколько есть сейчас. Новые будут в следующий раз
+            timestamp, line = pending.popleft()
+            block.append(self.record_header.pack(timestamp, len(line)))
+            block.append(line)
+            size += self.record_header.size + len(line)
+            if size >= self.block_size:  # Если блок заполнен
+                self.write_block(block, size)  # то записываем его
+                block, size = [], 0
+        if block:  # Если остался неполный блок
+            self.write_block(block, size)  # то тоже записываем его
+        if self.file:  # Если файл открыт
+            self.file.flush()  # то отдаем данные операционной системе
+
+    def write_block(self, block, size):
+        """Запись блока в файл. Если файл превысит размер, начинается следующий
+
+        :param list[bytes] block: Части исходных данных блока
+        :param int size: Размер исходных данных блока
+        """
+        if self.file is None or self.file_size >= self.max_file_size:  # Если файл не открыт или заполнен
+            self.open_file()  # то открываем следующий
+        data = zlib.compress(b''.join(block), self.level)  # Сжимаем блок. Во время сжатия GIL отпущен
+        self.file.write(self.block_header.pack(len(data), size))
+        self.file.write(data)
+        self.file_size += self.block_header.size + len(data)
+        self.records += len(block) // 2  # На каждую запись две части: заголовок и строка
+        self.raw_bytes += size
+        self.compressed_bytes += len(data)
+        self.blocks += 1
+
+    def open_file(self):
+        """Закрытие текущего файла и открытие следующего"""
+        if self.file:  # Если файл открыт
+            self.file.close()  # то закрываем его
+        path = self.path.with_name(f'{self.path.stem}.{self.index:04d}{self.path.suffix}')  # Следующий файл
+        self.index += 1
+        self.file = open(path, 'xb')  # Только новый файл
+        self.file.write(self.header.pack(self.magic, monotonic_ns(), time_ns()))
+        self.file_size = self.header.size
+        self.logger.info(f'Запись функций обратного вызова в {path}')
+
+    def stats(self) -> dict:
+        """Статистика записи: кол-во записей, размеры исходных и сжатых данных, текущий файл, отброшенные и ожидающие записи"""
+        return dict(records=self.records, raw_bytes=self.raw_bytes, compressed_bytes=self.compressed_bytes, blocks=self.blocks,
+                    file=self.file.name if self.file else None, dropped=self.dropped, pending=len(self.pending))
+
+    def close(self):
+        """Запись оставшихся записей и закрытие файла"""
+        self.exit_event.set()
+        self.thread.join()
+        if self.file:  # Если файл открыт
+            self.file.close()  # то закрываем его
+            self.file = None
@@ -0,0 +1,152 @@
+from json import loads  # Разбор функций обратного вызова пачками
+from mmap import mmap, ACCESS_READ  # Чтение файлов записи без копирования в память процесса
+from time import monotonic_ns, sleep, perf_counter  # Темп воспроизведения, замер времени
+import logging  # Будем вести лог
+import zlib  # Распаковка блоков
+
+from .QuikPy import QuikPy  # Функции обратного вызова: команда QUIK# -> обработчик
+from .LineDecoder import LineDecoder  # Разбор сообщений QUIK#
+from .Recorder import Recorder  # Формат файлов записи
+
+
+class Replay:
+    """Воспроизведение записанного Recorder потока функций обратного вызова в обработчики on_*
+
+    Обработчики берутся у провайдера (например, у живого QuikPy с заданными on_new_candle, on_quote, on_all_trade) или
+    задаются у самого Replay так же, как у QuikPy. Разбираются из JSON только события команд, у которых задан обработчик.
+    События разбираются пачками по блоку файла одним вызовом json.loads
+
+    Пример:
+    replay = Replay('callbacks.qpr')
+    replay.on_new_candle = bars.new_bar_callback
+    print(replay.run())  # Как можно быстрее. replay.run(speed=1) - в исходном темпе
+    """
+    logger = logging.getLogger('QuikPy.Replay')  # Будем вести лог
+
+    def __init__(self, path, provider=None):
+        """Инициализация
+
+        :param str path: Файл записи, как он был задан в Recorder (воспроизводятся все файлы по порядку), или один файл
+        :param provider: Провайдер, обработчики on_* которого вызываются. None - обработчики самого Replay
+        """
+        self.files = Recorder.files(path)  # Файлы записи по порядку
+        if not self.files:  # Если файлов нет
+            raise FileNotFoundError(f'Файлы записи {path} не найдены')
+        self.provider = provider  # Провайдер с обработчиками
+        if provider is None:  # Если обработчики задаются у Replay
+            for handler_name in QuikPy.callbacks.values():  # Пробегаемся по всем функциям обратного вызова
+                setattr(self, handler_name, self.default_handler)  # Ставим обработчик по умолчанию
+        self.stopped = False  # Воспроизведение остановлено из обработчика
+
+    def records(self, cmds=None):
+        """Все записи файлов по порядку без разбора JSON
+
+        :param cmds: Команды QUIK#, записи которых нужны. None - все
+        :return: Генератор пачек записей по блокам: список (монотонное время получения в наносекундах, строка JSON в кодировке Windows 1251)
+        """
+        header, block_header, record_header = Recorder.header, Recorder.block_header, Recorder.record_header  # Форматы заголовков
+        cmd_field = QuikPy.cmd_field  # Поиск команды без разбора JSON
+        wanted = None if cmds is None else {cmd.encode(LineDecoder.encoding) for cmd in cmds}  # Нужные команды в кодировке записи
+        for path in self.files:  # Пробегаемся по всем файлам
+            with open(path, 'rb') as file:
+                if not file.seek(0, 2):  # Если файл пустой
+                    continue  # то переходим к следующему
+                with mmap(file.fileno(), 0, access=ACCESS_READ) as data:  # Отображаем файл в память
+                    if data.size() < header.size or header.unpack_from(data)[0] != Recorder.magic:  # Если это не файл записи
+                        raise ValueError(f'{path} не является файлом записи QuikPy')
+                    position = header.size  # Начало первого блока
+                    while position + block_header.size <= data.size():  # Пока есть полный заголовок блока
+                        compressed_size, raw_size = block_header.unpack_from(data, position)
+                        position += block_header.size
+                        if position + compressed_size > data.size():  # Если блок записан не полностью (запись была прервана)
+                            self.logger.warning(f'{path}: неполный блок в конце файла пропущен')
+                            break
+                        raw = zlib.decompress(data[position:position + compressed_size], bufsize=raw_size)  # Распаковываем блок
+                        position += compressed_size
+                        block = []  # Записи блока
+                        offset = 0  # Позиция записи в блоке
+                        while offset < raw_size:  # Пробегаемся по всем записям блока
+                            timestamp, length = record_header.unpack_from(raw, offset)
+                            offset += record_header.size
+                            if wanted is None or (match := cmd_field.search(raw, offset, offset + length)) and match.group(1) in wanted:  # Если запись нужна. Команду ищем без копирования строки
+                                block.append((timestamp, raw[offset:offset + length]))
+                            offset += length
+                        yield block
+
+    def handlers(self) -> dict:
+        """Таблица обработчиков: команда QUIK# -> обработчик. Только заданные пользователем"""
+        target = self.provider if self.provider is not None else self  # У кого берем обработчики
+        default_handler = getattr(target, 'default_handler', None)  # Обработчик по умолчанию
+        table = {}  # Таблица обработчиков
+        for cmd, handler_name in QuikPy.callbacks.items():  # Пробегаемся по всем функциям обратного вызова
+            handler = getattr(target, handler_name, None)  # Обработчик
+            if handler is not None and handler != default_handler:  # Если обработчик задан
+                table[cmd] = handler  # то добавляем его в таблицу
+        return table
+
+    @staticmethod
+    def decode_batch(block) -> list[tuple[int, dict]]:
+        """Разбор пачки функций обратного вызова одним вызовом json.loads. Если в пачке есть испорченная строка, то по одной
+
+        :param list[tuple[int, bytes]] block: Записи: монотонное время получения в наносекундах, функция обратного вызова в кодировке Windows 1251
+        :return: Разобранные записи: время получения, событие в виде JSON. Испорченные строки пропускаются вместе со своим временем
+        """
+        try:  # Пробуем разобрать пачку как один массив JSON
+            return list(zip((timestamp for timestamp, _ in block), loads((b'[' + b','.join(line for _, line in block) + b']').decode(LineDecoder.encoding))))
+        except ValueError:  # Если в пачке есть испорченная строка
+            events = []  # Разобранные записи
+            for timestamp, line in block:  # Пробегаемся по всем записям
+                try:  # Пробуем разобрать строку
+                    events.append((timestamp, LineDecoder.decode(line)))
+                except ValueError as e:  # Если строка испорчена
+                    Replay.logger.error(f'Функция обратного вызова не разобрана: {e} {line[:200]}')  # то пропускаем ее
+            return events
+
+    def events(self, cmds=None):
+        """Все события файлов по порядку, разобранные из JSON
+
+        :param cmds: Команды QUIK#, события которых разбираются. None - все
+        :return: Генератор (монотонное время получения в наносекундах, событие в виде JSON)
+        """
+        for block in self.records(cmds):  # Пробегаемся по всем блокам с нужными записями
+            if not block:  # Если в блоке нет нужных событий
+                continue  # то переходим к следующему
+            yield from self.decode_batch(block)
+
+    def run(self, speed=None) -> dict:
+        """Воспроизведение событий в обработчики
+
+        :param float speed: Темп воспроизведения: 1 - исходный, 2 - в 2 раза быстрее и т.д. None - как можно быстрее
+        :return: Кол-во событий, время воспроизведения в секундах, скорость в событиях/с, кол-во ошибок обработчиков
+        """
+        self.stopped = False
+        handlers = self.handlers()  # Таблица обработчиков
+        events = errors = 0  # Кол-во событий и ошибок обработчиков
+        first = start = None  # Время получения первого события и начала воспроизведения
+        started = perf_counter()  # Начало замера
+        for timestamp, data in self.events(handlers.keys()):  # Пробегаемся по всем событиям с обработчиками
+            if speed:  # Если воспроизводим в темпе записи
+                if first is None:  # Если это первое событие
+                    first, start = timestamp, monotonic_ns()  # то от него отсчитываем время
+                delay = (timestamp - first) / speed - (monotonic_ns() - start)  # Сколько наносекунд ждать события
+                if delay > 0:  # Если время события еще не пришло
+                    sleep(delay / 1e9)  # то ждем
+            try:  # Ошибка обработчика не должна останавливать воспроизведение
+                handlers[data['cmd']](data)  # Вызываем обработчик
+            except Exception:  # Если в обработчике возникла ошибка
+                errors += 1
+                self.logger.exception(f'Ошибка в обработчике {data["cmd"]}')  # то выводим ее в лог
+            events += 1
+            if self.stopped:  # Если воспроизведение остановили из обработчика
+                break
+        seconds = perf_counter() - started  # Время воспроизведения
+        return dict(events=events, seconds=seconds, events_per_second=events / seconds if seconds else 0.0, errors=errors)
+
+    def stop(self):
+        """Остановка воспроизведения. Вызывается из обработчика"""
+        self.stopped = True
+
+    @staticmethod
+    def default_handler(data):
+        """Пустой обработчик события по умолчанию. Его можно заменить на пользовательский"""
+        pass
@@ -0,0 +1,74 @@
+from concurrent.futures import Future  # Ответ на запрос пакета
+from threading import local  # Пакеты запросов у каждого потока свои
+
+
+class RequestBatch:
+    """Пакет запросов в виде контекста
+
+    Внутри with запросы текущего потока не отправляются, а возвращают Future. При выходе из with все запросы
+    отправляются в QUIK одной записью в соединение, ответы передаются в Future в порядке запросов.
+    Задержка сети тратится один раз на весь пакет, а не на каждый запрос. В пакет можно ставить методы,
+    которые возвращают ответ QUIK без обработки (get_param_ex, get_security_info, get_trade_account и т.п.)
+    """
+    batches = local()  # Стек открытых пакетов каждого потока
+
+    def __init__(self, provider):
+        """Инициализация
+
+        :param provider: Провайдер QuikPy, через который будут отправлены запросы
+        """
+        self.provider = provider  # Провайдер QuikPy
+        self.requests = []  # Запросы пакета
+        self.futures = []  # Ответы на запросы пакета
+
+    @classmethod
+    def active(cls, provider):
+        """Открытый пакет текущего потока для провайдера
+
+        :param provider: Провайдер QuikPy
+        :return: Пакет или None, если пакет не открыт
+        """
+        stack = getattr(cls.batches, 'stack', None)  # Стек открытых пакетов текущего потока
+        if stack and stack[-1].provider is provider:  # Если последний открытый пакет для этого провайдера
+            return stack[-1]  # то запросы ставим в него
+        return None
+
+    def add(self, request) -> Future:
+        """Постановка запроса в пакет
+
+        :param dict request: Запрос в виде словаря
+        :return: Future, результатом которого будет ответ JSON из QUIK после выхода из пакета
+        """
+        future = Future()  # Ответ на запрос
+        self.requests.append(request)
+        self.futures.append(future)
+        return future
+
+    def send(self):
+        """Отправка всех запросов пакета и передача ответов"""
+        requests, futures = self.requests, self.futures  # Запросы и ответы пакета
+        self.requests, self.futures = [], []  # Пакет можно наполнять заново
+        try:  # Пробуем выполнить запросы
+            results = self.provider.process_requests(requests)  # Отправляем все запросы одной записью, получаем ответы по порядку
+        except Exception as e:  # Если запросы выполнить не удалось
+            for future in futures:  # Пробегаемся по всем ответам
+                future.set_exception(e)  # Передаем ошибку ожидающим
+            raise
+        for future, result in zip(futures, results):  # Пробегаемся по всем ответам
+            future.set_result(result)  # Передаем ответ ожидающему
+
+    def __enter__(self):
+        """Открытие пакета. Запросы текущего потока ставятся в пакет"""
+        if not hasattr(self.batches, 'stack'):  # Если в потоке пакеты еще не открывались
+            self.batches.stack = []  # то создаем стек пакетов потока
+        self.batches.stack.append(self)  # Открываем пакет
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        """Закрытие пакета. Если в with не было ошибки, то отправляем запросы"""
+        self.batches.stack.remove(self)  # Закрываем пакет
+        if exc_type is None:  # Если ошибки не было
+            self.send()  # то отправляем запросы
+        else:  # Если была ошибка
+            for future in self.futures:  # Пробегаемся по всем ответам
+                future.cancel()  # Запросы не отправлены
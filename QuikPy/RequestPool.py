@@ -0,0 +1,236 @@
+from socket import socket, AF_INET, SOCK_STREAM  # Соединения для запросов
+from threading import Condition  # Ожидание свободного соединения
+from time import monotonic, perf_counter  # Время простоя и занятости соединений. Замер ожидания и выполнения запросов
+
+from .LineDecoder import LineDecoder  # Разбор потока байт на сообщения QUIK#
+
+
+class RequestConnection:
+    """Соединение пула для запросов со своей статистикой"""
+
+    def __init__(self, connection_id, sock, buffer_size, collect_stats=True, metrics=None):
+        """Инициализация
+
+        :param int connection_id: Номер соединения в пуле
+        :param socket sock: Открытое соединение для запросов
+        :param int buffer_size: Размер буфера приема в байтах
+        :param bool collect_stats: Вести статистику соединения
+        :param Metrics metrics: Метрики по командам
+        """
+        self.connection_id = connection_id  # Номер соединения в пуле
+        self.socket = sock  # Открытое соединение для запросов
+        self.buffer_size = buffer_size  # Размер буфера приема в байтах
+        self.collect_stats = collect_stats  # Вести статистику соединения
+        self.decoder = LineDecoder(metrics)  # Разбор ответов на запросы
+        self.created = monotonic()  # Время открытия соединения
+        self.last_used = self.created  # Время последнего использования соединения
+        self.requests = 0  # Кол-во выполненных запросов
+        self.errors = 0  # Кол-во ошибок соединения
+        self.bytes_sent = 0  # Кол-во отправленных байт
+        self.bytes_received = 0  # Кол-во принятых байт
+        self.busy_time = 0.0  # Суммарное время выполнения запросов в секундах
+        self.confirmed = sock.gettimeout() is None  # QUIK# уже отвечал по соединению. Пока не ответил, прием ограничен по времени
+
+    def process_requests(self, raw_data, count=1) -> list[dict]:
+        """Отправка запросов одной записью и получение ответов
+
+        :param bytes raw_data: Запросы в кодировке Windows 1251, каждый с переводом строки
+        :param int count: Кол-во запросов
+        :return: Ответы JSON в порядке запросов
+        """
+        start = monotonic()  # Время начала запроса
+        self.socket.sendall(raw_data)  # Отправляем запросы в QUIK
+        received = 0  # Кол-во принятых байт ответов
+        results = []  # Ответы
+        while len(results) < count:  # Пока ответы не получены полностью
+            fragment = self.socket.recv(self.buffer_size)  # Читаем фрагмент из буфера
+            if not fragment:  # Если соединение закрыто
+                raise ConnectionError('Соединение для запросов закрыто')
+            received += len(fragment)  # Считаем принятые байты
+            results += self.decoder.messages(fragment)  # Ответ разбираем только когда он пришел полностью
+        self.last_used = monotonic()  # Время последнего использования соединения
+        if not self.confirmed:  # Если это первый ответ по соединению
+            self.socket.settimeout(None)  # то QUIK# обслуживает соединение. Дальше долгие запросы не ограничиваем по времени
+            self.confirmed = True
+        if self.collect_stats:  # Если ведем статистику
+            self.requests += count
+            self.bytes_sent += len(raw_data)
+            self.bytes_received += received
+            self.busy_time += self.last_used - start
+        return results
+
+    def stats(self) -> dict:
+        """Статистика соединения"""
+        now = monotonic()  # Текущее время
+        return dict(connection_id=self.connection_id, requests=self.requests, errors=self.errors,
+                    bytes_sent=self.bytes_sent, bytes_received=self.bytes_received, busy_time=self.busy_time,
+                    age=now - self.created, idle_time=now - self.last_used)
+
+    def close(self):
+        """Закрытие соединения"""
+        self.socket.close()
+
+
+class RequestPool:
+    """Пул соединений для запросов к одному порту QUIK#
+
+    Каждый поток берет свободное соединение, выполняет на нем запрос и возвращает соединение в пул.
+    Независимые запросы из разных потоков выполняются одновременно, а не по очереди.
+    Скрипт QuikSharp.lua обслуживает только одно соединение для запросов, поэтому пул размером больше 1
+    имеет смысл с сервером QUIK#, принимающим несколько соединений для запросов.
+    Дополнительное соединение ждет открытия и первого ответа не дольше timeout секунд. Если QUIK# не ответил,
+    то запрос завершается ошибкой ConnectionError, а пул дальше работает только по основному соединению
+    """
+
+    def __init__(self, host, port, size, idle_timeout=60.0, buffer_size=1048576, collect_stats=True, first_socket=None, metrics=None, timeout=5.0):
+        """Инициализация
+
+        :param str host: IP адрес или название хоста
+        :param int port: Порт для отправки запросов и получения ответов
+        :param int size: Максимальное кол-во соединений в пуле
+        :param float idle_timeout: Через сколько секунд простоя закрывать дополнительное соединение. None - не закрывать
+        :param int buffer_size: Размер буфера приема в байтах
+        :param bool collect_stats: Вести статистику соединений
+        :param socket first_socket: Уже открытое соединение. Станет первым соединением пула и не будет закрываться по простою
+        :param Metrics metrics: Метрики по командам: ожидание свободного соединения, время выполнения запроса, разбор ответа
+        :param float timeout: Сколько секунд ждать открытия дополнительного соединения и первого ответа по нему. None - ждать без ограничения
+        """
+        if size < 1:  # Если в пуле не может быть соединений
+            raise ValueError(f'Размер пула соединений должен быть больше 0. Задан {size}')
+        self.host = host  # IP адрес или название хоста
+        self.port = port  # Порт для отправки запросов и получения ответов
+        self.size = size  # Максимальное кол-во соединений в пуле
+        self.idle_timeout = idle_timeout  # Через сколько секунд простоя закрывать дополнительное соединение
+        self.buffer_size = buffer_size  # Размер буфера приема в байтах
+        self.collect_stats = collect_stats  # Вести статистику соединений
+        self.metrics = metrics  # Метрики по командам
+        self.timeout = timeout  # Время ожидания открытия дополнительного соединения и первого ответа по нему
+        self.condition = Condition()  # Ожидание свободного соединения
+        self.connections = []  # Все соединения пула
+        self.idle = []  # Свободные соединения. Последним возвращенным пользуемся в первую очередь
+        self.opening = 0  # Кол-во соединений, которые открываются прямо сейчас
+        self.next_connection_id = 0  # Номер следующего соединения
+        self.opened = 0  # Кол-во открытых соединений за все время
+        self.closed_idle = 0  # Кол-во соединений, закрытых по простою
+        self.waits = 0  # Сколько раз поток ждал свободного соединения
+        if first_socket is not None:  # Если есть уже открытое соединение
+            self.idle.append(self.add_connection(first_socket))  # то оно будет первым свободным соединением пула
+
+    def add_connection(self, sock) -> RequestConnection:
+        """Добавление открытого соединения в пул. Вызывается под блокировкой или до начала работы пула
+
+        :param socket sock: Открытое соединение для запросов
+        """
+        connection = RequestConnection(self.next_connection_id, sock, self.buffer_size, self.collect_stats, self.metrics)  # Соединение пула
+        self.next_connection_id += 1  # Номер следующего соединения
+        self.opened += 1  # Кол-во открытых соединений за все время
+        self.connections.append(connection)  # Добавляем соединение в пул
+        return connection
+
+    def acquire(self) -> RequestConnection:
+        """Получение свободного соединения. Если свободных нет и пул не заполнен, то открывается новое"""
+        with self.condition:  # Список соединений меняется из разных потоков
+            self.close_idle()  # Закрываем простаивающие дополнительные соединения
+            while not self.idle and len(self.connections) + self.opening >= self.size:  # Пока нет свободных соединений, и новое открыть нельзя
+                self.waits += 1  # Поток ждет свободного соединения
+                self.condition.wait()  # Ждем, когда соединение вернут в пул
+            if self.idle:  # Если есть свободное соединение
+                return self.idle.pop()  # то отдаем его
+            self.opening += 1  # Открываем новое соединение без блокировки пула
+        try:  # Пробуем открыть соединение
+            sock = socket(AF_INET, SOCK_STREAM)  # Создаем соединение для запросов
+            sock.settimeout(self.timeout)  # Не ждем бесконечно сервер, который не обслуживает дополнительные соединения
+            sock.connect((self.host, self.port))  # Открываем соединение для запросов
+        except OSError:  # Если открыть соединение не удалось
+            with self.condition:
+                self.opening -= 1  # Место в пуле освободилось
+                self.condition.notify()  # Его может занять другой поток
+            raise
+        with self.condition:
+            self.opening -= 1  # Соединение открыто
+            return self.add_connection(sock)  # Добавляем его в пул и отдаем
+
+    def release(self, connection, broken=False):
+        """Возврат соединения в пул
+
+        :param RequestConnection connection: Соединение
+        :param bool broken: Соединение неисправно. Закрываем его и убираем из пула
+        """
+        with self.condition:
+            if connection not in self.connections:  # Если соединение убрали из пула, пока оно было занято (переподключение)
+                connection.close()  # то просто закрываем его
+            elif broken:  # Если соединение неисправно
+                connection.errors += 1  # Считаем ошибку
+                connection.close()  # Закрываем соединение
+                self.connections.remove(connection)  # Убираем его из пула
+            else:  # Если соединение исправно
+                self.idle.append(connection)  # Возвращаем его в свободные
+            self.condition.notify()  # Сообщаем ожидающему потоку
+
+    def close_idle(self):
+        """Закрытие дополнительных соединений, простаивающих дольше idle_timeout. Вызывается под блокировкой"""
+        if self.idle_timeout is None:  # Если простаивающие соединения не закрываем
+            return  # то выходим, дальше не продолжаем
+        now = monotonic()  # Текущее время
+        for connection in [connection for connection in self.idle if connection is not self.connections[0] and now - connection.last_used > self.idle_timeout]:  # Пробегаемся по всем простаивающим дополнительным соединениям
+            connection.close()  # Закрываем соединение
+            self.idle.remove(connection)  # Убираем его из свободных
+            self.connections.remove(connection)  # и из пула
+            self.closed_idle += 1  # Считаем закрытые по простою
+
+    def process_requests(self, raw_data, count=1) -> list[dict]:
+        """Отправка запросов одной записью и получение ответов через свободное соединение пула
+
+        :param bytes raw_data: Запросы в кодировке Windows 1251, каждый с переводом строки
+        :param int count: Кол-во запросов
+        :return: Ответы JSON в порядке запросов
+        """
+        start = perf_counter()  # Время начала ожидания соединения
+        connection = self.acquire()  # Берем свободное соединение
+        acquired = perf_counter()  # Время получения соединения
+        try:  # Пробуем выполнить запросы
+            results = connection.process_requests(raw_data, count)
+        except TimeoutError:  # Если QUIK# не ответил по дополнительному соединению. По подтвержденным соединениям время не ограничено
+            self.release(connection, broken=True)  # то закрываем и убираем его из пула
+            with self.condition:
+                self.size = 1  # Дальше запросы выполняются только по основному соединению
+            raise ConnectionError(f'QUIK# не ответил по дополнительному соединению для запросов за {self.timeout} с. '
+                                  f'Скрипт QuikSharp.lua обслуживает только одно соединение для запросов. Пул уменьшен до 1 соединения. '
+                                  f'Задайте pool_size=1 или используйте сервер QUIK#, принимающий несколько соединений') from None
+        except OSError:  # Если соединение неисправно
+            self.release(connection, broken=True)  # то закрываем и убираем его из пула
+            raise
+        self.release(connection)  # Возвращаем соединение в пул
+        if self.metrics is not None and self.metrics.enabled:  # Если ведем метрики
+            rtt = perf_counter() - acquired  # Время выполнения запросов
+            for result in results:  # Пробегаемся по всем ответам. Команда в ответе та же, что и в запросе
+                self.metrics.observe(result.get('cmd'), 'lock_wait', acquired - start)
+                self.metrics.observe(result.get('cmd'), 'rtt', rtt)
+        return results
+
+    def stats(self) -> dict:
+        """Статистика пула и каждого соединения"""
+        with self.condition:
+            return dict(size=self.size, open=len(self.connections), idle=len(self.idle), opened=self.opened,
+                        closed_idle=self.closed_idle, waits=self.waits,
+                        connections=[connection.stats() for connection in self.connections])
+
+    def reset(self, first_socket):
+        """Замена всех соединений пула после переподключения. Занятые соединения закрываются при возврате в пул
+
+        :param socket first_socket: Новое открытое соединение. Станет первым соединением пула
+        """
+        with self.condition:
+            for connection in self.idle:  # Пробегаемся по всем свободным соединениям
+                connection.close()  # Закрываем соединение
+            self.connections.clear()
+            self.idle = [self.add_connection(first_socket)]  # Новое соединение будет первым свободным соединением пула
+            self.condition.notify_all()  # Будим ожидающие потоки
+
+    def close(self):
+        """Закрытие всех соединений пула"""
+        with self.condition:
+            for connection in self.connections:  # Пробегаемся по всем соединениям
+                connection.close()  # Закрываем соединение
+            self.connections.clear()
+            self.idle.clear()
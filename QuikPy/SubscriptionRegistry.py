@@ -0,0 +1,136 @@
+from threading import Event, Lock  # Подписываются и отписываются из разных потоков
+
+
+class PendingSubscription:
+    """Подписка, которую оформляет первый подписавшийся. Остальные подписавшиеся ждут ее результата"""
+
+    def __init__(self, event):
+        """Инициализация
+
+        :param event: Событие окончания подписки с методами set и wait. threading.Event или asyncio.Event
+        """
+        self.event = event  # Событие окончания подписки
+        self.subscribed = None  # Подписка есть в QUIK. None - неизвестно (например, соединение разорвано)
+        self.result = None  # Ответ QUIK на запрос подписки
+
+
+class SubscriptionRegistry:
+    """Реестр подписок на свечи и стаканы со счетчиками ссылок
+
+    Подписка ищется по ключу (вид подписки, код режима торгов, тикер, интервал, параметр) за O(1).
+    Несколько компонентов могут подписаться на одно и то же: в QUIK уходит только первая подписка и последняя отмена подписки.
+    Пока первый подписавшийся оформляет подписку в QUIK, остальные ждут ее результата (pending).
+    После повторного подключения возобновляется каждая подписка ровно один раз
+    """
+
+    def __init__(self, event_factory=Event):
+        """Инициализация
+
+        :param event_factory: Создание события окончания подписки. threading.Event для потоков, asyncio.Event для asyncio
+        """
+        self.event_factory = event_factory  # Создание события окончания подписки
+        self.subscriptions = {}  # Подписки: ключ -> подписка в виде словаря
+        self.refs = {}  # Счетчики ссылок: ключ -> кол-во подписавшихся
+        self.pending = {}  # Подписки, которые оформляются в QUIK: ключ -> PendingSubscription
+        self.lock = Lock()  # Блокировка изменения реестра
+
+    @staticmethod
+    def key(subscription) -> tuple:
+        """Ключ подписки
+
+        :param dict subscription: Подписка
+        :return: Вид подписки, код режима торгов, тикер, интервал, параметр. Для стакана интервал и параметр - None
+        """
+        return subscription['subscription'], subscription['class_code'], subscription['sec_code'], subscription.get('interval'), subscription.get('param')
+
+    def acquire(self, subscription) -> bool:
+        """Добавление ссылки на подписку
+
+        :param dict subscription: Подписка
+        :return: True, если это первая ссылка, и нужно подписаться в QUIK
+        """
+        key = self.key(subscription)  # Ключ подписки
+        with self.lock:
+            refs = self.refs.get(key, 0)  # Кол-во подписавшихся
+            self.refs[key] = refs + 1
+            if refs:  # Если подписка уже есть
+                return False  # то в QUIK подписываться не нужно
+            self.subscriptions[key] = subscription
+            self.pending[key] = PendingSubscription(self.event_factory())  # Остальные подписавшиеся будут ждать результата подписки
+            return True
+
+    def waiting(self, subscription):
+        """Подписка, которую еще оформляет первый подписавшийся
+
+        :param dict subscription: Подписка
+        :return: PendingSubscription или None, если подписка уже оформлена
+        """
+        with self.lock:
+            return self.pending.get(self.key(subscription))
+
+    def complete(self, subscription, subscribed, result):
+        """Окончание подписки первым подписавшимся. Ждущие подписавшиеся получают ее результат
+
+        Если подписки в QUIK нет, то она удаляется из реестра вместе со ссылками первого и ждущих подписавшихся. Других ссылок
+        на нее нет: пока подписка оформлялась, все подписавшиеся ее ждали. Следующий подписавшийся снова обратится к QUIK
+
+        :param dict subscription: Подписка
+        :param bool subscribed: Подписка есть в QUIK. None - неизвестно
+        :param dict result: Ответ QUIK на запрос подписки
+        """
+        key = self.key(subscription)  # Ключ подписки
+        with self.lock:
+            pending = self.pending.pop(key, None)  # Оформляемая подписка
+            if subscribed is False:  # Если подписки в QUIK нет
+                self.refs.pop(key, None)  # то ссылки на нее никому не нужны
+                self.subscriptions.pop(key, None)
+        if pending is not None:  # Если подписку ждут
+            pending.subscribed, pending.result = subscribed, result  # то передаем ее результат
+            pending.event.set()  # и будим ждущих
+
+    def release(self, subscription) -> bool:
+        """Удаление ссылки на подписку
+
+        :param dict subscription: Подписка
+        :return: True, если это была последняя ссылка или подписки нет в реестре, и нужно отменить подписку в QUIK
+        """
+        key = self.key(subscription)  # Ключ подписки
+        with self.lock:
+            refs = self.refs.get(key, 0) - 1  # Кол-во оставшихся подписавшихся
+            if refs > 0:  # Если подписка еще нужна
+                self.refs[key] = refs
+                return False  # то в QUIK ее не отменяем
+            self.refs.pop(key, None)
+            self.subscriptions.pop(key, None)
+            return True
+
+    def refcount(self, subscription) -> int:
+        """Кол-во подписавшихся
+
+        :param dict subscription: Подписка
+        """
+        return self.refs.get(self.key(subscription), 0)
+
+    def __contains__(self, subscription):
+        return self.key(subscription) in self.subscriptions
+
+    def __iter__(self):
+        """Подписки без повторов. Реестр может меняться из других потоков, поэтому перебирается его копия"""
+        with self.lock:
+            return iter(list(self.subscriptions.values()))
+
+    def __len__(self):
+        return len(self.subscriptions)
+
+    def items(self) -> list[dict]:
+        """Все подписки с кол-вом подписавшихся для мониторинга"""
+        with self.lock:
+            return [dict(subscription, refs=self.refs[key]) for key, subscription in self.subscriptions.items()]
+
+    def stats(self) -> dict:
+        """Кол-во подписок по видам и общее кол-во ссылок"""
+        with self.lock:
+            kinds = {}  # Кол-во подписок по видам
+            for kind, *_ in self.subscriptions:  # Пробегаемся по всем ключам подписок
+                kinds[kind] = kinds.get(kind, 0) + 1
+            return dict(subscriptions=len(self.subscriptions), refs=sum(self.refs.values()), **kinds)
@@ -0,0 +1,195 @@
+from datetime import datetime, timedelta  # Торговая сессия по московскому времени
+from json import dump, load  # Файл справочника в формате JSON
+from threading import Lock  # Справочник пополняется из разных потоков
+from time import time  # Время получения спецификации
+import logging  # Будем вести лог
+import os  # Замена файла справочника целиком
+
+from pytz import timezone  # Московское время
+
+
+class SymbolCache:
+    """Справочник спецификаций тикеров: (код режима торгов, тикер) -> спецификация getSecurityInfo.
+    Также хранит список режимов торгов и найденные режимы торгов тикеров: тикер -> код режима торгов
+
+    Работает как словарь. Для поиска со счетчиками попаданий и промахов и с учетом срока годности - get.
+    Если задан файл, то справочник загружается из него при создании и сохраняется после пакетного пополнения из QUIK и при закрытии провайдера.
+    Спецификации из файла действительны только в той же торговой сессии (шаг цены, лот, номинал могут измениться на клиринге)
+    и не дольше ttl секунд.
+    Стоимость шага цены фьючерсов меняется в течение дня (например, с курсом валюты), поэтому хранится только в памяти
+    и не дольше step_price_ttl секунд
+    """
+    logger = logging.getLogger('QuikPy.SymbolCache')  # Будем вести лог
+    tz_msk = timezone('Europe/Moscow')  # Торговые сессии по московскому времени
+    session_start_hour = 19  # Час начала торговой сессии следующего дня (вечерняя сессия МосБиржи)
+    step_price_ttl = 60  # Срок годности стоимости шага цены в секундах
+
+    def __init__(self, path=None, ttl=24 * 60 * 60):
+        """Инициализация
+
+        :param str path: Файл справочника. None - справочник только в памяти
+        :param float ttl: Срок годности спецификации в секундах. None - без ограничения
+        """
+        self.path = path  # Файл справочника
+        self.ttl = ttl  # Срок годности спецификации
+        self.symbols = {}  # Спецификации: (код режима торгов, тикер) -> спецификация
+        self.times = {}  # Время получения спецификаций: (код режима торгов, тикер) -> время UTC в секундах
+        self.classes = None  # Все режимы торгов через запятую, как их возвращает getClassesList. None - еще не получены
+        self.class_codes = {}  # Режимы торгов тикеров: тикер -> код режима торгов
+        self.step_prices = {}  # Стоимость шага цены: (код режима торгов, тикер) -> (стоимость шага цены, время получения UTC в секундах)
+        self.lock = Lock()  # Блокировка сохранения в файл
+        self.changed = False  # Справочник пополнялся после загрузки или сохранения
+        self.hits = 0  # Кол-во найденных в справочнике спецификаций
+        self.misses = 0  # Кол-во спецификаций, которых не было в справочнике или истек их срок годности
+        self.session, self.session_end = self.trading_session()  # Торговая сессия, к которой относятся спецификации, и время ее окончания UTC в секундах
+        if path:  # Если задан файл
+            self.load()  # то загружаем справочник
+
+    @classmethod
+    def trading_session(cls, dt=None) -> tuple[str, float]:
+        """Торговая сессия: дата торгового дня. Вечерняя сессия относится к следующему дню
+
+        :param datetime dt: Дата и время с временнОй зоной. None - сейчас
+        :return: Дата торгового дня, время окончания сессии UTC в секундах
+        """
+        dt = (dt or datetime.now(cls.tz_msk)).astimezone(cls.tz_msk)  # Московское время
+        if dt.hour >= cls.session_start_hour:  # Если началась вечерняя сессия
+            dt += timedelta(days=1)  # то это уже следующий торговый день
+        end = cls.tz_msk.localize(datetime(dt.year, dt.month, dt.day, cls.session_start_hour))  # Начало вечерней сессии торгового дня
+        return dt.strftime('%Y-%m-%d'), end.timestamp()
+
+    def get(self, key):
+        """Спецификация из справочника
+
+        :param tuple[str, str] key: Код режима торгов, тикер
+        :return: Спецификация или None, если ее нет в справочнике или истек ее срок годности
+        """
+        now = time()  # Текущее время
+        if now >= self.session_end:  # Если наступила новая торговая сессия
+            self.check_session()  # то все спецификации устарели
+        symbol_info = self.symbols.get(key)  # Спецификация
+        if symbol_info is None or self.ttl is not None and now - self.times.get(key, 0) > self.ttl:  # Если спецификации нет или истек ее срок годности
+            self.misses += 1
+            return None
+        self.hits += 1
+        return symbol_info
+
+    def get_class_code(self, sec_code):
+        """Код режима торгов тикера из справочника
+
+        :param str sec_code: Тикер
+        :return: Код режима торгов или None, если его нет в справочнике
+        """
+        self.check_session_end()  # Если наступила новая торговая сессия, то все режимы торгов устарели
+        return self.class_codes.get(sec_code)
+
+    def get_step_price(self, key):
+        """Стоимость шага цены из справочника
+
+        :param tuple[str, str] key: Код режима торгов, тикер
+        :return: Стоимость шага цены или None, если ее нет в справочнике или истек ее срок годности
+        """
+        step_price, received = self.step_prices.get(key, (None, 0))  # Стоимость шага цены и время ее получения
+        if step_price is None or time() - received > self.step_price_ttl:  # Если стоимости шага цены нет или истек ее срок годности
+            return None
+        return step_price
+
+    def set_step_price(self, key, step_price):
+        """Добавление стоимости шага цены в справочник. В файл не сохраняется
+
+        :param tuple[str, str] key: Код режима торгов, тикер
+        :param float step_price: Стоимость шага цены
+        """
+        self.step_prices[key] = (step_price, time())
+
+    def __contains__(self, key):
+        return key in self.symbols
+
+    def __getitem__(self, key):
+        return self.symbols[key]
+
+    def __setitem__(self, key, symbol_info):
+        """Добавление спецификации в справочник. В файл сохраняется в save"""
+        self.symbols[key] = symbol_info
+        self.times[key] = time()
+        self.changed = True
+
+    def set_classes(self, classes):
+        """Добавление списка режимов торгов в справочник. В файл сохраняется в save
+
+        :param str classes: Все режимы торгов через запятую, как их возвращает getClassesList
+        """
+        self.classes = classes
+        self.changed = True
+
+    def set_class_code(self, sec_code, class_code):
+        """Добавление режима торгов тикера в справочник. В файл сохраняется в save
+
+        :param str sec_code: Тикер
+        :param str class_code: Код режима торгов
+        """
+        self.class_codes[sec_code] = class_code
+        self.changed = True
+
+    def __len__(self):
+        return len(self.symbols)
+
+    def check_session_end(self):
+        """Проверка окончания торговой сессии по часам. Торговая сессия пересчитывается только после ее окончания"""
+        if time() >= self.session_end:  # Если наступила новая торговая сессия
+            self.check_session()  # то все спецификации устарели
+
+    def check_session(self):
+        """Если наступила новая торговая сессия, то все спецификации устарели"""
+        session, self.session_end = self.trading_session()  # Текущая торговая сессия
+        if session != self.session:  # Если сессия сменилась
+            self.invalidate()  # то очищаем справочник
+            self.session = session
+
+    def invalidate(self):
+        """Очистка справочника. Файл будет перезаписан при следующем сохранении"""
+        self.symbols.clear()
+        self.times.clear()
+        self.classes = None
+        self.class_codes.clear()
+        self.step_prices.clear()
+        self.changed = True
+
+    def load(self):
+        """Загрузка справочника из файла. Спецификации другой торговой сессии не загружаются"""
+        try:  # Пробуем прочитать файл
+            with open(self.path, encoding='utf-8') as file:
+                data = load(file)
+        except FileNotFoundError:  # Если файла еще нет
+            return  # то справочник пустой
+        except (OSError, ValueError) as e:  # Если файл не читается или испорчен
+            self.logger.warning(f'Справочник тикеров {self.path} не загружен: {e}')
+            return
+        if data.get('session') != self.session:  # Если спецификации от другой торговой сессии
+            self.logger.info(f'Справочник тикеров {self.path} от сессии {data.get("session")} устарел')
+            return  # то их не загружаем
+        for item in data.get('symbols', ()):  # Пробегаемся по всем спецификациям
+            key = (item['class_code'], item['sec_code'])  # Ключ спецификации
+            self.symbols[key] = item['info']
+            self.times[key] = item['time']
+        self.classes = data.get('classes')  # Режимы торгов
+        self.class_codes.update(data.get('class_codes', {}))  # Режимы торгов тикеров
+
+    def save(self):
+        """Сохранение справочника в файл, если он пополнялся. Файл заменяется целиком, чтобы при сбое не остался недописанный"""
+        if not self.path or not self.changed:  # Если файл не задан или справочник не изменился
+            return  # то сохранять нечего
+        with self.lock:  # Сохраняет только один поток
+            self.changed = False  # Пополнения после этой точки попадут в следующее сохранение
+            data = dict(session=self.session, symbols=[dict(class_code=class_code, sec_code=sec_code, time=self.times.get((class_code, sec_code), 0), info=info)
+                                                       for (class_code, sec_code), info in list(self.symbols.items())],
+                        classes=self.classes, class_codes=dict(self.class_codes))  # Справочник
+            temp_path = f'{self.path}.tmp'  # Временный файл
+            with open(temp_path, 'w', encoding='utf-8') as file:
+                dump(data, file, ensure_ascii=False)
+            os.replace(temp_path, self.path)  # Заменяем файл целиком
+
+    def stats(self) -> dict:
+        """Кол-во спецификаций, попаданий и промахов"""
+        lookups = self.hits + self.misses  # Кол-во поисков
+        return dict(symbols=len(self.symbols), class_codes=len(self.class_codes), hits=self.hits, misses=self.misses, hit_ratio=self.hits / lookups if lookups else 0.0, session=self.session)
@@ -1 +1,2 @@
 from .QuikPy import QuikPy
+from .AsyncQuikPy import AsyncQuikPy
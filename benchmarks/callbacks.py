@@ -0,0 +1,69 @@
+from json import dumps  # Функции обратного вызова QUIK# в формате JSON
+from threading import Event  # Окончание потока событий
+from time import perf_counter  # Замер времени
+
+from QuikPy import QuikPy  # Работа с QUIK из Python через LUA скрипты QUIK#
+from QuikPy.QuikServer import QuikServer  # Заменитель QUIK# для замера
+
+
+all_trade = {'trade_num': 9876543210, 'flags': 1025, 'price': 101350.0, 'qty': 3, 'value': 304050.0, 'accruedint': 0, 'yield': 0,
+             'settlecode': '', 'reporate': 0, 'repovalue': 0, 'repo2value': 0, 'repoterm': 0, 'sec_code': 'RIH5', 'class_code': 'SPBFUT',
+             'datetime': {'year': 2025, 'month': 3, 'day': 14, 'hour': 10, 'min': 5, 'sec': 12, 'ms': 345, 'mcs': 345678, 'week_day': 5},
+             'period': 1, 'open_interest': 512340, 'exchange_code': '', 'exec_market': ''}  # Обезличенная сделка OnAllTrade
+
+
+def make_firehose(count) -> bytes:
+    """Поток обезличенных сделок в том виде, как его отправляет QuikSharp.lua
+
+    :param int count: Кол-во сделок
+    :return: Функции обратного вызова в кодировке Windows 1251, каждая с переводом строки
+    """
+    lines = []  # Функции обратного вызова
+    for i in range(count):  # Пробегаемся по всем сделкам
+        all_trade['trade_num'] += 1  # Номер сделки
+        lines.append(dumps({'cmd': 'OnAllTrade', 'data': all_trade, 't': 1741935912345 + i}, separators=(',', ':')))
+    return ('\n'.join(lines) + '\n').encode('cp1251')
+
+
+def load_firehose(path) -> bytes:
+    """Записанный поток функций обратного вызова
+
+    :param str path: Файл со строками JSON функций обратного вызова в кодировке Windows 1251
+    """
+    with open(path, 'rb') as file:
+        firehose = file.read()
+    return firehose if firehose.endswith(b'\n') else firehose + b'\n'
+
+
+def run(count=200000, path=None) -> list[dict]:
+    """Замер скорости обработки потока обезличенных сделок
+
+    :param int count: Кол-во сделок в синтетическом потоке
+    :param str path: Файл с записанным потоком. None - синтетический поток
+    :return: Результаты замеров. Время в секундах, скорость в событиях/с
+    """
+    firehose = load_firehose(path) if path else make_firehose(count)  # Поток функций обратного вызова
+    events = firehose.count(b'\n')  # Кол-во событий
+    results = []  # Результаты замеров
+    for name, subscribed in (('on_all_trade', True), ('no_handler', False)):  # Обработчик задан / не задан (события не разбираются)
+        stop_event = Event()  # Обработка последнего события
+        with QuikServer(requests_port=0, callbacks_port=0) as quik_server:  # Запускаем сервер QUIK# на свободных портах
+            qp_provider = QuikPy(requests_port=quik_server.requests_port, callbacks_port=quik_server.callbacks_port)  # Подключаемся к серверу
+            if subscribed:  # Если обработчик задан
+                qp_provider.on_all_trade = lambda data: None  # то события разбираются и передаются ему
+            qp_provider.on_stop = lambda data: stop_event.set()  # Последнее событие
+            quik_server.wait_clients()  # Ждем подключения для функций обратного вызова
+            start = perf_counter()  # Время начала замера
+            quik_server.broadcast(firehose + b'{"cmd":"OnStop","data":1,"t":0}\n', events + 1)  # Сервер отправляет поток. Последним событием - OnStop
+            stop_event.wait()  # Ждем обработки последнего события
+            elapsed = perf_counter() - start  # Время обработки потока
+            qp_provider.close_connection_and_thread()  # Закрываем соединения и поток обработки функций обратного вызова
+        results.append(dict(name=name, events=events, mb=len(firehose) / 1048576, seconds=elapsed, events_per_second=events / elapsed))
+    return results
+
+
+if __name__ == '__main__':  # Точка входа при запуске этого скрипта. Запуск из корня проекта: python -m benchmarks.callbacks [файл записанного потока]
+    import sys  # Файл записанного потока из командной строки
+
+    for result in run(path=sys.argv[1] if len(sys.argv) > 1 else None):  # Пробегаемся по всем результатам замеров
+        print(f'{result["name"]:>12} {result["events"]:>8} соб. {result["mb"]:>7.1f} МБ {result["seconds"]:>8.3f} с {result["events_per_second"]:>10.0f} соб./с')
@@ -0,0 +1,82 @@
+from json import dumps, loads  # Ответ QUIK# в формате JSON
+from json.decoder import JSONDecodeError  # Ошибка декодирования JSON
+from time import perf_counter  # Замер времени
+
+from QuikPy.LineDecoder import LineDecoder  # Разбор потока байт на сообщения QUIK#
+
+
+fragment_size = 65536  # Размер фрагмента, который обычно возвращает recv для большого ответа
+candle = {'open': 101350.0, 'close': 101400.0, 'high': 101420.0, 'low': 101330.0, 'volume': 1250,
+          'datetime': {'year': 2025, 'month': 3, 'day': 14, 'hour': 10, 'min': 5, 'sec': 0, 'ms': 0, 'week_day': 5},
+          'sec': 'RIH5', 'class': 'SPBFUT', 'interval': 1}  # Бар ответа get_candles_from_data_source
+
+
+def make_reply(size_mb) -> bytes:
+    """Ответ get_candles_from_data_source заданного размера
+
+    :param float size_mb: Размер ответа в МБайтах
+    :return: Ответ в кодировке Windows 1251 с переводом строки в конце
+    """
+    candle_bytes = len(dumps(candle)) + 2  # Размер одного бара в ответе с разделителем
+    candles = [candle] * max(1, int(size_mb * 1048576 / candle_bytes))  # Кол-во бар для нужного размера
+    return (dumps({'cmd': 'get_candles_from_data_source', 'data': candles, 'id': 1, 't': ''}) + '\n').encode('cp1251')
+
+
+def fragments(raw_data):
+    """Ответ, разбитый на фрагменты, как их возвращает recv
+
+    :param bytes raw_data: Ответ
+    """
+    return [raw_data[i:i + fragment_size] for i in range(0, len(raw_data), fragment_size)]
+
+
+def decode_legacy(chunks):
+    """Прежний разбор в process_request: после каждого фрагмента пробуем разобрать весь накопленный ответ
+
+    :param list[bytes] chunks: Фрагменты ответа
+    """
+    parts = []  # Фрагменты в виде строк
+    for chunk in chunks:  # Пробегаемся по всем фрагментам
+        parts.append(chunk.decode('cp1251'))  # Переводим фрагмент из кодировки Windows 1251
+        try:  # Пробуем разобрать весь накопленный ответ
+            return loads(''.join(parts))
+        except JSONDecodeError:  # Если это еще не конец ответа
+            pass  # то ждем следующий фрагмент
+
+
+def decode_line_decoder(chunks):
+    """Разбор через LineDecoder: граница по переводу строки, разбор JSON один раз
+
+    :param list[bytes] chunks: Фрагменты ответа
+    """
+    decoder = LineDecoder()  # Разбор потока байт на сообщения
+    for chunk in chunks:  # Пробегаемся по всем фрагментам
+        messages = decoder.messages(chunk)  # Законченные сообщения
+        if messages:  # Если ответ получен полностью
+            return messages[0]
+
+
+def run(sizes_mb=(1, 10, 100), legacy_max_mb=10) -> list[dict]:
+    """Замер времени разбора ответов разного размера
+
+    :param tuple sizes_mb: Размеры ответов в МБайтах
+    :param float legacy_max_mb: Максимальный размер ответа для прежнего разбора. Время прежнего разбора растет квадратично
+    :return: Результаты замеров. Время в секундах, скорость в МБайт/с
+    """
+    results = []  # Результаты замеров
+    for size_mb in sizes_mb:  # Пробегаемся по всем размерам ответов
+        chunks = fragments(make_reply(size_mb))  # Ответ, разбитый на фрагменты
+        for name, decode in (('line_decoder', decode_line_decoder), ('legacy', decode_legacy)):  # Пробегаемся по всем способам разбора
+            if name == 'legacy' and size_mb > legacy_max_mb:  # Если прежний разбор займет слишком много времени
+                continue  # то его не замеряем
+            start = perf_counter()  # Время начала разбора
+            reply = decode(chunks)  # Разбираем ответ
+            elapsed = perf_counter() - start  # Время разбора
+            assert reply['cmd'] == 'get_candles_from_data_source'  # Ответ разобран полностью
+            results.append(dict(name=name, size_mb=size_mb, fragments=len(chunks), seconds=elapsed, mb_per_second=size_mb / elapsed))
+    return results
+
+
+if __name__ == '__main__':  # Точка входа при запуске этого скрипта. Запуск из корня проекта: python -m benchmarks.line_decoder
+    for result in run():  # Пробегаемся по всем результатам замеров
+        print(f'{result["name"]:>12} {result["size_mb"]:>6} МБ {result["fragments"]:>6} фрагм. {result["seconds"]:>9.3f} с {result["mb_per_second"]:>9.1f} МБ/с')
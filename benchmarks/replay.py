@@ -0,0 +1,55 @@
+from itertools import islice  # Нужное кол-во событий из генератора
+from pathlib import Path  # Файлы записи
+from tempfile import TemporaryDirectory  # Запись сессии во временную папку
+
+from QuikPy.QuikServer import QuikServer  # Синтетические события
+from QuikPy.Recorder import Recorder  # Запись потока функций обратного вызова
+from QuikPy.Replay import Replay  # Воспроизведение записи
+
+
+def make_session(path, trades=300000, candles=1000):
+    """Запись синтетической торговой сессии: обезличенные сделки и новые бары вперемешку, события каждую миллисекунду
+
+    :param str path: Файл записи
+    :param int trades: Кол-во обезличенных сделок
+    :param int candles: Кол-во новых бар
+    """
+    quik_server = QuikServer()  # Источник синтетических событий. Соединения не открываются
+    recorder = Recorder(path)  # Запись
+    every = max(trades // candles, 1)  # Через сколько сделок новый бар
+    all_trades, new_candles = quik_server.events('OnAllTrade'), quik_server.events('NewCandle')  # Генераторы событий
+    timestamp = 0  # Время получения события в наносекундах
+    for i, trade in enumerate(islice(all_trades, trades)):  # Пробегаемся по всем сделкам
+        recorder.write(quik_server.encode({'cmd': 'OnAllTrade', 'data': trade, 't': 0})[:-1], timestamp)
+        timestamp += 1000000
+        if i % every == 0:  # Если пора выдать новый бар
+            recorder.write(quik_server.encode({'cmd': 'NewCandle', 'data': next(new_candles), 't': 0})[:-1], timestamp)
+    recorder.close()
+    return recorder.stats()
+
+
+def run(trades=300000, candles=1000) -> list[dict]:
+    """Замер скорости воспроизведения записанной сессии как можно быстрее
+
+    :param int trades: Кол-во обезличенных сделок
+    :param int candles: Кол-во новых бар
+    :return: Результаты замеров. Время в секундах, скорость в событиях/с
+    """
+    results = []  # Результаты замеров
+    with TemporaryDirectory() as folder:
+        path = Path(folder) / 'session.qpr'  # Файл записи
+        stats = make_session(path, trades, candles)  # Записываем сессию
+        mb = stats['compressed_bytes'] / 1048576  # Размер записи на диске в МБайтах
+        bars = []  # Новые бары стратегии
+        for name, handlers in (('all_events', ('on_all_trade', 'on_new_candle')), ('new_candle_only', ('on_new_candle',))):  # Какие обработчики заданы
+            replay = Replay(path)  # Воспроизведение
+            for handler_name in handlers:  # Пробегаемся по всем обработчикам
+                setattr(replay, handler_name, bars.append if handler_name == 'on_new_candle' else lambda data: None)  # Стратегия копит бары, сделки не обрабатывает
+            result = replay.run()  # Воспроизводим как можно быстрее
+            results.append(dict(name=name, mb=mb, **result))
+    return results
+
+
+if __name__ == '__main__':  # Точка входа при запуске этого скрипта. Запуск из корня проекта: python -m benchmarks.replay
+    for result in run():  # Пробегаемся по всем результатам замеров
+        print(f'{result["name"]:>16} {result["events"]:>8} соб. {result["mb"]:>7.1f} МБ {result["seconds"]:>8.3f} с {result["events_per_second"]:>10.0f} соб./с')
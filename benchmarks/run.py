@@ -0,0 +1,275 @@
+from argparse import ArgumentParser  # Параметры командной строки
+from contextlib import redirect_stdout  # main_1.Bars печатает бары
+from datetime import datetime  # Время замера
+from io import StringIO  # Вывод main_1.Bars не нужен
+from json import dumps, load  # Результаты в формате JSON
+from pathlib import Path  # Папка репозитория
+from threading import Thread, Barrier  # Многопоточные запросы
+from time import perf_counter  # Замер времени
+import platform  # Версия Python и система
+import subprocess  # Коммит, на котором выполнялся замер
+import sys  # Код возврата при регрессии
+import tracemalloc  # Пиковая память перевода бар
+
+import numpy as np  # Синтетические бары
+import pandas as pd  # Синтетические бары
+import ta  # CCI для сравнения
+
+from QuikPy import QuikPy  # Работа с QUIK из Python через LUA скрипты QUIK#
+from QuikPy.QuikServer import QuikServer  # Заменитель QUIK# для замеров
+from QuikPy.CandleDecoder import CandleDecoder  # Перевод свечей QUIK в столбцы
+from QuikPy.Examples import Bars as example_bars  # Получение бар из примера
+from indicators import indicators  # Индикаторы стратегии
+from benchmarks import callbacks  # Замер скорости обработки функций обратного вызова
+
+
+def result(name, value, unit, higher_is_better=True, **params) -> dict:
+    """Результат замера
+
+    :param str name: Название замера
+    :param float value: Значение
+    :param str unit: Единица измерения
+    :param bool higher_is_better: Большее значение лучше (скорость). False - меньшее лучше (время)
+    :param params: Параметры замера. Вместе с названием составляют ключ для сравнения между коммитами
+    """
+    return dict(name=name, params=params, value=value, unit=unit, higher_is_better=higher_is_better)
+
+
+def key(item) -> str:
+    """Ключ результата для сравнения между коммитами: название[параметр=значение,...]
+
+    :param dict item: Результат замера
+    """
+    return f'{item["name"]}[{",".join(f"{name}={value}" for name, value in sorted(item["params"].items()))}]'
+
+
+def bench_requests(seconds=2.0, threads=(1, 4)) -> list[dict]:
+    """Кол-во запросов ping в секунду в обычном, конвейерном режимах и через пул соединений. Сервер работает в том же процессе
+
+    :param float seconds: Длительность замера каждого режима
+    :param tuple[int] threads: Кол-во потоков, одновременно отправляющих запросы
+    """
+    results = []  # Результаты замеров
+    for mode, kwargs in (('lock', {}), ('pipelined', dict(pipelined=True)), ('pool', dict(pool_size=max(threads)))):  # Пробегаемся по всем режимам
+        with QuikServer(requests_port=0, callbacks_port=0) as quik_server:  # Сервер на свободных портах
+            qp_provider = QuikPy(requests_port=quik_server.requests_port, callbacks_port=quik_server.callbacks_port, **kwargs)
+            for _ in range(100):  # Прогрев
+                qp_provider.ping()
+            for count in threads:  # Пробегаемся по всем вариантам кол-ва потоков
+                done = [0] * count  # Кол-во запросов каждого потока
+                barrier = Barrier(count + 1)  # Одновременный старт потоков
+
+                def worker(index):
+                    """Поток, отправляющий запросы до окончания замера"""
+                    barrier.wait()
+                    n = 0  # Кол-во запросов потока
+                    while perf_counter() < deadline:  # Пока замер не окончен
+                        qp_provider.ping()
+                        n += 1
+                    done[index] = n
+
+                workers = [Thread(target=worker, args=(i,)) for i in range(count)]  # Потоки запросов
+                for thread in workers:
+                    thread.start()
+                deadline = perf_counter() + seconds  # Окончание замера
+                start = perf_counter()
+                barrier.wait()  # Запускаем потоки
+                for thread in workers:
+                    thread.join()
+                elapsed = perf_counter() - start  # Фактическая длительность замера
+                results.append(result('requests.ping', sum(done) / elapsed, 'req/s', mode=mode, threads=count))
+            qp_provider.close_connection_and_thread()
+    return results
+
+
+def bench_startup(repeats=20) -> list[dict]:
+    """Время от вызова конструктора QuikPy до получения ответа на первый запрос и до получения счетов. Медиана по repeats запускам
+
+    :param int repeats: Кол-во запусков
+    """
+    constructor, first_request, accounts = [], [], []  # Время каждого запуска
+    with QuikServer(requests_port=0, callbacks_port=0) as quik_server:  # Сервер на свободных портах
+        for _ in range(repeats):  # Пробегаемся по всем запускам
+            start = perf_counter()
+            qp_provider = QuikPy(requests_port=quik_server.requests_port, callbacks_port=quik_server.callbacks_port)
+            constructor.append(perf_counter() - start)
+            qp_provider.ping()  # Первый запрос
+            first_request.append(perf_counter() - start)
+            qp_provider.accounts  # Счета
+            accounts.append(perf_counter() - start)
+            qp_provider.close_connection_and_thread()
+    return [result(f'startup.{name}', float(np.median(times)), 's', False) for name, times in
+            (('constructor', constructor), ('first_request', first_request), ('accounts', accounts))]
+
+
+def bench_callbacks(count=200000) -> list[dict]:
+    """Кол-во функций обратного вызова OnAllTrade в секунду, которые обрабатывает callback_handler
+
+    :param int count: Кол-во событий
+    """
+    return [result('callbacks.on_all_trade', item['events_per_second'], 'events/s', handler=item['name']) for item in callbacks.run(count)]
+
+
+def bench_candles(sizes=(1000, 100000)) -> list[dict]:
+    """Время получения бар: запрос get_candles_from_data_source и перевод в pandas DataFrame
+    в Examples/Bars.get_candles_from_provider и main_1.Bars.get_candles_from_provider. Время и пиковая память перевода CandleDecoder
+
+    :param tuple[int] sizes: Кол-во бар истории
+    """
+    try:  # Пробуем импортировать стратегию
+        import main_1  # Стратегия. Импортируем здесь, т.к. нужен корень проекта в пути
+    except SyntaxError:  # Если версия Python младше 3.12 (в f-строках main_1 есть переводы строк)
+        main_1 = None  # то стратегию не замеряем
+    results = []  # Результаты замеров
+    for size in sizes:  # Пробегаемся по всем размерам истории
+        with QuikServer(requests_port=0, callbacks_port=0, fixtures=dict(history_size=size)) as quik_server:  # Сервер с историей нужного размера
+            qp_provider = QuikPy(requests_port=quik_server.requests_port, callbacks_port=quik_server.callbacks_port)
+            quik_server.candles('TQBR', 'SBER', 5)  # Создаем историю до замера
+            fetches = [('request', lambda: qp_provider.get_candles_from_data_source('TQBR', 'SBER', 5)),  # Только запрос
+                       ('examples_bars', lambda: example_bars.get_candles_from_provider(qp_provider, 'TQBR', 'SBER', 'M5'))]  # Запрос и перевод в DataFrame
+            if main_1:  # Если стратегия импортирована
+                main_1.qp_provider = qp_provider  # main_1.Bars берет провайдер из модуля
+                fetches.append(('main_1_bars', lambda: main_1.Bars(qp_provider, 'TQBR', 'SBER', 'M5')))  # Запрос и перевод в DataFrame в стратегии
+            for name, fetch in fetches:  # Пробегаемся по всем способам получения бар
+                start = perf_counter()
+                with redirect_stdout(StringIO()):  # main_1.Bars печатает бары
+                    fetch()
+                results.append(result(f'candles.{name}', perf_counter() - start, 's', False, bars=size))
+            candles = qp_provider.get_candles_from_data_source('TQBR', 'SBER', 5)['data']  # Ответ для замера перевода
+            start = perf_counter()
+            CandleDecoder.to_dataframe(candles)
+            results.append(result('candles.decode', perf_counter() - start, 's', False, bars=size))
+            tracemalloc.start()  # Память замеряем отдельно, т.к. tracemalloc замедляет выполнение
+            CandleDecoder.to_dataframe(candles)
+            results.append(result('candles.decode_peak_memory', tracemalloc.get_traced_memory()[1] / 1048576, 'MB', False, bars=size))
+            tracemalloc.stop()
+            qp_provider.close_connection_and_thread()
+    return results
+
+
+def make_bars(size, seed=0) -> pd.DataFrame:
+    """Синтетические 5-и минутные бары: случайное блуждание с шагом цены 10
+
+    :param int size: Кол-во бар
+    :param int seed: Начальное значение генератора
+    """
+    rng = np.random.default_rng(seed)  # Генератор случайных чисел
+    close = 100000 + np.cumsum(rng.integers(-5, 6, size)) * 10.0  # Цены закрытия
+    open_ = close + rng.integers(-3, 4, size) * 10.0  # Цены открытия
+    spread = rng.integers(0, 5, size) * 10.0  # Выход high/low за open/close
+    return pd.DataFrame({'datetime': pd.date_range('2020-01-01', periods=size, freq='5min'),
+                         'open': open_, 'high': np.maximum(open_, close) + spread, 'low': np.minimum(open_, close) - spread,
+                         'close': close, 'volume': rng.integers(1, 1000, size)})
+
+
+def bench_indicators(sizes=(1000, 100000, 10000000)) -> list[dict]:
+    """Время расчета индикаторов стратегии indicators.run
+
+    :param tuple[int] sizes: Кол-во бар
+    """
+    results = []  # Результаты замеров
+    for size in sizes:  # Пробегаемся по всем размерам
+        df = make_bars(size)  # Бары
+        start = perf_counter()
+        indicators.run(df)
+        elapsed = perf_counter() - start
+        results.append(result('indicators.run', elapsed, 's', False, bars=size))
+        results.append(result('indicators.run_bars_per_second', size / elapsed, 'bars/s', bars=size))
+    return results
+
+
+def bench_cci(sizes=(100000, 10000000), ta_sizes=(100000, 10000000)) -> list[dict]:
+    """Время расчета CCI(20) indicators.cci и ta.trend.cci, а также расхождение между ними
+
+    :param tuple[int] sizes: Кол-во бар для indicators.cci
+    :param tuple[int] ta_sizes: Кол-во бар для ta.trend.cci (rolling apply долгий)
+    """
+    results = []  # Результаты замеров
+    for size in sizes:  # Пробегаемся по всем размерам
+        df = make_bars(size)  # Бары
+        start = perf_counter()
+        native = indicators.cci(df['high'].values, df['low'].values, df['close'].values, window=20)
+        elapsed = perf_counter() - start
+        results.append(result('cci.native', elapsed, 's', False, bars=size))
+        results.append(result('cci.native_bars_per_second', size / elapsed, 'bars/s', bars=size))
+        if size not in ta_sizes:  # Если с ta на этом размере не сравниваем
+            continue
+        start = perf_counter()
+        reference = ta.trend.cci(high=df['high'], low=df['low'], close=df['close'], window=20).values
+        results.append(result('cci.ta', perf_counter() - start, 's', False, bars=size))
+        results.append(result('cci.max_abs_diff', float(np.nanmax(np.abs(native - reference))), '', False, bars=size))
+    return results
+
+
+benchmarks = {'startup': bench_startup, 'requests': bench_requests, 'callbacks': bench_callbacks, 'candles': bench_candles, 'indicators': bench_indicators, 'cci': bench_cci}  # Все замеры
+quick = {'startup': dict(repeats=5), 'requests': dict(seconds=0.5), 'callbacks': dict(count=50000), 'candles': dict(sizes=(1000, 10000)), 'indicators': dict(sizes=(1000, 100000)), 'cci': dict(sizes=(100000,), ta_sizes=(100000,))}  # Параметры быстрого прогона
+
+
+def environment() -> dict:
+    """Где выполнялся замер: коммит, время, версии Python и библиотек, система"""
+    try:  # Пробуем получить коммит
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=Path(__file__).parent, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):  # Если git нет или это не репозиторий
+        commit = None
+    return dict(commit=commit, time=datetime.now().isoformat(timespec='seconds'), python=platform.python_version(),
+                numpy=np.__version__, pandas=pd.__version__, platform=platform.platform(), processor=platform.processor())
+
+
+def compare(results, baseline, threshold=0.1) -> list[dict]:
+    """Регрессии относительно базовых результатов
+
+    :param list[dict] results: Текущие результаты
+    :param list[dict] baseline: Базовые результаты, например, с предыдущего коммита
+    :param float threshold: Допустимое ухудшение. 0.1 - на 10%
+    :return: Ухудшившиеся замеры: ключ, базовое и текущее значение, во сколько раз хуже
+    """
+    base = {key(item): item for item in baseline}  # Базовые результаты по ключу
+    regressions = []  # Ухудшившиеся замеры
+    for item in results:  # Пробегаемся по всем текущим результатам
+        old = base.get(key(item))  # Базовый результат
+        if old is None or not old['value'] or not item['value']:  # Если сравнивать не с чем
+            continue
+        ratio = old['value'] / item['value'] if item['higher_is_better'] else item['value'] / old['value']  # Во сколько раз хуже
+        if ratio > 1 + threshold:  # Если хуже допустимого
+            regressions.append(dict(key=key(item), baseline=old['value'], value=item['value'], unit=item['unit'], slowdown=ratio))
+    return regressions
+
+
+def main():
+    """Запуск замеров из командной строки. Результаты в формате JSON выводятся на консоль и, если задано, в файл"""
+    parser = ArgumentParser(description='Замеры производительности QuikPy и индикаторов')
+    parser.add_argument('names', nargs='*', help=f'Замеры: {", ".join(benchmarks)}. По умолчанию все')
+    parser.add_argument('--quick', action='store_true', help='Быстрый прогон на малых объемах')
+    parser.add_argument('--bars', type=int, nargs='+', help='Кол-во бар для indicators.run')
+    parser.add_argument('--output', help='Файл для сохранения результатов')
+    parser.add_argument('--compare', help='Файл базовых результатов для поиска регрессий')
+    parser.add_argument('--threshold', type=float, default=0.1, help='Допустимое ухудшение относительно базовых результатов')
+    args = parser.parse_args()
+    unknown = [name for name in args.names if name not in benchmarks]  # Неизвестные замеры
+    if unknown:  # Если есть неизвестные замеры
+        parser.error(f'Неизвестные замеры: {", ".join(unknown)}')
+    results = []  # Результаты замеров
+    for name in args.names or benchmarks:  # Пробегаемся по всем нужным замерам
+        kwargs = dict(quick[name]) if args.quick else {}  # Параметры замера
+        if name == 'indicators' and args.bars:  # Если кол-во бар задано
+            kwargs['sizes'] = tuple(args.bars)
+        start = perf_counter()
+        results += benchmarks[name](**kwargs)
+        print(f'{name}: {perf_counter() - start:.1f} с', file=sys.stderr)
+    report = dict(environment=environment(), results=results)  # Отчет
+    text = dumps(report, ensure_ascii=False, indent=2)
+    print(text)
+    if args.output:  # Если задан файл
+        with open(args.output, 'w', encoding='utf-8') as file:
+            file.write(text)
+    if args.compare:  # Если нужно сравнение с базовыми результатами
+        with open(args.compare, encoding='utf-8') as file:
+            regressions = compare(results, load(file)['results'], args.threshold)
+        for regression in regressions:  # Пробегаемся по всем регрессиям
+            print(f'Регрессия {regression["key"]}: {regression["baseline"]:.6g} -> {regression["value"]:.6g} {regression["unit"]} (хуже в {regression["slowdown"]:.2f} раза)', file=sys.stderr)
+        if regressions:  # Если есть регрессии
+            sys.exit(1)  # то выходим с ошибкой
+
+
+if __name__ == '__main__':  # Точка входа при запуске этого скрипта. Запуск из корня проекта: python -m benchmarks.run [замеры] [--quick] [--output results.json] [--compare baseline.json]
+    main()
@@ -0,0 +1,122 @@
+import numpy as np
+
+
+class BarBuffer:
+    """
+    Хранилище последних бар фиксированной емкости на массивах NumPy.
+
+    Бары упорядочены по времени открытия (секунды с 01.01.1970 int64).
+    Формирующийся бар обновляется на месте, новый бар добавляется за O(1)
+    (амортизированно), самый старый бар при переполнении отбрасывается.
+    Массивы в два раза больше емкости: когда место в конце кончается,
+    последние бары один раз переносятся в начало. Поэтому окно последних бар
+    всегда непрерывно и выдается без копирования.
+    """
+    prices = ('open', 'high', 'low', 'close')
+    columns = ('datetime',) + prices + ('volume',)
+
+    def __init__(self, capacity):
+        """
+        :param capacity: Максимальное кол-во хранимых бар
+        """
+        self.capacity = capacity
+        self.data = {
+            column: np.zeros(2 * capacity, np.float64 if column in self.prices else np.int64)
+            for column in self.columns
+            }
+        self.start = 0  # Индекс самого старого бара
+        self.end = 0  # Индекс за последним баром
+
+    def __len__(self):
+        return self.end - self.start
+
+    def last_time(self):
+        """
+        Время открытия последнего бара или None, если бар нет.
+        """
+        return int(self.data['datetime'][self.end - 1]) if len(self) else None
+
+    def write(self, index, values):
+        """
+        Запись бара по индексу массивов.
+        """
+        for column, value in zip(self.columns, values):
+            self.data[column][index] = value
+
+    def compact(self):
+        """
+        Перенос бар в начало массивов, когда место в конце кончилось.
+        """
+        size = len(self)
+        for array in self.data.values():
+            array[:size] = array[self.start:self.end]
+        self.start, self.end = 0, size
+
+    def update(self, time, open, high, low, close, volume):
+        """
+        Добавление или обновление бара.
+
+        Бар с временем последнего бара обновляет его на месте.
+        Более поздний бар добавляется в конец.
+        Более ранний бар обновляет бар с тем же временем
+        или вставляется на свое место. Бар раньше всех хранимых
+        при заполненном хранилище отбрасывается.
+        """
+        values = (time, open, high, low, close, volume)
+        times = self.data['datetime']
+        if len(self) and time == times[self.end - 1]:  # Формирующийся бар
+            self.write(self.end - 1, values)
+            return
+        if len(self) and time < times[self.end - 1]:  # Бар из прошлого
+            position = self.start + int(np.searchsorted(times[self.start:self.end], time))
+            if times[position] == time:  # Такой бар уже есть
+                self.write(position, values)
+                return
+            if position == self.start and len(self) == self.capacity:  # Старше всех хранимых
+                return
+        else:  # Новый бар
+            position = self.end
+        if self.end == len(times):  # Место в конце кончилось
+            position -= self.start
+            self.compact()
+        for array in self.data.values():  # Сдвигаем более поздние бары (для нового бара сдвигать нечего)
+            array[position + 1:self.end + 1] = array[position:self.end]
+        self.write(position, values)
+        self.end += 1
+        if len(self) > self.capacity:  # Переполнение
+            self.start += 1  # Отбрасываем самый старый бар
+
+    def extend(self, bars):
+        """
+        Добавление бар в виде столбцов (например, из CandleDecoder.decode).
+
+        Если все бары новее последнего и упорядочены, то они добавляются
+        одной операцией, иначе по одному через update.
+        """
+        times = np.asarray(bars['datetime'])
+        if not len(times):
+            return
+        if (not len(self) or times[0] > self.data['datetime'][self.end - 1]) and np.all(np.diff(times) > 0):
+            times = times[-self.capacity:]  # Больше емкости не храним
+            count = len(times)
+            if self.end + count > len(self.data['datetime']):  # Не помещаются в конец
+                self.start = max(self.start, self.end + count - self.capacity)  # Эти бары будут вытеснены
+                self.compact()
+            for column in self.columns:
+                self.data[column][self.end:self.end + count] = np.asarray(bars[column])[-count:]
+            self.end += count
+            self.start = max(self.start, self.end - self.capacity)
+            return
+        for i in range(len(times)):
+            self.update(*(bars[column][i] for column in self.columns))
+
+    def window(self, count=None):
+        """
+        Последние бары в виде столбцов без копирования.
+        Окно действительно до следующего изменения хранилища.
+
+        :param count: Кол-во последних бар. None - все хранимые
+        :return: Словарь столбец -> массив NumPy (представление хранилища)
+        """
+        start = self.start if count is None else max(self.start, self.end - count)
+        return {column: array[start:self.end] for column, array in self.data.items()}
@@ -2,7 +2,8 @@ import sqlite3
 
 import pandas as pd
 import numpy as np
-import ta
+from numpy.lib.stride_tricks import sliding_window_view
+from scipy.signal import lfilter
 
 
 # TVI -------------------------------------------------------------------------
@@ -97,20 +98,43 @@ def add_gann_hilo_column_optimized(df, period=10):
 
 
 # T3 --------------------------------------------------------------------------
-def calculate_t3ma(df, period=8, b=0.618):
+def ema_filter(x, w1, w2):
     """
-    Рассчитывает индикатор T3MA и добавляет его как новую колонку в DataFrame.
+    Экспоненциальное сглаживание e[i] = w1 * x[i] + w2 * e[i - 1], e[0] = x[0]
+    по первой оси массива.
+    Считается линейным фильтром scipy.signal.lfilter с начальным состоянием
+    w2 * x[0]: на каждом шаге те же умножения и сложение, что и в цикле,
+    поэтому значения совпадают до последнего бита.
+    """
+    e = np.empty_like(x)
+    if not len(x):
+        return e
+    e[0] = x[0]
+    e[1:], _ = lfilter([w1], [1.0, -w2], x[1:], axis=0, zi=w2 * x[:1])
+    return e
 
-    :param df: DataFrame с колонкой 'close'
-    :param period: Период T3MA
-    :param b: Параметр T3MA (значение сглаживания)
-    :return: DataFrame с добавленной колонкой 'T3MA'
+
+def t3ma(close, period=8, b=0.618):
     """
-    # Проверка на наличие колонки 'close'
-    if 'close' not in df.columns:
-        raise ValueError("DataFrame должен содержать колонку 'close'")
+    Рассчитывает T3MA по массиву цен без циклов по барам.
+
+    :param close: Цены закрытия. Одномерный массив или двумерный
+        (бары по строкам, инструменты или наборы параметров по столбцам)
+    :param period: Период T3MA. Число или массив значений по столбцам
+    :param b: Параметр T3MA (значение сглаживания). Число или массив значений по столбцам
+    :return: Массив T3MA той же формы, что и close
+        (двумерный, если для одномерных цен заданы массивы параметров)
+    """
+    close = np.asarray(close, dtype=np.float64)
 
-    close = df['close'].values
+    # Свои параметры для каждого столбца
+    if np.ndim(period) or np.ndim(b):
+        if close.ndim == 1:
+            close = close[:, np.newaxis]
+        close, period, b = np.broadcast_arrays(close, period, b)
+        return np.column_stack([
+            t3ma(close[:, i], period[0, i], b[0, i]) for i in range(close.shape[1])
+            ]).reshape(close.shape)
 
     # Коэффициенты
     b2 = b ** 2
@@ -123,44 +147,89 @@ def calculate_t3ma(df, period=8, b=0.618):
     w1 = 2 / (n + 1)
     w2 = 1 - w1
 
-    # Создание временных массивов
-    e1 = np.zeros_like(close)
-    e2 = np.zeros_like(close)
-    e3 = np.zeros_like(close)
-    e4 = np.zeros_like(close)
-    e5 = np.zeros_like(close)
-    e6 = np.zeros_like(close)
+    # Шесть последовательных экспоненциальных сглаживаний
+    e1 = ema_filter(close, w1, w2)
+    e2 = ema_filter(e1, w1, w2)
+    e3 = ema_filter(e2, w1, w2)
+    e4 = ema_filter(e3, w1, w2)
+    e5 = ema_filter(e4, w1, w2)
+    e6 = ema_filter(e5, w1, w2)
+
+    # Итоговый расчет T3
+    return c1 * e6 + c2 * e5 + c3 * e4 + c4 * e3
+
+
+def calculate_t3ma(df, period=8, b=0.618):
+    """
+    Рассчитывает индикатор T3MA и добавляет его как новую колонку в DataFrame.
+
+    :param df: DataFrame с колонкой 'close'
+    :param period: Период T3MA
+    :param b: Параметр T3MA (значение сглаживания)
+    :return: DataFrame с добавленной колонкой 'T3MA'
+    """
+    # Проверка на наличие колонки 'close'
+    if 'close' not in df.columns:
+        raise ValueError("DataFrame должен содержать колонку 'close'")
+
+    # Добавление результата в DataFrame
+    df['T3MA'] = t3ma(df['close'].values, period, b)
+    return df
 
-    # Векторизованный расчет экспоненциальных сглаживаний
-    e1[0] = close[0]
-    for i in range(1, len(close)):
-        e1[i] = w1 * close[i] + w2 * e1[i - 1]
 
-    e2[0] = e1[0]
-    for i in range(1, len(e1)):
-        e2[i] = w1 * e1[i] + w2 * e2[i - 1]
+# CCI -------------------------------------------------------------------------
+def cci(high, low, close, window=20, constant=0.015, chunk_size=65536):
+    """
+    Рассчитывает CCI по массивам цен так же, как ta.trend.cci, но без rolling apply.
+
+    Среднее отклонение считается векторно по окнам sliding_window_view
+    (представления без копирования) частями по chunk_size окон,
+    чтобы временный массив не рос вместе с историей.
+    Скользящее среднее и среднее отклонение считаются теми же операциями, что и в ta,
+    поэтому значения совпадают с ta.
+
+    :param high: Максимальные цены
+    :param low: Минимальные цены
+    :param close: Цены закрытия
+    :param window: Период CCI
+    :param constant: Масштабный коэффициент
+    :param chunk_size: Кол-во окон, обрабатываемых за раз
+    :return: Массив CCI. Первые window - 1 значений - nan
+    """
+    typical_price = (np.asarray(high, dtype=np.float64) + np.asarray(low, dtype=np.float64)
+                     + np.asarray(close, dtype=np.float64)) / 3.0
+    sma = pd.Series(typical_price).rolling(window=window, min_periods=window).mean().values
 
-    e3[0] = e2[0]
-    for i in range(1, len(e2)):
-        e3[i] = w1 * e2[i] + w2 * e3[i - 1]
+    # Среднее отклонение от среднего по каждому окну
+    mad = np.full_like(typical_price, np.nan)
+    if len(typical_price) >= window:
+        windows = sliding_window_view(typical_price, window)
+        for start in range(0, len(windows), chunk_size):
+            chunk = windows[start:start + chunk_size]
+            deviation = np.abs(chunk - chunk.mean(axis=1, keepdims=True))
+            mad[window - 1 + start:window - 1 + start + len(chunk)] = deviation.mean(axis=1)
 
-    e4[0] = e3[0]
-    for i in range(1, len(e3)):
-        e4[i] = w1 * e3[i] + w2 * e4[i - 1]
+    # На нулевом отклонении, как и в ta, получаем inf или nan
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return (typical_price - sma) / (constant * mad)
 
-    e5[0] = e4[0]
-    for i in range(1, len(e4)):
-        e5[i] = w1 * e4[i] + w2 * e5[i - 1]
 
-    e6[0] = e5[0]
-    for i in range(1, len(e5)):
-        e6[i] = w1 * e5[i] + w2 * e6[i - 1]
+def add_cci_column(df, window=20, constant=0.015):
+    """
+    Добавляет колонку CCI_<window> в DataFrame.
 
-    # Итоговый расчет T3
-    t3 = c1 * e6 + c2 * e5 + c3 * e4 + c4 * e3
+    :param df: DataFrame с колонками ['high', 'low', 'close']
+    :param window: Период CCI
+    :param constant: Масштабный коэффициент
+    :return: DataFrame с добавленной колонкой 'CCI_<window>'
+    """
+    required_columns = ['high', 'low', 'close']
+    if not all(col in df.columns for col in required_columns):
+        raise ValueError(
+            f"DataFrame должен содержать колонки: {required_columns}"
+            )
 
-    # Добавление результата в DataFrame
-    df['T3MA'] = t3
+    df[f'CCI_{window}'] = cci(df['high'].values, df['low'].values, df['close'].values, window, constant)
     return df
 
 
@@ -172,9 +241,7 @@ def run(df):
     # Рассчитываем T3MA и добавляем в DataFrame
     df = calculate_t3ma(df, period=8, b=0.618)
     # Вычисление CCI с периодом 20
-    df['CCI_20'] = ta.trend.cci(
-        high=df['high'], low=df['low'], close=df['close'], window=20
-        )
+    df = add_cci_column(df, window=20)
     
     # Добавляем новую колонку с сигналом TVI
     df['TVI_S'] = df['TVI'].diff().apply(lambda x: 1 if x > 0 else (-1 if x < 0 else 0))
@@ -0,0 +1,283 @@
+import math
+
+import numpy as np
+
+
+# Потоковый расчет индикаторов ------------------------------------------------
+#
+# Каждый индикатор хранит состояние после последнего бара и состояние до него.
+# Новый бар (другое время открытия) фиксирует состояние и считается от него,
+# повторный бар с тем же временем (формирующийся бар) пересчитывается от
+# состояния до него. Поэтому обновление стоит O(1) и не зависит от истории.
+#
+# Состояния - кортежи, шаги - те же операции с плавающей точкой и в том же
+# порядке, что и у pandas/ta в indicators.py. Поэтому значения совпадают
+# с пакетным расчетом по всем барам с начала потока до последнего бита.
+
+NAN = float('nan')
+
+
+def divide(a, b):
+    """
+    Деление как у pandas: на ноль - inf или nan вместо исключения.
+    """
+    if b:
+        return a / b
+    if a != a or not a:
+        return NAN
+    return math.copysign(math.inf, a) * math.copysign(1.0, b)
+
+
+def sign(value):
+    """
+    Сигнал как в indicators.run: 1, -1 или 0 (в т.ч. для nan).
+    """
+    return 1 if value > 0 else (-1 if value < 0 else 0)
+
+
+class Ema:
+    """
+    Шаг series.ewm(span=period, adjust=False).mean().
+    Состояние: (взвешенное значение, вес, кол-во наблюдений).
+    """
+
+    def __init__(self, period):
+        com = (period - 1) / 2.0
+        self.new_wt = 1.0 / (1.0 + com)
+        self.old_wt_factor = 1.0 - self.new_wt
+
+    def step(self, state, value):
+        is_observation = value == value
+        if state is None:  # Первое значение
+            weighted, old_wt, nobs = value, 1.0, int(is_observation)
+        else:
+            weighted, old_wt, nobs = state
+            nobs += is_observation
+            if weighted == weighted:
+                old_wt *= self.old_wt_factor
+                if is_observation:
+                    if weighted != value:  # На постоянном ряде не накапливаем ошибку
+                        weighted = old_wt * weighted + self.new_wt * value
+                        weighted /= old_wt + self.new_wt
+                    old_wt = 1.0
+            elif is_observation:
+                weighted = value
+        return (weighted, old_wt, nobs), weighted if nobs >= 1 else NAN
+
+
+class RollingMean:
+    """
+    Шаг series.rolling(window=period, min_periods=min_periods).mean().
+    Сумма с компенсацией ошибки (Кэхэн) для добавления и удаления, как у pandas.
+    Состояние: (значения окна, кол-во, сумма, кол-во отрицательных,
+    компенсация добавления, компенсация удаления,
+    кол-во одинаковых значений подряд, последнее значение).
+    """
+
+    def __init__(self, period, min_periods=None):
+        self.period = period
+        self.min_periods = period if min_periods is None else min_periods
+
+    def step(self, state, value):
+        if state is None:  # Первое окно
+            state = ((), 0, 0.0, 0, 0.0, 0.0, 0, value)
+        values, nobs, sum_x, neg_ct, compensation_add, compensation_remove, same_count, prev_value = state
+        if len(values) == self.period:  # Окно сдвигается: удаляем самое старое значение
+            old = values[0]
+            values = values[1:]
+            if old == old:
+                nobs -= 1
+                y = -old - compensation_remove
+                t = sum_x + y
+                compensation_remove = t - sum_x - y
+                sum_x = t
+                if math.copysign(1.0, old) < 0:
+                    neg_ct -= 1
+        values += (value,)
+        if value == value:  # Добавляем новое значение
+            nobs += 1
+            y = value - compensation_add
+            t = sum_x + y
+            compensation_add = t - sum_x - y
+            sum_x = t
+            if math.copysign(1.0, value) < 0:
+                neg_ct += 1
+            same_count = same_count + 1 if value == prev_value else 1
+            prev_value = value
+        if nobs >= self.min_periods and nobs > 0:
+            result = sum_x / nobs
+            if same_count >= nobs:
+                result = prev_value
+            elif neg_ct == 0 and result < 0:
+                result = 0.0
+            elif neg_ct == nobs and result > 0:
+                result = 0.0
+        else:
+            result = NAN
+        return (values, nobs, sum_x, neg_ct, compensation_add, compensation_remove, same_count, prev_value), result
+
+
+class StreamingIndicator:
+    """
+    Основа потокового индикатора: фиксация состояния на новом баре
+    и пересчет формирующегося бара от состояния до него.
+    """
+
+    def __init__(self):
+        self.time = None  # Время открытия последнего бара
+        self.previous = None  # Состояние до последнего бара
+        self.state = None  # Состояние после последнего бара
+
+    def update(self, time, *values):
+        """
+        :param time: Время открытия бара
+        :param values: Значения бара, нужные индикатору
+        :return: Значение индикатора на бар
+        """
+        if time != self.time:  # Новый бар
+            self.previous = self.state  # Состояние после предыдущего бара больше не изменится
+            self.time = time
+        self.state, result = self.step(self.previous, *values)
+        return result
+
+
+class TVI(StreamingIndicator):
+    """
+    Потоковый add_tvi_column. Значение: (TVI, сигнал TVI_S).
+    """
+
+    def __init__(self, r=12, s=12, u=5, point=0.0001):
+        super().__init__()
+        self.ema_r = Ema(r)
+        self.ema_s = Ema(s)
+        self.ema_u = Ema(u)
+        self.point = point
+
+    def step(self, state, open, close, volume):
+        ema_up, ema_down, dema_up, dema_down, ema_tvi, last_tvi = state or (None,) * 5 + (NAN,)
+        up_ticks = (volume + (close - open) / self.point) / 2
+        down_ticks = volume - up_ticks
+        ema_up, ema_up_value = self.ema_r.step(ema_up, up_ticks)
+        ema_down, ema_down_value = self.ema_r.step(ema_down, down_ticks)
+        dema_up, dema_up_value = self.ema_s.step(dema_up, ema_up_value)
+        dema_down, dema_down_value = self.ema_s.step(dema_down, ema_down_value)
+        tvi_calculate = divide(100.0 * (dema_up_value - dema_down_value), dema_up_value + dema_down_value)
+        ema_tvi, tvi = self.ema_u.step(ema_tvi, tvi_calculate)
+        return (ema_up, ema_down, dema_up, dema_down, ema_tvi, tvi), (tvi, sign(tvi - last_tvi))
+
+
+class T3MA(StreamingIndicator):
+    """
+    Потоковый calculate_t3ma. Значение: (T3MA, сигнал T3_S).
+    """
+
+    def __init__(self, period=8, b=0.618):
+        super().__init__()
+        b2 = b ** 2
+        b3 = b2 * b
+        self.c1 = -b3
+        self.c2 = 3 * (b2 + b3)
+        self.c3 = -3 * (2 * b2 + b + b3)
+        self.c4 = 1 + 3 * b + b3 + 3 * b2
+        n = max(1, 1 + 0.5 * (period - 1))
+        self.w1 = 2 / (n + 1)
+        self.w2 = 1 - self.w1
+
+    def step(self, state, close):
+        if state is None:  # Первый бар: все сглаживания равны цене закрытия
+            e = (close,) * 6
+            last_t3 = NAN
+        else:
+            e_prev, last_t3 = state
+            e = []
+            value = close
+            for e_i in e_prev:  # Шесть последовательных экспоненциальных сглаживаний
+                value = self.w1 * value + self.w2 * e_i
+                e.append(value)
+            e = tuple(e)
+        e1, e2, e3, e4, e5, e6 = e
+        t3 = self.c1 * e6 + self.c2 * e5 + self.c3 * e4 + self.c4 * e3
+        return (e, t3), (t3, sign(t3 - last_t3))
+
+
+class GannHiLo(StreamingIndicator):
+    """
+    Потоковый add_gann_hilo_column_optimized. Значение: Gann_HiLo.
+    """
+
+    def __init__(self, period=10):
+        super().__init__()
+        self.sma = RollingMean(period, min_periods=1)
+
+    def step(self, state, high, low, close):
+        sma_high, sma_low, last_high, last_low = state or (None, None, NAN, NAN)
+        gann_hilo = int(close > last_high) - int(close < last_low)  # Сравниваем со средними на предыдущий бар
+        sma_high, sma_high_value = self.sma.step(sma_high, high)
+        sma_low, sma_low_value = self.sma.step(sma_low, low)
+        return (sma_high, sma_low, sma_high_value, sma_low_value), gann_hilo
+
+
+class CCI(StreamingIndicator):
+    """
+    Потоковый ta.trend.cci. Значение: (CCI, сигнал CCI_S).
+    Среднее отклонение считается по окну из window значений, как в ta.
+    """
+
+    def __init__(self, window=20, constant=0.015):
+        super().__init__()
+        self.sma = RollingMean(window)
+        self.window = window
+        self.constant = constant
+
+    def step(self, state, high, low, close):
+        sma, values = state or (None, ())
+        typical_price = (high + low + close) / 3.0
+        sma, sma_value = self.sma.step(sma, typical_price)
+        values = (values + (typical_price,))[-self.window:]
+        if len(values) < self.window:  # Окно еще не заполнено
+            return (sma, values), (NAN, 0)
+        x = np.array(values)
+        mad = float(np.mean(np.abs(x - np.mean(x))))
+        cci = divide(typical_price - sma_value, self.constant * mad)
+        return (sma, values), (cci, sign(cci))
+
+
+class Indicators:
+    """
+    Потоковый indicators.run: те же индикаторы и сигналы на каждый бар.
+    """
+    columns = ['datetime', 'open', 'high', 'low', 'close', 'tvi', 'cci', 't3', 'ghl']
+
+    def __init__(self):
+        self.time = None  # Время открытия последнего бара
+        self.tvi = TVI(r=12, s=12, u=5, point=0.1)
+        self.ghl = GannHiLo(period=10)
+        self.t3 = T3MA(period=8, b=0.618)
+        self.cci = CCI(window=20)
+
+    def update(self, time, open, high, low, close, volume):
+        """
+        Новый или обновленный формирующийся бар.
+        Бары из прошлого индикаторы уже учли, их не пересчитываем.
+
+        :return: Строка indicators.run на этот бар в виде словаря или None для бара из прошлого
+        """
+        if self.time is not None and time < self.time:
+            return None
+        self.time = time
+        _, tvi = self.tvi.update(time, open, close, volume)
+        ghl = self.ghl.update(time, high, low, close)
+        _, t3 = self.t3.update(time, close)
+        _, cci = self.cci.update(time, high, low, close)
+        return {'datetime': time, 'open': open, 'high': high, 'low': low, 'close': close,
+                'tvi': tvi, 'cci': cci, 't3': t3, 'ghl': ghl}
+
+    def run(self, df):
+        """
+        Пропуск всех бар через индикаторы.
+
+        :param df: DataFrame или столбцы (например, BarBuffer.window) ['datetime', 'open', 'high', 'low', 'close', 'volume']
+        :return: Строки indicators.run на каждый бар
+        """
+        columns = [df[column].tolist() for column in ('datetime', 'open', 'high', 'low', 'close', 'volume')]
+        return [self.update(*bar) for bar in zip(*columns)]
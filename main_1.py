@@ -3,8 +3,10 @@ from time import time
 
 import pandas as pd
 from QuikPy import QuikPy  # Работа с QUIK из Python через LUA скрипты QuikSharp
+from QuikPy.CandleDecoder import CandleDecoder  # Перевод свечей QUIK в столбцы без json_normalize
 
-from indicators import indicators
+from indicators.bar_buffer import BarBuffer
+from indicators.streaming import Indicators
 
 
 def changed_connection(data):
@@ -21,8 +23,10 @@ class Bars:
         self.class_code = class_code
         self.sec_code = security_code
         self.tf = tf
+        self.bars = BarBuffer(288)  # Последние бары. Хранилище фиксированной емкости
         self.df_bars = pd.DataFrame()
-        self.df_ind = pd.DataFrame()
+        self.indicators = Indicators()  # Индикаторы считаются по каждому бару, а не по всей истории
+        self.signals = {}  # Сигналы индикаторов на последний бар
         self.get_candles_from_provider()
 
 
@@ -31,10 +35,10 @@ class Bars:
         Получение бар из провайдера
         """
         time_frame, _ = qp_provider.timeframe_to_quik_timeframe(self.tf)  # Временной интервал QUIK
-        # Получаем все бары из QUIK
+        # Получаем из QUIK только нужные бары: 288 закрытых и текущий
         history = qp_provider.get_candles_from_data_source(
-            self.class_code, self.sec_code, time_frame
-            )  
+            self.class_code, self.sec_code, time_frame, count=288 + 1
+            )
         if not history:  # Если бары не получены
             return pd.DataFrame()  # то выходим, дальше не продолжаем
         if 'data' not in history:  # Если бар нет в словаре
@@ -42,26 +46,15 @@ class Bars:
         new_bars = history['data']  # Получаем все бары из QUIK
         if len(new_bars) == 0:  # Если новых бар нет
             return pd.DataFrame()  # то выходим, дальше не продолжаем
-        # Переводим список бар в pandas DataFrame
-        self.df_bars = pd.json_normalize(new_bars).tail(288)  
-        self.df_bars.rename(
-            columns={'datetime.year': 'year', 'datetime.month': 'month', 'datetime.day': 'day',
-            'datetime.hour': 'hour', 'datetime.min': 'minute', 
-            'datetime.sec': 'second'}, inplace=True
-            )  # Чтобы получить дату/время переименовываем колонки
-        self.df_bars['datetime'] = pd.to_datetime(
-            self.df_bars[['year', 'month', 'day', 'hour', 'minute', 'second']]
-            )  # Собираем дату/время из колонок
-        # Отбираем нужные колонки. Дата и время нужны, 
-        # чтобы не удалять одинаковые OHLCV на разное время
-        self.df_bars = self.df_bars[['datetime', 'open', 'high', 'low', 'close', 'volume']]  
-        self.df_bars.index = self.df_bars['datetime']  # Дата/время также будет индексом
-        # Объемы могут быть только целыми
-        self.df_bars.volume = pd.to_numeric(self.df_bars.volume, downcast='integer')  
-        # Могут быть получены дубли, удаляем их
-        self.df_bars.drop_duplicates(keep='last', inplace=True)  
-        self.df_bars = self.df_bars.iloc[:-1]  # Удаление последней строки
+        # Кладем бары в хранилище без последнего (он еще не завершен).
+        # Дубли по дате и времени хранилище объединяет
+        self.bars.extend(CandleDecoder.decode(new_bars[:-1]))
+        # Окно хранилища в виде pandas DataFrame без копирования: колонки datetime и OHLCV, индекс datetime.
+        # Дата и время нужны, чтобы не удалять одинаковые OHLCV на разное время. Объемы целые
+        self.df_bars = CandleDecoder.to_dataframe(self.bars.window())
         print(self.df_bars)
+        # Прогоняем историю через индикаторы один раз. Дальше они обновляются по одному бару
+        self.indicators.run(self.bars.window())
         # print(self.df_bars['datetime'].dtype)
         # return self.df_bars
 
@@ -72,38 +65,19 @@ class Bars:
         - Получение новой свечки
         """
         if data['data']['interval'] == 5:
-            # Преобразуем дату и время
-            datetime_str = datetime(
-                year=data['data']['datetime']['year'],
-                month=data['data']['datetime']['month'],
-                day=data['data']['datetime']['day'],
-                hour=data['data']['datetime']['hour'],
-                minute=data['data']['datetime']['min'],
-                second=data['data']['datetime']['sec']
-            )
+            # Обновляем формирующийся бар на месте или добавляем новый.
+            # Самый старый бар при переполнении хранилища отбрасывается
+            bar = CandleDecoder.decode([data['data']])
+            self.bars.extend(bar)
+            # Окно хранилища в виде pandas DataFrame без копирования
+            self.df_bars = CandleDecoder.to_dataframe(self.bars.window())
 
-            # Создаем датафрейм
-            df = pd.DataFrame([{
-                'datetime': datetime_str,
-                'open': data['data']['open'],
-                'high': data['data']['high'],
-                'low': data['data']['low'],
-                'close': data['data']['close'],
-                'volume': data['data']['volume']
-            }])
-
-            df.index = df['datetime']  # Дата/время также будет индексом
-            # print(df)
-            # print(df['datetime'].dtype)
-            self.df_bars = (
-                pd.concat([self.df_bars, df])
-                .drop_duplicates(subset=['datetime'])
-                .sort_index(ascending=True)
-                )
-            
-            self.df_ind = self.df_ind.iloc[0:0]
-            self.df_ind = indicators.run(self.df_bars)
-            print(self.df_ind)
+            # Индикаторы обновляются за O(1): новый бар добавляется, формирующийся пересчитывается.
+            # Значения те же, что у indicators.run по всем барам с начала работы
+            signals = self.indicators.update(*(bar[column][0].item() for column in CandleDecoder.columns))
+            if signals:  # Если бар не из прошлого
+                self.signals = signals
+                print(self.signals)
 
 
 if __name__ == '__main__':  # Точка входа при запуске этого скрипта
@@ -112,7 +86,8 @@ if __name__ == '__main__':  # Точка входа при запуске это
     # interval = 5
 
     # Вызываем конструктор QuikPy с подключением к локальному компьютеру с QUIK
-    qp_provider = QuikPy()  
+    # Пересчет индикаторов в new_bar_callback идет в отдельном потоке, чтобы не задерживать чтение событий
+    qp_provider = QuikPy(dispatch_workers=1)  
     # Вызываем конструктор QuikPy с подключением к удаленному компьютеру с QUIK
     # qpProvider = QuikPy(Host='<Ваш IP адрес>')  
 
@@ -0,0 +1,16 @@
+from QuikPy.Recorder import Recorder  # Запись потока функций обратного вызова
+from QuikPy.Replay import Replay  # Воспроизведение записи
+
+
+def test_corrupt_line_keeps_timestamps(tmp_path):
+    """Испорченная строка в середине блока пропускается вместе со своим временем, у остальных событий время не сдвигается"""
+    path = tmp_path / 'session.qpr'  # Файл записи
+    recorder = Recorder(path)  # Все записи попадут в один блок
+    for i in range(5):  # Пять событий, среднее испорчено
+        line = b'{"cmd":"OnAllTrade","data":{"i":%d' % i + (b'' if i == 2 else b'}}')
+        recorder.write(line, i * 1000)
+    recorder.close()
+
+    events = list(Replay(path).events())  # Разобранные события
+
+    assert [(timestamp, data['data']['i']) for timestamp, data in events] == [(0, 0), (1000, 1), (3000, 3), (4000, 4)]